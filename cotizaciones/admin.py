@@ -1,8 +1,41 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Count
+from django.http import HttpResponseRedirect
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import Cliente, Servicio, Cotizacion, DetalleCotizacion
+from .concurrencia import ConflictoVersion
+from .forms import VersionOptimistaMixin
+from .models import Cliente, Servicio, Cotizacion, DetalleCotizacion, EstadisticasCliente, totales_diferidos
+from .revisiones import registrar_revision, registrar_revisiones
+from .transiciones import ACCIONES, describir, ejecutar
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginador para tablas grandes: sin filtros, en PostgreSQL usa la
+    estimación de filas de pg_class en lugar de un COUNT(*) completo.
+    Con filtros, o por debajo del umbral, cuenta normalmente.
+    """
+    UMBRAL_ESTIMACION = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table],
+                )
+                fila = cursor.fetchone()
+            if fila and fila[0] > self.UMBRAL_ESTIMACION:
+                return fila[0]
+        return super().count
 
 @admin.register(Cliente)
 class ClienteAdmin(admin.ModelAdmin):
@@ -11,6 +44,8 @@ class ClienteAdmin(admin.ModelAdmin):
     search_fields = ['nombre', 'email', 'empresa']
     list_editable = ['activo']
     readonly_fields = ['id', 'fecha_creacion']
+    show_full_result_count = False
+    paginator = PaginadorEstimado
     fieldsets = (
         ('Información Personal', {
             'fields': ('nombre', 'email', 'telefono')
@@ -44,30 +79,68 @@ class ServicioAdmin(admin.ModelAdmin):
         }),
     )
 
+class VersionAdminForm(VersionOptimistaMixin, forms.ModelForm):
+    """Formulario del admin con la versión leída oculta (control de concurrencia optimista)"""
+
+    class Meta:
+        widgets = {'version': forms.HiddenInput()}
+
+class VersionOptimistaAdmin(admin.ModelAdmin):
+    """Si otra persona guardó la fila mientras se editaba, no se pisan sus cambios"""
+    form = VersionAdminForm
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except ConflictoVersion:
+            # La transacción del formulario ya se revirtió: se vuelve a mostrar con los datos actuales
+            self.message_user(
+                request,
+                'Otra persona modificó estos datos mientras los editaba. Revise los valores actuales '
+                'y vuelva a aplicar sus cambios.',
+                messages.ERROR,
+            )
+            return HttpResponseRedirect(request.get_full_path())
+
 class DetalleCotizacionInline(admin.TabularInline):
     model = DetalleCotizacion
+    form = VersionAdminForm
     extra = 1
-    fields = ['servicio', 'descripcion', 'horas_estimadas', 'tarifa_hora', 'subtotal']
+    fields = ['servicio', 'descripcion', 'horas_estimadas', 'tarifa_hora', 'subtotal', 'version']
     readonly_fields = ['subtotal']
+    autocomplete_fields = ['servicio']
+
+def _accion_masiva(accion):
+    """Acción del admin para transiciones.ACCIONES (un UPDATE por lote, no por fila)"""
+    def aplicar(modeladmin, request, queryset):
+        resumen = ejecutar(accion, queryset.order_by().values_list('pk', flat=True))
+        nivel = messages.WARNING if resumen['rechazadas'] or resumen['no_encontradas'] else messages.SUCCESS
+        modeladmin.message_user(request, describir(resumen), nivel)
+    aplicar.__name__ = accion
+    return admin.action(description=f'{ACCIONES[accion]["nombre"]} (seleccionadas)')(aplicar)
 
 @admin.register(Cotizacion)
-class CotizacionAdmin(admin.ModelAdmin):
+class CotizacionAdmin(VersionOptimistaAdmin):
     list_display = [
         'numero_cotizacion', 'cliente', 'estado', 'modalidad_pago', 
-        'fecha_creacion', 'fecha_vencimiento', 'total_formatted'
+        'fecha_creacion', 'fecha_vencimiento', 'num_detalles', 'total_formatted'
     ]
     list_filter = ['estado', 'modalidad_pago', 'fecha_creacion', 'fecha_vencimiento']
     search_fields = ['numero_cotizacion', 'cliente__nombre', 'cliente__empresa']
-    list_editable = ['estado']
+    list_select_related = ['cliente']
+    autocomplete_fields = ['cliente']
+    show_full_result_count = False
+    paginator = PaginadorEstimado
     readonly_fields = [
         'id', 'numero_cotizacion', 'fecha_creacion', 'subtotal', 
         'descuento_monto', 'iva_monto', 'total'
     ]
     inlines = [DetalleCotizacionInline]
+    actions = [_accion_masiva(accion) for accion in ACCIONES]
     
     fieldsets = (
         ('Información General', {
-            'fields': ('cliente', 'fecha_vencimiento', 'modalidad_pago', 'estado')
+            'fields': ('cliente', 'fecha_vencimiento', 'modalidad_pago', 'estado', 'version')
         }),
         ('Cálculos', {
             'fields': ('descuento_porcentaje', 'iva_porcentaje'),
@@ -87,36 +160,84 @@ class CotizacionAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # El número de líneas se anota en la misma consulta del listado
+        return super().get_queryset(request).annotate(detalles_count=Count('detallecotizacion'))
+
+    def num_detalles(self, obj):
+        return obj.detalles_count
+    num_detalles.short_description = 'Líneas'
+    num_detalles.admin_order_field = 'detalles_count'
+
     def total_formatted(self, obj):
-        return format_html('<strong>${:,.2f}</strong>', obj.total)
+        return format_html('<strong>${}</strong>', f'{obj.total:,.2f}')
     total_formatted.short_description = 'Total'
 
-    def save_model(self, request, obj, form, change):
-        super().save_model(request, obj, form, change)
-        # Recalcular totales después de guardar
-        obj.calcular_totales()
+    def delete_queryset(self, request, queryset):
+        from .flujo_caja import invalidar_flujo_caja
 
-    def save_formset(self, request, form, formset, change):
-        super().save_formset(request, form, formset, change)
-        # Recalcular totales después de guardar los detalles
-        if formset.model == DetalleCotizacion:
-            form.instance.calcular_totales()
+        # El borrado masivo no pasa por Cotizacion.delete(): se descuentan
+        # las cotizaciones de las estadísticas de sus clientes
+        with transaction.atomic():
+            aportes = list(queryset.values_list('cliente_id', 'estado', 'total'))
+            super().delete_queryset(request, queryset)
+            EstadisticasCliente.ajustar([(*aporte, -1) for aporte in aportes])
+            EstadisticasCliente.recalcular_ultima({cliente_id for cliente_id, _, _ in aportes})
+        invalidar_flujo_caja()
+
+    def save_related(self, request, form, formsets, change):
+        # Un único recálculo de totales al final de todo el guardado (cabecera
+        # e inlines); sin líneas ni cambios de descuento o IVA no hace falta.
+        # El estado desde el listado solo cambia con las acciones masivas.
+        campos_fiscales = {'descuento_porcentaje', 'iva_porcentaje'}
+        if formsets or campos_fiscales.intersection(form.changed_data):
+            with totales_diferidos(form.instance):
+                super().save_related(request, form, formsets, change)
+        else:
+            super().save_related(request, form, formsets, change)
+        registrar_revision(form.instance)
 
 @admin.register(DetalleCotizacion)
-class DetalleCotizacionAdmin(admin.ModelAdmin):
+class DetalleCotizacionAdmin(VersionOptimistaAdmin):
     list_display = ['cotizacion', 'servicio', 'horas_estimadas', 'tarifa_hora', 'subtotal_formatted']
     list_filter = ['servicio__tipo_servicio', 'cotizacion__estado']
     search_fields = ['cotizacion__numero_cotizacion', 'servicio__nombre']
     readonly_fields = ['id', 'subtotal']
+    list_select_related = ['cotizacion__cliente', 'servicio']
+    autocomplete_fields = ['cotizacion', 'servicio']
+    show_full_result_count = False
+    paginator = PaginadorEstimado
     
     def subtotal_formatted(self, obj):
-        return format_html('<strong>${:,.2f}</strong>', obj.subtotal)
+        return format_html('<strong>${}</strong>', f'{obj.subtotal:,.2f}')
     subtotal_formatted.short_description = 'Subtotal'
 
     def save_model(self, request, obj, form, change):
-        super().save_model(request, obj, form, change)
-        # Recalcular totales de la cotización
-        obj.cotizacion.calcular_totales()
+        # DetalleCotizacion.save() ya recalcula su cotización; se difiere para
+        # hacerlo una sola vez, incluida la cotización anterior si se movió
+        anteriores = []
+        if change and 'cotizacion' in form.changed_data:
+            anteriores = list(Cotizacion.objects.filter(pk=form.initial.get('cotizacion')))
+        with transaction.atomic():
+            with totales_diferidos(*anteriores):
+                super().save_model(request, obj, form, change)
+            registrar_revisiones([obj.cotizacion_id, *(cotizacion.pk for cotizacion in anteriores)])
+
+    def delete_model(self, request, obj):
+        # Borrar una línea no pasa por DetalleCotizacion.save(): se recalcula su cotización
+        with transaction.atomic():
+            with totales_diferidos(obj.cotizacion):
+                super().delete_model(request, obj)
+            registrar_revisiones([obj.cotizacion_id])
+
+    def delete_queryset(self, request, queryset):
+        # Un recálculo y una revisión por cotización afectada, no por línea
+        with transaction.atomic():
+            ids = set(queryset.values_list('cotizacion_id', flat=True))
+            afectadas = list(Cotizacion.objects.filter(pk__in=ids))
+            with totales_diferidos(*afectadas):
+                super().delete_queryset(request, queryset)
+            registrar_revisiones(ids)
 
 # Configuración del sitio admin
 admin.site.site_header = "Sistema de Cotizaciones"
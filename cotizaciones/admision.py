@@ -0,0 +1,236 @@
+"""
+Control de admisión de los renders de PDF entre procesos.
+
+WeasyPrint consume mucha memoria; con varios workers de gunicorn una ráfaga
+de descargas puede dejar a todos renderizando a la vez. turno_pdf() limita
+los renders simultáneos de todos los procesos con bloqueos de archivo
+(flock) en settings.PDF_ADMISION_ROOT, sin servicios externos:
+
+* `limite` archivos turno-N: quien bloquea uno puede renderizar.
+* `cola` archivos cola-N: quien no consigue turno espera en la cola hasta
+  `espera_segundos`. Si la cola está llena o se agota la espera se lanza
+  PdfSaturado y la vista responde 503 con Retry-After.
+
+Los bloqueos los libera el sistema operativo si el proceso muere. Cada
+proceso guarda sus contadores en metricas/<pid>.json y metricas() los suma
+junto con la ocupación actual de turnos y cola; los archivos de procesos que
+ya terminaron (workers reciclados) se borran al sumar, así que los
+contadores son los de los workers vivos.
+
+Con workers síncronos, quien espera en la cola ocupa un worker: limite +
+cola debe quedar por debajo del número de workers para que el resto de las
+páginas siga respondiendo.
+"""
+
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+from .config import ADMISION_PDF_CONFIG
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin control de admisión
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (segundos) del histograma de espera
+TRAMOS_ESPERA = (0.1, 0.5, 1, 2, 5, 10, 30)
+
+_bloqueo = threading.Lock()
+_contadores = {
+    'admitidos': 0,
+    'encolados': 0,
+    'rechazados_cola_llena': 0,
+    'rechazados_espera': 0,
+    'espera_total': 0.0,
+    'espera_maxima': 0.0,
+    'render_total': 0.0,
+    'histograma_espera': [0] * (len(TRAMOS_ESPERA) + 1),
+}
+
+
+class PdfSaturado(Exception):
+    """No hay turno para renderizar; retry_after en segundos"""
+
+    def __init__(self, mensaje, retry_after):
+        super().__init__(mensaje)
+        self.retry_after = retry_after
+
+
+def directorio_admision():
+    return Path(getattr(settings, 'PDF_ADMISION_ROOT', Path(settings.BASE_DIR) / 'pdf' / 'admision'))
+
+
+def _tomar(prefijo, cantidad):
+    """Descriptor con flock sobre el primer archivo libre prefijo-N, o None"""
+    directorio = directorio_admision()
+    directorio.mkdir(parents=True, exist_ok=True)
+    for numero in range(cantidad):
+        descriptor = os.open(directorio / f'{prefijo}-{numero}', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(descriptor)
+            continue
+        return descriptor
+    return None
+
+
+def _soltar(descriptor):
+    # Cerrar el descriptor libera el flock
+    os.close(descriptor)
+
+
+def _ocupados(prefijo, cantidad):
+    """Archivos prefijo-N bloqueados ahora mismo por cualquier proceso"""
+    ocupados = 0
+    for numero in range(cantidad):
+        try:
+            descriptor = os.open(directorio_admision() / f'{prefijo}-{numero}', os.O_RDWR)
+        except FileNotFoundError:
+            continue
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            ocupados += 1
+        finally:
+            os.close(descriptor)
+    return ocupados
+
+
+def _retry_after():
+    """Segundos estimados hasta que se libere lugar: renders en cola por duración media"""
+    admitidos = _contadores['admitidos']
+    if not admitidos:
+        return ADMISION_PDF_CONFIG['retry_after_segundos']
+    media = _contadores['render_total'] / admitidos
+    estimado = media * (ADMISION_PDF_CONFIG['cola'] + 1) / ADMISION_PDF_CONFIG['limite']
+    return max(1, min(60, math.ceil(estimado)))
+
+
+def _guardar_metricas():
+    directorio = directorio_admision() / 'metricas'
+    directorio.mkdir(parents=True, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as archivo:
+        json.dump(_contadores, archivo)
+    os.replace(temporal, directorio / f'{os.getpid()}.json')
+
+
+def _registrar(**cambios):
+    with _bloqueo:
+        for clave, valor in cambios.items():
+            if clave == 'espera':
+                _contadores['espera_total'] += valor
+                _contadores['espera_maxima'] = max(_contadores['espera_maxima'], valor)
+                tramo = next((i for i, limite in enumerate(TRAMOS_ESPERA) if valor <= limite), len(TRAMOS_ESPERA))
+                _contadores['histograma_espera'][tramo] += 1
+            else:
+                _contadores[clave] += valor
+        try:
+            _guardar_metricas()
+        except OSError:
+            logger.exception('No se pudieron guardar las métricas de admisión de PDFs')
+
+
+@contextmanager
+def turno_pdf(bloquear=False):
+    """
+    Reserva un turno de render. Con bloquear=True (tareas en segundo plano y
+    comandos) espera sin límite y sin ocupar la cola de las peticiones.
+    """
+    if fcntl is None or not ADMISION_PDF_CONFIG['limite']:
+        yield
+        return
+
+    inicio = time.monotonic()
+    turno = _tomar('turno', ADMISION_PDF_CONFIG['limite'])
+    if turno is None:
+        cola = None
+        if not bloquear:
+            cola = _tomar('cola', ADMISION_PDF_CONFIG['cola'])
+            if cola is None:
+                _registrar(rechazados_cola_llena=1)
+                raise PdfSaturado('Cola de PDFs llena', _retry_after())
+        _registrar(encolados=1)
+        limite = None if bloquear else inicio + ADMISION_PDF_CONFIG['espera_segundos']
+        intervalo = ADMISION_PDF_CONFIG['intervalo_segundos']
+        try:
+            while turno is None:
+                if limite is not None and time.monotonic() >= limite:
+                    _registrar(rechazados_espera=1)
+                    raise PdfSaturado('Tiempo de espera agotado en la cola de PDFs', _retry_after())
+                time.sleep(intervalo)
+                intervalo = min(intervalo * 2, 0.5)
+                turno = _tomar('turno', ADMISION_PDF_CONFIG['limite'])
+        finally:
+            if cola is not None:
+                _soltar(cola)
+
+    admitido = time.monotonic()
+    _registrar(admitidos=1, espera=admitido - inicio)
+    try:
+        yield
+    finally:
+        _soltar(turno)
+        _registrar(render_total=time.monotonic() - admitido)
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # existe, pero es de otro usuario
+    return True
+
+
+def metricas():
+    """Ocupación actual y contadores acumulados de todos los procesos"""
+    totales = {clave: 0 for clave in ('admitidos', 'encolados', 'rechazados_cola_llena', 'rechazados_espera')}
+    espera_total = render_total = espera_maxima = 0.0
+    histograma = [0] * (len(TRAMOS_ESPERA) + 1)
+    procesos = 0
+    for ruta in (directorio_admision() / 'metricas').glob('*.json'):
+        # Sin fcntl (Windows) no se escriben métricas ni se comprueban procesos
+        if fcntl is not None and ruta.stem.isdigit() and not _proceso_vivo(int(ruta.stem)):
+            ruta.unlink(missing_ok=True)
+            continue
+        try:
+            datos = json.loads(ruta.read_text())
+        except (OSError, ValueError):
+            continue
+        procesos += 1
+        for clave in totales:
+            totales[clave] += datos[clave]
+        espera_total += datos['espera_total']
+        render_total += datos['render_total']
+        espera_maxima = max(espera_maxima, datos['espera_maxima'])
+        histograma = [a + b for a, b in zip(histograma, datos['histograma_espera'])]
+
+    activo = fcntl is not None and bool(ADMISION_PDF_CONFIG['limite'])
+    admitidos = totales['admitidos']
+    return {
+        'activo': activo,
+        'limite': ADMISION_PDF_CONFIG['limite'],
+        'cola': ADMISION_PDF_CONFIG['cola'],
+        'renderizando': _ocupados('turno', ADMISION_PDF_CONFIG['limite']) if activo else None,
+        'en_cola': _ocupados('cola', ADMISION_PDF_CONFIG['cola']) if activo else None,
+        'procesos': procesos,
+        **totales,
+        'espera_media_ms': round(espera_total / admitidos * 1000, 1) if admitidos else 0.0,
+        'espera_maxima_ms': round(espera_maxima * 1000, 1),
+        'render_medio_ms': round(render_total / admitidos * 1000, 1) if admitidos else 0.0,
+        'histograma_espera': dict(zip([f'<={limite}s' for limite in TRAMOS_ESPERA] + [f'>{TRAMOS_ESPERA[-1]}s'], histograma)),
+    }
@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class CotizacionesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cotizaciones'
+
+    def ready(self):
+        from .estaticos import recursos_locales
+        checks.register(recursos_locales, checks.Tags.staticfiles)
@@ -0,0 +1,177 @@
+"""
+Archivo de cotizaciones cerradas antiguas.
+
+Las cotizaciones rechazadas, canceladas o aprobadas de pago único que no se
+modifican desde antes de la fecha de corte se mueven a CotizacionArchivada y
+DetalleArchivado (mismas columnas, mismo id) en lotes, cada uno en su propia
+transacción: copiar, sumar al ResumenArchivo y borrar de las tablas de
+trabajo. Las aprobadas mensuales o anuales siguen generando cuotas en el
+flujo de caja y no se archivan.
+
+obtener_cotizacion() busca primero en las tablas de trabajo y luego en el
+archivo, de modo que el detalle y los PDFs siguen funcionando con el mismo id.
+"""
+
+import time
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Count, F, Q, Sum
+from django.http import Http404
+
+from .models import (
+    Cotizacion, CotizacionArchivada, DetalleArchivado, DetalleCotizacion, PdfCotizacion,
+    ResumenArchivo, RevisionCotizacion,
+)
+
+CAMPOS_COTIZACION = (
+    'id', 'numero_cotizacion', 'cliente_id', 'fecha_creacion', 'fecha_actualizacion', 'fecha_vencimiento',
+    'modalidad_pago', 'estado', 'subtotal', 'descuento_porcentaje', 'descuento_monto', 'iva_porcentaje',
+    'iva_monto', 'total', 'notas', 'terminos_condiciones',
+)
+CAMPOS_DETALLE = ('id', 'cotizacion_id', 'servicio_id', 'descripcion', 'horas_estimadas', 'tarifa_hora', 'subtotal')
+
+
+def archivables(corte):
+    """Cotizaciones cerradas creadas y modificadas por última vez antes de `corte`"""
+    return Cotizacion.objects.filter(
+        Q(estado__in=('rechazada', 'cancelada')) | Q(estado='aprobada', modalidad_pago='unico'),
+        fecha_creacion__lt=corte,
+        fecha_actualizacion__lt=corte,
+    )
+
+
+def obtener_cotizacion(pk):
+    """Cotización viva o archivada con ese id (Http404 si no existe en ninguna)"""
+    for modelo in (Cotizacion, CotizacionArchivada):
+        cotizacion = modelo.objects.select_related('cliente').filter(pk=pk).first()
+        if cotizacion is not None:
+            return cotizacion
+    raise Http404('Cotización no encontrada')
+
+
+def _archivar_lote(corte, lote):
+    """Mueve un lote; devuelve la cantidad archivada (0 cuando no quedan)"""
+    with transaction.atomic():
+        ids = list(
+            archivables(corte).select_for_update().order_by('fecha_creacion').values_list('pk', flat=True)[:lote]
+        )
+        if not ids:
+            return 0
+
+        revisiones = {}
+        for revision in RevisionCotizacion.objects.filter(cotizacion_id__in=ids).order_by('version'):
+            revisiones.setdefault(revision.cotizacion_id, []).append({
+                'version': revision.version,
+                'es_snapshot': revision.es_snapshot,
+                'datos': revision.datos,
+                'fecha': revision.fecha.isoformat(),
+            })
+        pdfs = {}
+        for pdf in PdfCotizacion.objects.filter(cotizacion_id__in=ids):
+            pdfs.setdefault(pdf.cotizacion_id, []).append({
+                'estado': pdf.estado,
+                'plantilla': pdf.plantilla,
+                'huella': pdf.huella,
+                'archivo': pdf.archivo,
+                'tamano': pdf.tamano,
+                'fecha': pdf.fecha.isoformat(),
+            })
+
+        filas = list(Cotizacion.objects.filter(pk__in=ids).values(*CAMPOS_COTIZACION))
+        CotizacionArchivada.objects.bulk_create(
+            CotizacionArchivada(**fila, revisiones=revisiones.get(fila['id'], []), pdfs=pdfs.get(fila['id'], []))
+            for fila in filas
+        )
+        DetalleArchivado.objects.bulk_create(
+            (DetalleArchivado(**fila) for fila in DetalleCotizacion.objects.filter(cotizacion_id__in=ids).values(*CAMPOS_DETALLE)),
+            batch_size=1000,
+        )
+
+        resumen = {}
+        for fila in filas:
+            cantidad, total = resumen.get(fila['estado'], (0, 0))
+            resumen[fila['estado']] = (cantidad + 1, total + fila['total'])
+        for estado, (cantidad, total) in resumen.items():
+            ResumenArchivo.objects.get_or_create(estado=estado)
+            ResumenArchivo.objects.filter(estado=estado).update(
+                cantidad=F('cantidad') + cantidad, total=F('total') + total,
+            )
+
+        # Detalles, revisiones y PDFs congelados se borran en cascada (los archivos quedan en disco)
+        Cotizacion.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def archivar(corte, lote=500, limite=None, progreso=None):
+    """
+    Archiva en lotes las cotizaciones de archivables(corte). Devuelve la
+    cantidad archivada; progreso(total) se llama después de cada lote.
+    """
+    from .flujo_caja import invalidar_flujo_caja
+
+    archivadas = 0
+    while limite is None or archivadas < limite:
+        cantidad = _archivar_lote(corte, lote if limite is None else min(lote, limite - archivadas))
+        if not cantidad:
+            break
+        archivadas += cantidad
+        if progreso:
+            progreso(archivadas)
+    if archivadas:
+        invalidar_flujo_caja()
+    return archivadas
+
+
+def conteos_por_estado():
+    """Cotizaciones por estado sumando las vivas y el resumen del archivo"""
+    conteos = dict(Cotizacion.objects.order_by().values_list('estado').annotate(Count('pk')))
+    for estado, cantidad in ResumenArchivo.conteos().items():
+        conteos[estado] = conteos.get(estado, 0) + cantidad
+    return conteos
+
+
+def tamano_tablas(modelos, using='default'):
+    """{tabla: (filas, bytes o None)}; bytes con pg_total_relation_size o dbstat de SQLite"""
+    connection = connections[using]
+    resultado = {}
+    for modelo in modelos:
+        tabla = modelo._meta.db_table
+        filas = modelo.objects.using(using).count()
+        tamano = None
+        with connection.cursor() as cursor:
+            try:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('SELECT pg_total_relation_size(%s)', [tabla])
+                    tamano = cursor.fetchone()[0]
+                elif connection.vendor == 'sqlite':
+                    # Tabla más sus índices
+                    cursor.execute(
+                        'SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN '
+                        '(SELECT name FROM sqlite_master WHERE type = %s AND tbl_name = %s)',
+                        [tabla, 'index', tabla],
+                    )
+                    tamano = cursor.fetchone()[0]
+            except DatabaseError:
+                # SQLite compilado sin dbstat
+                tamano = None
+        resultado[tabla] = (filas, tamano)
+    return resultado
+
+
+def medir_consultas(repeticiones=5):
+    """Milisegundos (mediana) de las consultas del dashboard y del listado sobre las tablas vivas"""
+    consultas = {
+        'conteo_total': lambda: Cotizacion.objects.count(),
+        'conteo_por_estado': lambda: list(Cotizacion.objects.order_by().values_list('estado').annotate(Count('pk'))),
+        'listado_pagina_1': lambda: list(Cotizacion.objects.select_related('cliente')[:20]),
+        'suma_aprobadas': lambda: Cotizacion.objects.filter(estado='aprobada').aggregate(Sum('total')),
+    }
+    tiempos = {}
+    for nombre, consulta in consultas.items():
+        mediciones = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            consulta()
+            mediciones.append(time.perf_counter() - inicio)
+        tiempos[nombre] = sorted(mediciones)[len(mediciones) // 2] * 1000
+    return tiempos
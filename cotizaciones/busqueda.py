@@ -0,0 +1,87 @@
+"""
+Búsqueda de clientes por prefijo para el autocompletado de formularios.
+
+Cliente guarda versiones normalizadas (minúsculas y sin acentos) de nombre,
+empresa y email en columnas indexadas; las búsquedas son por prefijo sobre
+esas columnas, así que usan el índice en lugar de recorrer la tabla. Los
+resultados de cada prefijo se cachean (caché compartida por los workers,
+settings.CACHES) y se invalidan en bloque cuando cambia cualquier cliente.
+"""
+
+import hashlib
+import unicodedata
+import uuid
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+
+RESULTADOS_POR_PAGINA = 20
+MAXIMO_POR_PAGINA = 50
+LONGITUD_MAXIMA_PREFIJO = 100
+DURACION_CACHE = 300
+
+CLAVE_GENERACION = 'clientes_autocompletado:generacion'
+
+
+def normalizar_busqueda(texto):
+    """Minúsculas y sin acentos: 'José Núñez' -> 'jose nunez'"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.casefold().split())
+
+
+def _filtro_prefijo(campo, prefijo):
+    # En SQLite LIKE no usa índices B-tree normales; un rango sí.
+    # En PostgreSQL Django crea un índice *_like para startswith.
+    if connection.vendor == 'sqlite':
+        return Q(**{f'{campo}__gte': prefijo, f'{campo}__lt': prefijo + '\uffff'})
+    return Q(**{f'{campo}__startswith': prefijo})
+
+
+def invalidar_cache_clientes():
+    """Invalida todos los prefijos cacheados (se llama al guardar o borrar un cliente)"""
+    # Una generación aleatoria en lugar de un contador: dos invalidaciones
+    # simultáneas no se pisan y, si la caché descarta la clave, la nueva
+    # generación no reutiliza resultados viejos
+    cache.set(CLAVE_GENERACION, uuid.uuid4().hex, None)
+
+
+def buscar_clientes(texto, pagina=1, por_pagina=RESULTADOS_POR_PAGINA):
+    """
+    Devuelve (resultados, hay_mas) para el prefijo indicado.
+    Cada resultado es {'id': ..., 'text': ...}.
+    """
+    from .models import Cliente
+
+    prefijo = normalizar_busqueda(texto)[:LONGITUD_MAXIMA_PREFIJO]
+    por_pagina = max(1, min(por_pagina, MAXIMO_POR_PAGINA))
+    pagina = max(1, pagina)
+
+    generacion = cache.get_or_set(CLAVE_GENERACION, lambda: uuid.uuid4().hex, None)
+    huella = hashlib.md5(prefijo.encode()).hexdigest()
+    clave = f'clientes_autocompletado:{generacion}:{por_pagina}:{pagina}:{huella}'
+    encontrado = cache.get(clave)
+    if encontrado is not None:
+        return encontrado
+
+    queryset = Cliente.objects.filter(activo=True)
+    if prefijo:
+        queryset = queryset.filter(
+            _filtro_prefijo('nombre_busqueda', prefijo)
+            | _filtro_prefijo('empresa_busqueda', prefijo)
+            | _filtro_prefijo('email_busqueda', prefijo)
+        )
+    inicio = (pagina - 1) * por_pagina
+    filas = list(
+        queryset.order_by('nombre_busqueda', 'pk')
+        .values_list('pk', 'nombre', 'empresa')[inicio:inicio + por_pagina + 1]
+    )
+
+    resultados = [
+        {'id': str(pk), 'text': f'{nombre} - {empresa}' if empresa else nombre}
+        for pk, nombre, empresa in filas[:por_pagina]
+    ]
+    encontrado = (resultados, len(filas) > por_pagina)
+    cache.set(clave, encontrado, DURACION_CACHE)
+    return encontrado
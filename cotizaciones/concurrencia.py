@@ -0,0 +1,67 @@
+"""
+Utilidades para escrituras concurrentes sobre la base de datos.
+
+Con SQLite y varios workers de gunicorn, una escritura puede encontrar el
+archivo bloqueado por otra transacción. busy_timeout cubre la mayoría de los
+casos; reintentar_si_bloqueada reintenta el bloque completo con backoff
+exponencial cuando aun así se agota la espera.
+
+ConflictoVersion es el error del control de concurrencia optimista de
+Cotizacion y DetalleCotizacion (ver models.VersionOptimista).
+"""
+
+import functools
+import logging
+import random
+import time
+
+from django.db import OperationalError, connection
+
+logger = logging.getLogger(__name__)
+
+class ConflictoVersion(Exception):
+    """Otra escritura cambió la fila desde que se leyó; no se guardó nada"""
+
+    def __init__(self, instancia, version):
+        self.instancia = instancia
+        self.version = version
+        super().__init__(
+            f'{instancia._meta.verbose_name} {instancia.pk}: la versión {version} ya no es la vigente'
+        )
+
+
+MENSAJES_BLOQUEO = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def es_error_bloqueo(error):
+    """Indica si el OperationalError se debe a un bloqueo de SQLite"""
+    mensaje = str(error).lower()
+    return any(texto in mensaje for texto in MENSAJES_BLOQUEO)
+
+
+def reintentar_si_bloqueada(intentos=5, espera_base=0.05, espera_maxima=1.0):
+    """
+    Decorador que reintenta la función si la base de datos está bloqueada.
+
+    La función decorada debe abrir su propia transacción corta: si se llama
+    dentro de un transaction.atomic externo no se reintenta, porque la
+    transacción exterior ya quedó invalidada.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            for intento in range(1, intentos + 1):
+                try:
+                    return funcion(*args, **kwargs)
+                except OperationalError as error:
+                    if not es_error_bloqueo(error) or connection.in_atomic_block or intento == intentos:
+                        raise
+                    espera = min(espera_maxima, espera_base * 2 ** (intento - 1))
+                    espera *= random.uniform(0.5, 1.5)
+                    logger.warning(
+                        'Base de datos bloqueada en %s (intento %s/%s), reintentando en %.3fs',
+                        funcion.__qualname__, intento, intentos, espera,
+                    )
+                    time.sleep(espera)
+        return envoltura
+    return decorador
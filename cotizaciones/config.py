@@ -39,3 +39,138 @@ NOTAS_DEFAULT = """
 • Soporte técnico disponible durante el desarrollo
 • Garantía de 6 meses en el código entregado
 """
+
+# Proyección de flujo de caja (cotizaciones/flujo_caja.py)
+FLUJO_CAJA_CONFIG = {
+    'meses': 12,  # Meses proyectados por defecto
+    'maximo_meses': 120,
+    'margen_segundos': 5,  # Solapamiento al leer cotizaciones modificadas
+    'recarga_completa_segundos': 600,  # Recarga completa periódica de la cartera
+    'proyecciones': 32,  # Ventanas (desde, meses) en memoria por proceso (LRU)
+    # Cuotas de cada modalidad recurrente desde el mes de creación; None: sin fecha de fin
+    'cuotas': {'mensual': None, 'anual': None},
+}
+
+# Recursos remotos de los PDFs (fuentes, imágenes) además de EMPRESA_CONFIG['logo_url'].
+# Se descargan con `manage.py precargar_recursos_pdf`; durante el render no se usa la red.
+RECURSOS_PDF_CONFIG = {
+    'urls': [],
+    'timeout': 10,  # Segundos por descarga al precargar
+}
+
+# Renders de PDF simultáneos entre todos los workers (cotizaciones/admision.py).
+# Con 3 workers síncronos, limite + cola < 3 deja siempre un worker libre.
+ADMISION_PDF_CONFIG = {
+    'limite': 1,  # Renders a la vez (0 desactiva el control)
+    'cola': 1,  # Peticiones esperando turno; con la cola llena se responde 503
+    'espera_segundos': 20,  # Espera máxima en la cola
+    'intervalo_segundos': 0.05,  # Primer intervalo de sondeo (se duplica hasta 0.5 s)
+    'retry_after_segundos': 5,  # Retry-After mientras no haya duraciones medidas
+}
+
+# Perfiles de salida de los PDFs (opciones de WeasyPrint write_pdf), seleccionables con ?perfil=
+# Las fuentes siempre se incrustan como subconjunto salvo full_fonts=True.
+PERFILES_PDF = {
+    # Vista previa rápida: sin optimizar imágenes ni conservar hinting
+    'fast-preview': {
+        'optimize_images': False,
+        'full_fonts': False,
+        'hinting': False,
+    },
+    # Para adjuntar por correo: imágenes recomprimidas y reducidas a 150 dpi
+    'email': {
+        'optimize_images': True,
+        'jpeg_quality': 75,
+        'dpi': 150,
+        'full_fonts': False,
+        'hinting': False,
+    },
+    # Archivo a largo plazo (PDFs congelados): PDF/A-3b, imágenes a 300 dpi
+    'archive': {
+        'pdf_variant': 'pdf/a-3b',
+        'optimize_images': True,
+        'jpeg_quality': 90,
+        'dpi': 300,
+        'full_fonts': False,
+        'hinting': True,
+        'custom_metadata': True,
+    },
+}
+PERFIL_PDF_DEFECTO = 'email'
+PERFIL_PDF_CONGELADO = 'archive'
+
+# CSS/JS de terceros de las páginas (cotizaciones/estaticos.py). `manage.py vendorizar_estaticos`
+# los descarga a static/<local> junto con las fuentes que referencian; mientras no estén
+# descargados las plantillas usan el CDN.
+RECURSOS_ESTATICOS = {
+    'bootstrap_css': {
+        'tipo': 'css',
+        'cdn': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+        'local': 'vendor/bootstrap-5.3.0/css/bootstrap.min.css',
+    },
+    'bootstrap_js': {
+        'tipo': 'js',
+        'cdn': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+        'local': 'vendor/bootstrap-5.3.0/js/bootstrap.bundle.min.js',
+    },
+    'bootstrap_icons_css': {
+        'tipo': 'css',
+        'cdn': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css',
+        'local': 'vendor/bootstrap-icons-1.10.0/bootstrap-icons.css',
+    },
+    'fontawesome_css': {
+        'tipo': 'css',
+        'cdn': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
+        'local': 'vendor/fontawesome-6.4.0/css/all.min.css',
+    },
+    'jquery': {
+        'tipo': 'js',
+        'cdn': 'https://code.jquery.com/jquery-3.6.0.min.js',
+        'local': 'vendor/jquery-3.6.0/jquery.min.js',
+    },
+    'chartjs': {
+        'tipo': 'js',
+        'cdn': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.js',
+        'local': 'vendor/chartjs-4.4.0/chart.umd.js',
+    },
+}
+
+# Entrega de archivos estáticos desde STATIC_ROOT (cotizaciones/estaticos.py)
+ESTATICOS_CONFIG = {
+    'max_age_hash': 365 * 24 * 3600,  # Nombres con hash del manifiesto: no cambian nunca
+    'max_age': 300,  # Nombres sin hash
+    'tamano_minimo_compresion': 256,  # Bytes; los archivos menores no se comprimen
+    # Recursos de RECURSOS_ESTATICOS sin copia local: True los toma del CDN con un aviso
+    # de `check`/collectstatic; False lo convierte en error (instalaciones sin Internet)
+    'cdn_de_respaldo': True,
+}
+
+# Lecturas en réplicas (cotizaciones/replicas.py)
+REPLICAS_CONFIG = {
+    'pegajoso_segundos': 10,  # Tras escribir, el navegador lee de la primaria; mayor que el retraso de replicación
+    'cookie': 'primaria_hasta',
+}
+
+# Entrega de la bandeja de salida de eventos (cotizaciones/eventos.py, `manage.py despachar_eventos`)
+EVENTOS_CONFIG = {
+    'url': '',  # Endpoint HTTP que recibe los lotes (POST JSON); vacío desactiva la entrega
+    'cabeceras': {},  # Cabeceras adicionales, p. ej. {'Authorization': 'Bearer ...'}
+    'timeout': 10,  # Segundos por petición
+    'lote': 200,  # Eventos leídos por lote (un POST por lote)
+    'reintentos': 5,  # Reintentos de un lote ante errores de red, 5xx, 408 o 429
+    'espera_inicial': 0.5,  # Segundos antes del primer reintento; se duplica en cada uno
+    'espera_maxima': 30,
+    'intentos_maximos': 60,  # POST sin entregar antes de pasar un evento a fallidos
+    'intervalo': 5,  # Segundos entre sondeos con --loop
+}
+
+# Envío de cotizaciones por correo (cotizaciones/correo.py, `manage.py enviar_cotizaciones`)
+CORREO_CONFIG = {
+    'asunto': 'Cotización {numero} - {empresa}',
+    'remitente': '',  # Vacío: settings.DEFAULT_FROM_EMAIL
+    'plantilla': 'completo',  # Plantilla del PDF adjunto (ver pdf.PLANTILLAS)
+    'perfil': 'email',  # Perfil del PDF de los borradores; enviadas y aprobadas adjuntan su PDF congelado
+    'lote': 50,  # Mensajes por conexión al servidor de correo
+    'hilos': 4,  # Lotes enviados en paralelo
+    'por_segundo': 10,  # Máximo de mensajes por segundo entre todos los hilos (0 sin límite)
+}
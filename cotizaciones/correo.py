@@ -0,0 +1,243 @@
+"""
+Envío de cotizaciones por correo al cliente con el PDF adjunto.
+
+enviar_cotizaciones() reparte los mensajes en lotes de CORREO_CONFIG['lote']
+y procesa CORREO_CONFIG['hilos'] lotes en paralelo. Cada lote usa una sola
+conexión del backend de correo (settings.EMAIL_BACKEND), abierta una vez
+para todos sus mensajes, en lugar de una conexión SMTP por mensaje. Un
+limitador compartido por los hilos espacia los envíos a
+CORREO_CONFIG['por_segundo'] mensajes por segundo (límite del servidor).
+
+El adjunto de una cotización enviada o aprobada es su PDF congelado; el de
+las demás se genera con el perfil de correo y se reutiliza mientras su HTML
+no cambie (pdf.generar_pdf). Los renders esperan turno en el control de
+admisión en lugar de fallar. Cada envío queda en EnvioCotizacion, y las
+cotizaciones en borrador o vencidas que se envían pasan a 'enviada'.
+
+Las vistas, el admin y la API no envían en la petición: encolar_envios()
+solo crea los envíos 'pendiente' y, tras el commit, un hilo del proceso los
+envía. Los pendientes que quedan (el proceso terminó antes) los envía
+`manage.py enviar_cotizaciones --pendientes`.
+"""
+
+import logging
+import smtplib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .config import CORREO_CONFIG, EMPRESA_CONFIG
+from .models import Cotizacion, EnvioCotizacion
+from .pdf import PLANTILLAS, contexto_pdf, generar_pdf, pdf_congelado
+from .transiciones import LOTE, cambiar_estado
+
+logger = logging.getLogger(__name__)
+
+_ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='correo')
+
+SIN_CORREO = 'El cliente no tiene correo electrónico'
+
+
+class Limitador:
+    """Espacia las llamadas a esperar() a `por_segundo` por segundo entre todos los hilos"""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo if por_segundo else 0
+        self._siguiente = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente)
+            self._siguiente = turno + self.intervalo
+        time.sleep(turno - ahora)
+
+
+def adjunto_pdf(cotizacion, plantilla, bloquear=False):
+    """(nombre de archivo, bytes) del PDF que se adjunta; `bloquear` como en admision.admitir"""
+    ruta = pdf_congelado(cotizacion, plantilla, bloquear) or generar_pdf(
+        PLANTILLAS[plantilla], contexto_pdf(cotizacion, plantilla), CORREO_CONFIG['perfil'], bloquear=bloquear,
+    )
+    return f'cotizacion_{cotizacion.numero_cotizacion}.pdf', ruta.read_bytes()
+
+
+def crear_mensaje(cotizacion, plantilla, conexion=None, bloquear=False):
+    contexto = {'cotizacion': cotizacion, 'cliente': cotizacion.cliente, 'empresa': EMPRESA_CONFIG}
+    mensaje = EmailMessage(
+        subject=CORREO_CONFIG['asunto'].format(numero=cotizacion.numero_cotizacion, empresa=EMPRESA_CONFIG['nombre']),
+        body=render_to_string('cotizaciones/correo_cotizacion.txt', contexto),
+        from_email=CORREO_CONFIG['remitente'] or settings.DEFAULT_FROM_EMAIL,
+        to=[cotizacion.cliente.email],
+        connection=conexion,
+    )
+    mensaje.attach(*adjunto_pdf(cotizacion, plantilla, bloquear), 'application/pdf')
+    return mensaje
+
+
+def _motivo(error):
+    if isinstance(error, smtplib.SMTPResponseException):
+        return f'SMTP {error.smtp_code}: {error.smtp_error.decode(errors="replace")}'
+    return str(error) or error.__class__.__name__
+
+
+def _reabrir(conexion):
+    """Tras un error SMTP la conexión puede quedar inutilizable: se abre otra para el resto del lote"""
+    try:
+        conexion.close()
+        conexion.open()
+    except (smtplib.SMTPException, OSError):
+        # send_messages volverá a intentar abrirla con el siguiente mensaje
+        pass
+
+
+def _enviar_lote(envios, plantilla, limitador):
+    """
+    Envía un lote por una sola conexión; marca cada envío como enviado o
+    error. Solo corre en hilos de fondo o comandos: los renders esperan turno.
+    """
+    try:
+        conexion = get_connection()
+        try:
+            conexion.open()
+        except (smtplib.SMTPException, OSError) as error:
+            for envio in envios:
+                envio.estado, envio.error = 'error', f'Sin conexión con el servidor de correo: {_motivo(error)}'
+            return
+        try:
+            for envio in envios:
+                try:
+                    mensaje = crear_mensaje(envio.cotizacion, plantilla, conexion, bloquear=True)
+                    limitador.esperar()
+                    conexion.send_messages([mensaje])
+                except (smtplib.SMTPException, OSError) as error:
+                    envio.estado, envio.error = 'error', _motivo(error)
+                    _reabrir(conexion)
+                except Exception as error:
+                    logger.exception('No se pudo preparar el correo de la cotización %s', envio.cotizacion_id)
+                    envio.estado, envio.error = 'error', _motivo(error)
+                else:
+                    envio.estado, envio.fecha_envio = 'enviado', timezone.now()
+        finally:
+            try:
+                conexion.close()
+            except (smtplib.SMTPException, OSError):
+                pass
+    finally:
+        connections.close_all()
+
+
+def _crear_envios(ids):
+    """Envíos 'pendiente' de las cotizaciones de `ids`; los de clientes sin correo quedan en error"""
+    cotizaciones = Cotizacion.objects.select_related('cliente').filter(pk__in=ids).order_by()
+    envios = [
+        EnvioCotizacion(cotizacion=cotizacion, destinatario=cotizacion.cliente.email) for cotizacion in cotizaciones
+    ]
+    for envio in envios:
+        if not envio.destinatario:
+            envio.estado, envio.error = 'error', SIN_CORREO
+    return EnvioCotizacion.objects.bulk_create(envios)
+
+
+def procesar_envios(envios, plantilla=None, lote=None, hilos=None, por_segundo=None, marcar_enviadas=True):
+    """
+    Envía los envíos pendientes de `envios` (con su cotización y cliente
+    cargados) y guarda el resultado. Devuelve un resumen con las enviadas
+    (pks de cotización), los errores ({pk: motivo}), los lotes y el
+    rendimiento (mensajes por segundo).
+    """
+    plantilla = plantilla or CORREO_CONFIG['plantilla']
+    lote = lote or CORREO_CONFIG['lote']
+    hilos = hilos or CORREO_CONFIG['hilos']
+    por_segundo = CORREO_CONFIG['por_segundo'] if por_segundo is None else por_segundo
+
+    inicio = time.perf_counter()
+    pendientes = [envio for envio in envios if envio.estado == 'pendiente']
+    bloques = [pendientes[i:i + lote] for i in range(0, len(pendientes), lote)]
+    limitador = Limitador(por_segundo)
+    with ThreadPoolExecutor(max_workers=max(1, min(hilos, len(bloques))), thread_name_prefix='correo-lote') as ejecutor:
+        list(ejecutor.map(lambda bloque: _enviar_lote(bloque, plantilla, limitador), bloques))
+    EnvioCotizacion.objects.bulk_update(pendientes, ['estado', 'error', 'fecha_envio'], batch_size=500)
+    duracion = time.perf_counter() - inicio
+
+    enviadas = [envio.cotizacion_id for envio in envios if envio.estado == 'enviado']
+    if marcar_enviadas:
+        # Solo cambian las que lo permiten (borrador, vencida); el resto se ignora
+        for i in range(0, len(enviadas), LOTE):
+            cambiar_estado(enviadas[i:i + LOTE], 'enviada')
+
+    return {
+        'enviadas': enviadas,
+        'errores': {envio.cotizacion_id: envio.error for envio in envios if envio.estado == 'error'},
+        'lotes': len(bloques),
+        'segundos': duracion,
+        'mensajes_por_segundo': len(enviadas) / duracion if duracion else 0,
+    }
+
+
+def enviar_cotizaciones(ids, plantilla=None, lote=None, hilos=None, por_segundo=None, marcar_enviadas=True):
+    """
+    Envía por correo al cliente las cotizaciones de `ids` en este hilo
+    (comandos). Devuelve el resumen de procesar_envios() con las solicitadas
+    y los ids que no existen.
+    """
+    ids = list(dict.fromkeys(uuid.UUID(str(pk)) for pk in ids))
+    envios = _crear_envios(ids)
+    resumen = procesar_envios(envios, plantilla, lote, hilos, por_segundo, marcar_enviadas)
+    encontradas = {envio.cotizacion_id for envio in envios}
+    return {
+        'solicitadas': len(ids),
+        'no_encontradas': [pk for pk in ids if pk not in encontradas],
+        **resumen,
+    }
+
+
+def enviar_pendientes(minutos=0, **opciones):
+    """
+    Envía los envíos que siguen 'pendiente' tras `minutos` minutos (el hilo
+    de fondo que los tenía no llegó a enviarlos); devuelve el resumen de
+    procesar_envios().
+    """
+    corte = timezone.now() - timedelta(minutes=minutos)
+    envios = list(EnvioCotizacion.objects.select_related('cotizacion__cliente').filter(
+        estado='pendiente', fecha__lte=corte,
+    ).order_by('fecha'))
+    return procesar_envios(envios, **opciones)
+
+
+def _enviar_en_segundo_plano(pks, plantilla):
+    try:
+        envios = list(EnvioCotizacion.objects.select_related('cotizacion__cliente').filter(
+            pk__in=pks, estado='pendiente',
+        ))
+        procesar_envios(envios, plantilla)
+    except Exception:
+        logger.exception('No se pudieron enviar los correos %s', pks)
+    finally:
+        connections.close_all()
+
+
+def encolar_envios(ids, plantilla=None):
+    """
+    Crea los envíos 'pendiente' de las cotizaciones de `ids` y los envía en
+    un hilo de fondo tras el commit, sin esperar al servidor de correo ni a
+    los PDFs. Devuelve (pks encolados, {pk: motivo} de los que no se envían).
+    """
+    envios = _crear_envios(ids)
+    pendientes = [envio.pk for envio in envios if envio.estado == 'pendiente']
+    if pendientes:
+        transaction.on_commit(lambda: _ejecutor.submit(_enviar_en_segundo_plano, pendientes, plantilla))
+    return (
+        [envio.cotizacion_id for envio in envios if envio.estado == 'pendiente'],
+        {envio.cotizacion_id: envio.error for envio in envios if envio.estado == 'error'},
+    )
@@ -0,0 +1,200 @@
+"""
+Archivos estáticos servidos por la propia aplicación.
+
+* AlmacenEstaticos: ManifestStaticFilesStorage (nombres con el hash del
+  contenido) que además deja junto a cada archivo de texto sus variantes
+  precomprimidas .gz y .br al ejecutar collectstatic. Brotli es opcional.
+* EstaticosMiddleware: sirve STATIC_URL desde STATIC_ROOT con FileResponse,
+  eligiendo la variante comprimida según Accept-Encoding. Los nombres con
+  hash se cachean un año (immutable); el resto unos minutos con ETag.
+* url_recurso(): URL de un recurso de RECURSOS_ESTATICOS, local si ya se
+  descargó con `manage.py vendorizar_estaticos` o del CDN si no.
+* recursos_locales(): system check (también en collectstatic) que avisa de
+  cada recurso sin copia local, o falla si ESTATICOS_CONFIG['cdn_de_respaldo']
+  es False.
+"""
+
+import gzip
+import logging
+import mimetypes
+import os
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core import checks
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, HttpResponse
+from django.templatetags.static import static
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .config import ESTATICOS_CONFIG, RECURSOS_ESTATICOS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONES_COMPRIMIBLES = {'.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ttf', '.otf', '.eot', '.ico'}
+# (Content-Encoding, extensión) en orden de preferencia
+VARIANTES = (('br', '.br'), ('gzip', '.gz'))
+
+_bloqueo = threading.Lock()
+_locales = {}
+
+
+def _comprimir(ruta):
+    """Escribe ruta.gz y ruta.br si ahorran al menos un 5%"""
+    datos = ruta.read_bytes()
+    if len(datos) < ESTATICOS_CONFIG['tamano_minimo_compresion']:
+        return
+    variantes = [('.gz', lambda: gzip.compress(datos, 9, mtime=0))]
+    if brotli is not None:
+        variantes.append(('.br', lambda: brotli.compress(datos)))
+    for extension, compresor in variantes:
+        destino = ruta.with_name(ruta.name + extension)
+        if destino.exists() and destino.stat().st_mtime >= ruta.stat().st_mtime:
+            continue
+        comprimido = compresor()
+        if len(comprimido) < len(datos) * 0.95:
+            destino.write_bytes(comprimido)
+
+
+class AlmacenEstaticos(ManifestStaticFilesStorage):
+    """Manifiesto con hash + variantes .gz/.br generadas en collectstatic"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for raiz, _, archivos in os.walk(self.location):
+            for nombre in archivos:
+                ruta = Path(raiz) / nombre
+                if ruta.suffix in EXTENSIONES_COMPRIMIBLES:
+                    _comprimir(ruta)
+
+
+def url_recurso(nombre):
+    """URL local del recurso si está descargado en static/, si no la del CDN"""
+    recurso = RECURSOS_ESTATICOS[nombre]
+    with _bloqueo:
+        local = _locales.get(nombre)
+        if local is None:
+            local = _locales[nombre] = bool(finders.find(recurso['local']))
+            if not local:
+                logger.warning('%s sin copia local en static/: se usa el CDN %s', nombre, recurso['cdn'])
+    return static(recurso['local']) if local else recurso['cdn']
+
+
+def recursos_locales(app_configs=None, **kwargs):
+    """Avisa (o falla sin CDN de respaldo) por cada recurso que no está en static/"""
+    nivel = checks.Warning if ESTATICOS_CONFIG['cdn_de_respaldo'] else checks.Error
+    return [
+        nivel(
+            f'{nombre} no tiene copia local ({recurso["local"]}); las páginas lo cargarán de {recurso["cdn"]}',
+            hint='Ejecute `manage.py vendorizar_estaticos` y confirme static/vendor/ en el repositorio.',
+            id='cotizaciones.W001' if nivel is checks.Warning else 'cotizaciones.E001',
+        )
+        for nombre, recurso in RECURSOS_ESTATICOS.items()
+        if not finders.find(recurso['local'])
+    ]
+
+
+def _acepta(request, codificacion):
+    for parte in request.headers.get('Accept-Encoding', '').split(','):
+        token, _, parametros = parte.strip().partition(';')
+        if token.strip().lower() == codificacion:
+            return parametros.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+class EstaticosMiddleware:
+    """Sirve STATIC_URL desde STATIC_ROOT con variantes precomprimidas y caché larga"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefijo = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.raiz = Path(settings.STATIC_ROOT).resolve() if getattr(settings, 'STATIC_ROOT', None) else None
+        self._archivos = {}
+        self._hashes = None
+        self._manifiesto_mtime = None
+
+    def __call__(self, request):
+        if self.raiz is None or request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefijo):
+            return self.get_response(request)
+        archivo = self._archivo(request.path[len(self.prefijo):])
+        if archivo is None:
+            return self.get_response(request)
+        return self._respuesta(request, archivo)
+
+    def _con_hash(self, nombre):
+        """Indica si el nombre es uno de los generados por el manifiesto"""
+        ruta = self.raiz / ManifestStaticFilesStorage.manifest_name
+        try:
+            mtime = ruta.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime != self._manifiesto_mtime:
+            rutas, _ = ManifestStaticFilesStorage(location=self.raiz).load_manifest()
+            self._hashes = set(rutas.values())
+            self._manifiesto_mtime = mtime
+            self._archivos.clear()
+        return nombre in self._hashes
+
+    def _archivo(self, relativa):
+        """Datos del archivo (ruta, tipo, variantes, ...) o None si no está en STATIC_ROOT"""
+        con_hash = self._con_hash(relativa)
+        archivo = self._archivos.get(relativa)
+        if archivo is not None:
+            return archivo
+        ruta = (self.raiz / relativa).resolve()
+        if not ruta.is_relative_to(self.raiz) or not ruta.is_file() or ruta.suffix in ('.gz', '.br'):
+            return None
+        estado = ruta.stat()
+        tipo, _ = mimetypes.guess_type(ruta.name)
+        archivo = {
+            'ruta': ruta,
+            'tipo': tipo or 'application/octet-stream',
+            'tamano': estado.st_size,
+            'mtime': int(estado.st_mtime),
+            'etag': f'{estado.st_size:x}-{int(estado.st_mtime):x}',
+            'con_hash': con_hash,
+            'variantes': [
+                (codificacion, ruta.with_name(ruta.name + extension))
+                for codificacion, extension in VARIANTES
+                if ruta.with_name(ruta.name + extension).is_file()
+            ],
+        }
+        self._archivos[relativa] = archivo
+        return archivo
+
+    def _respuesta(self, request, archivo):
+        ruta, codificacion = archivo['ruta'], None
+        for candidata, variante in archivo['variantes']:
+            if _acepta(request, candidata):
+                ruta, codificacion = variante, candidata
+                break
+        etag = quote_etag(archivo['etag'] + (f'-{codificacion}' if codificacion else ''))
+
+        response = get_conditional_response(request, etag=etag, last_modified=archivo['mtime'])
+        if response is None:
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=archivo['tipo'])
+            else:
+                response = FileResponse(open(ruta, 'rb'), content_type=archivo['tipo'])
+            response['Content-Length'] = str(ruta.stat().st_size)
+            if codificacion:
+                response['Content-Encoding'] = codificacion
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(archivo['mtime'])
+        if archivo['variantes']:
+            response['Vary'] = 'Accept-Encoding'
+        if archivo['con_hash']:
+            response['Cache-Control'] = f'public, max-age={ESTATICOS_CONFIG["max_age_hash"]}, immutable'
+        else:
+            response['Cache-Control'] = f'public, max-age={ESTATICOS_CONFIG["max_age"]}'
+        return response
@@ -0,0 +1,235 @@
+"""
+Entrega de la bandeja de salida (EventoCotizacion) a sistemas externos.
+
+Los eventos se insertan en la misma transacción que el cambio que describen
+(Cotizacion.save, transiciones.cambiar_estado, vencer_cotizaciones,
+integridad.reparar_totales), así que guardar no espera a ningún sistema
+externo. `manage.py despachar_eventos` los entrega después: lee los
+pendientes por lotes en orden de id, agrupa los de cada cotización en un
+solo mensaje y envía el lote con un POST JSON a EVENTOS_CONFIG['url']. Los
+errores de red, 5xx, 408 y 429 se reintentan con espera exponencial; si un
+lote no se entrega el despacho se detiene, para no enviar eventos
+posteriores antes que él.
+
+Dos casos no detienen la bandeja: si el receptor rechaza un lote con un 4xx
+permanente, sus mensajes se reenvían de a uno para aislar el rechazado, y
+los eventos de un mensaje rechazado (o que suman
+EVENTOS_CONFIG['intentos_maximos'] POST sin entregarse) pasan a fallidos
+(`fallido` con fecha). Los fallidos no se vuelven a enviar hasta
+reencolarlos (`despachar_eventos --reencolar`).
+
+La entrega es al menos una vez: si el proceso termina entre el POST y la
+marca de enviado, el lote se reenvía. Cada mensaje lleva el id de su último
+evento para que el receptor descarte duplicados. Se asume un solo
+despachador a la vez.
+"""
+
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils import timezone
+
+from .config import EVENTOS_CONFIG
+from .models import EventoCotizacion
+
+# Errores HTTP 4xx que se reintentan; el resto de 4xx son permanentes
+REINTENTABLES = (408, 429)
+
+
+class EntregaFallida(Exception):
+    """
+    El lote no se entregó; `intentos` son los POST realizados y `permanente`
+    indica un rechazo 4xx que no se resuelve reintentando.
+    """
+
+    def __init__(self, mensaje, intentos, permanente=False):
+        super().__init__(mensaje)
+        self.intentos = intentos
+        self.permanente = permanente
+
+
+def agrupar(eventos):
+    """
+    Un mensaje por cotización con los eventos del lote. Los datos posteriores
+    reemplazan a los anteriores (estado y montos finales) y 'anterior' es el
+    estado previo al primer cambio. Una cotización creada en el mismo lote
+    queda solo como 'creada', con sus datos finales, y un cambio de estado
+    que vuelve al inicial se descarta.
+    """
+    mensajes = {}
+    for evento in eventos:
+        mensaje = mensajes.setdefault(evento.cotizacion, {
+            'id': evento.id, 'cotizacion': evento.cotizacion, 'eventos': [], 'fecha': evento.fecha, 'datos': {},
+        })
+        datos = dict(evento.datos)
+        if 'anterior' in mensaje['datos'] or 'creada' in mensaje['eventos']:
+            datos.pop('anterior', None)
+        if evento.tipo not in mensaje['eventos']:
+            mensaje['eventos'].append(evento.tipo)
+        mensaje['datos'].update(datos)
+        mensaje['id'] = evento.id
+        mensaje['fecha'] = evento.fecha
+
+    resultado = []
+    for mensaje in mensajes.values():
+        datos = mensaje['datos']
+        if 'creada' in mensaje['eventos']:
+            mensaje['eventos'] = ['creada']
+        elif 'anterior' in datos and datos['anterior'] == datos['estado']:
+            del datos['anterior']
+            mensaje['eventos'].remove('estado')
+        if mensaje['eventos']:
+            resultado.append(mensaje)
+    return resultado
+
+
+def _espera(intento, retry_after=None):
+    """Segundos antes del reintento `intento` (0, 1, ...): exponencial con variación aleatoria"""
+    maxima = EVENTOS_CONFIG['espera_maxima']
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), maxima)
+        except ValueError:
+            pass
+    return min(maxima, EVENTOS_CONFIG['espera_inicial'] * 2 ** intento) * random.uniform(0.5, 1)
+
+
+def enviar(mensajes, url, clave):
+    """
+    POST de un lote de mensajes con reintentos; devuelve los intentos
+    realizados o lanza EntregaFallida. `clave` va en Idempotency-Key.
+    """
+    cuerpo = json.dumps({'eventos': mensajes}, cls=DjangoJSONEncoder).encode()
+    cabeceras = {
+        'Content-Type': 'application/json', 'Idempotency-Key': clave, **EVENTOS_CONFIG['cabeceras'],
+    }
+    reintentos = EVENTOS_CONFIG['reintentos']
+    for intento in range(reintentos + 1):
+        retry_after = None
+        peticion = urllib.request.Request(url, data=cuerpo, headers=cabeceras, method='POST')
+        try:
+            with urllib.request.urlopen(peticion, timeout=EVENTOS_CONFIG['timeout']):
+                return intento + 1
+        except urllib.error.HTTPError as error:
+            if error.code < 500 and error.code not in REINTENTABLES:
+                raise EntregaFallida(f'HTTP {error.code} {error.reason}', intento + 1, permanente=True) from error
+            ultimo_error = f'HTTP {error.code} {error.reason}'
+            retry_after = error.headers.get('Retry-After')
+        except OSError as error:
+            # URLError, conexión rechazada, timeout
+            ultimo_error = str(getattr(error, 'reason', error))
+        if intento < reintentos:
+            time.sleep(_espera(intento, retry_after))
+    raise EntregaFallida(ultimo_error, reintentos + 1)
+
+
+def pendientes():
+    """Eventos sin entregar que el despachador todavía intenta enviar"""
+    return EventoCotizacion.objects.filter(enviado__isnull=True, fallido__isnull=True)
+
+
+def _entregados(ids, intentos):
+    EventoCotizacion.objects.filter(pk__in=ids).update(
+        enviado=timezone.now(), intentos=F('intentos') + intentos, error='',
+    )
+
+
+def _registrar_fallo(ids, error):
+    """
+    Suma los intentos del fallo y pasa a fallidos los eventos rechazados o
+    que agotaron los intentos; devuelve cuántos pasaron.
+    """
+    eventos = EventoCotizacion.objects.filter(pk__in=ids)
+    eventos.update(intentos=F('intentos') + error.intentos, error=str(error))
+    if not error.permanente:
+        eventos = eventos.filter(intentos__gte=EVENTOS_CONFIG['intentos_maximos'])
+    return eventos.update(fallido=timezone.now())
+
+
+def _enviar_de_a_uno(mensajes, ids_por_cotizacion, url, resumen):
+    """
+    Envía cada mensaje por separado, en orden, tras un rechazo permanente
+    del lote. Devuelve el error transitorio que obliga a detenerse, o None.
+    """
+    for mensaje in mensajes:
+        ids = ids_por_cotizacion[mensaje['cotizacion']]
+        try:
+            intentos = enviar([mensaje], url, f'eventos-{ids[0]}-{ids[-1]}')
+        except EntregaFallida as error:
+            resumen['intentos'] += error.intentos
+            fallidos = _registrar_fallo(ids, error)
+            resumen['fallidos'] += fallidos
+            if fallidos < len(ids):
+                return error
+            continue
+        _entregados(ids, intentos)
+        resumen['eventos'] += len(ids)
+        resumen['mensajes'] += 1
+        resumen['intentos'] += intentos
+    return None
+
+
+def despachar(url=None, lote=None, limite=None):
+    """
+    Entrega los eventos pendientes lote a lote hasta vaciar la bandeja, agotar
+    `limite` lotes o fallar una entrega transitoria. Devuelve un resumen con
+    los conteos (`fallidos`: eventos pasados a fallidos) y el error que
+    detuvo el despacho (o None).
+    """
+    url = url or EVENTOS_CONFIG['url']
+    lote = lote or EVENTOS_CONFIG['lote']
+    resumen = {'lotes': 0, 'eventos': 0, 'mensajes': 0, 'intentos': 0, 'fallidos': 0, 'error': None}
+    while limite is None or resumen['lotes'] < limite:
+        eventos = list(pendientes().order_by('id')[:lote])
+        if not eventos:
+            break
+        ids = [evento.id for evento in eventos]
+        mensajes = agrupar(eventos)
+        try:
+            intentos = enviar(mensajes, url, f'eventos-{ids[0]}-{ids[-1]}') if mensajes else 0
+        except EntregaFallida as error:
+            resumen['intentos'] += error.intentos
+            if error.permanente and len(mensajes) > 1:
+                ids_por_cotizacion = {}
+                for evento in eventos:
+                    ids_por_cotizacion.setdefault(evento.cotizacion, []).append(evento.id)
+                # Los eventos que agrupar() descartó no tienen nada que entregar
+                sin_mensaje = set(ids_por_cotizacion) - {mensaje['cotizacion'] for mensaje in mensajes}
+                _entregados([pk for cotizacion in sin_mensaje for pk in ids_por_cotizacion[cotizacion]], 0)
+                error = _enviar_de_a_uno(mensajes, ids_por_cotizacion, url, resumen)
+            else:
+                fallidos = _registrar_fallo(ids, error)
+                resumen['fallidos'] += fallidos
+                if fallidos == len(ids):
+                    error = None
+            resumen['lotes'] += 1
+            if error:
+                resumen['error'] = str(error)
+                break
+            continue
+        _entregados(ids, intentos)
+        resumen['lotes'] += 1
+        resumen['eventos'] += len(eventos)
+        resumen['mensajes'] += len(mensajes)
+        resumen['intentos'] += intentos
+    return resumen
+
+
+def reencolar():
+    """Devuelve los eventos fallidos a la bandeja con los intentos en cero; devuelve la cantidad"""
+    return EventoCotizacion.objects.filter(enviado__isnull=True, fallido__isnull=False).update(
+        fallido=None, intentos=0, error='',
+    )
+
+
+def purgar(dias):
+    """Borra los eventos enviados hace más de `dias` días; devuelve la cantidad"""
+    corte = timezone.now() - timedelta(days=dias)
+    borrados, _ = EventoCotizacion.objects.filter(enviado__lt=corte).delete()
+    return borrados
@@ -0,0 +1,235 @@
+"""
+Proyección de flujo de caja a partir de las cotizaciones aprobadas.
+
+Cada cotización aprobada se expande en cuotas según su modalidad de pago,
+a partir del mes en que se creó: mensual cobra el total todos los meses,
+anual cada doce meses y único una sola vez. Las cotizaciones no tienen
+fecha de fin: mensual y anual se proyectan sin límite salvo que
+FLUJO_CAJA_CONFIG['cuotas'] fije cuántas cuotas tiene cada modalidad
+(p. ej. {'mensual': 12} para contratos de un año). La cartera de cotizaciones
+aprobadas se guarda en arreglos de NumPy y las cuotas de una ventana de
+meses se acumulan de forma vectorizada (arreglos de diferencias y sumas
+acumuladas), sin generar una fila por cuota.
+
+Cada proceso mantiene la cartera y las proyecciones ya calculadas en
+memoria. En cada consulta solo se leen las cotizaciones modificadas desde
+la última sincronización (fecha_actualizacion) y se corrigen las
+proyecciones cacheadas restando la contribución anterior y sumando la
+nueva. Se conservan las FLUJO_CAJA_CONFIG['proyecciones'] ventanas
+(desde, meses) usadas más recientemente. Borrar cotizaciones invalida todo
+mediante una generación guardada en la caché compartida (settings.CACHES).
+"""
+
+import datetime
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from .config import FLUJO_CAJA_CONFIG
+from .models import Cotizacion
+from .simulacion import desde_centavos, en_centavos
+
+MODALIDADES = ('unico', 'mensual', 'anual')
+CODIGO_MODALIDAD = {modalidad: codigo for codigo, modalidad in enumerate(MODALIDADES)}
+CLAVE_GENERACION = 'flujo_caja:generacion'
+
+_bloqueo = threading.Lock()
+_estado = {
+    'cartera': None, 'generacion': None, 'sincronizado': None, 'cargado': 0.0, 'proyecciones': OrderedDict(),
+}
+
+
+def invalidar_flujo_caja():
+    """Fuerza una recarga completa en todos los procesos (se llama al borrar cotizaciones)"""
+    # Generación aleatoria, como en busqueda.invalidar_cache_clientes
+    cache.set(CLAVE_GENERACION, uuid.uuid4().hex, None)
+
+
+def indice_mes(fecha):
+    return fecha.year * 12 + fecha.month - 1
+
+
+def mes_desde_indice(indice):
+    return datetime.date(indice // 12, indice % 12 + 1, 1)
+
+
+def proyectar(modalidad, inicio, total, desde, meses):
+    """
+    Suma por mes de las cuotas que caen en [desde, desde + meses).
+
+    modalidad, inicio (índice de mes) y total (centavos) son arreglos con una
+    posición por cotización. Devuelve (montos, cuotas), dos matrices de
+    forma (3, meses) con una fila por modalidad.
+    """
+    montos = np.zeros((len(MODALIDADES), meses + 12), dtype=np.int64)
+    cuotas = np.zeros_like(montos)
+    desplazamiento = inicio - desde
+    anual = modalidad == CODIGO_MODALIDAD['anual']
+
+    # Mes siguiente a la última cuota (relativo a la ventana); sin límite de cuotas, fuera de ella
+    cantidad = np.array([1] + [FLUJO_CAJA_CONFIG['cuotas'].get(nombre) or 0 for nombre in MODALIDADES[1:]])
+    cantidad = cantidad[modalidad]
+    fin = np.where(cantidad > 0, desplazamiento + cantidad * np.where(anual, 12, 1), meses)
+
+    # Primera cuota dentro de la ventana según la modalidad
+    primera = np.where(
+        anual,
+        np.where(desplazamiento >= 0, desplazamiento, desplazamiento % 12),
+        np.maximum(desplazamiento, 0),
+    )
+    en_ventana = (primera < meses) & (primera < fin)
+    codigo, primera, fin, total = modalidad[en_ventana], primera[en_ventana], fin[en_ventana], total[en_ventana]
+
+    np.add.at(montos, (codigo, primera), total)
+    np.add.at(cuotas, (codigo, primera), 1)
+    # Las que terminan dentro de la ventana se cancelan en el mes siguiente a la última cuota
+    termina = (fin < meses) & (codigo != CODIGO_MODALIDAD['unico'])
+    np.add.at(montos, (codigo[termina], fin[termina]), -total[termina])
+    np.add.at(cuotas, (codigo[termina], fin[termina]), -1)
+
+    # Las recurrentes se propagan a los meses siguientes con sumas acumuladas
+    for fila, paso in ((CODIGO_MODALIDAD['mensual'], 1), (CODIGO_MODALIDAD['anual'], 12)):
+        for residuo in range(paso):
+            montos[fila, residuo::paso] = np.cumsum(montos[fila, residuo::paso])
+            cuotas[fila, residuo::paso] = np.cumsum(cuotas[fila, residuo::paso])
+    return montos[:, :meses], cuotas[:, :meses]
+
+
+class Cartera:
+    """Cotizaciones aprobadas en arreglos, con una posición fija por cotización"""
+
+    def __init__(self, filas):
+        self.posiciones = {}
+        self.modalidad = np.zeros(len(filas), dtype=np.int64)
+        self.inicio = np.zeros(len(filas), dtype=np.int64)
+        self.total = np.zeros(len(filas), dtype=np.int64)
+        self.activa = np.zeros(len(filas), dtype=bool)
+        for fila in filas:
+            self.actualizar(fila)
+
+    @staticmethod
+    def consulta(queryset):
+        return queryset.order_by().values_list(
+            'id', 'estado', 'modalidad_pago',
+            ExtractYear('fecha_creacion'), ExtractMonth('fecha_creacion'), en_centavos('total'),
+        )
+
+    def _posicion(self, id_cotizacion):
+        posicion = self.posiciones.get(id_cotizacion)
+        if posicion is None:
+            posicion = len(self.posiciones)
+            self.posiciones[id_cotizacion] = posicion
+            if posicion >= len(self.total):
+                capacidad = max(16, 2 * len(self.total))
+                for nombre in ('modalidad', 'inicio', 'total', 'activa'):
+                    arreglo = getattr(self, nombre)
+                    ampliado = np.zeros(capacidad, dtype=arreglo.dtype)
+                    ampliado[:len(arreglo)] = arreglo
+                    setattr(self, nombre, ampliado)
+        return posicion
+
+    def actualizar(self, fila):
+        """Aplica una fila de consulta(); devuelve la posición o None si no cambió nada"""
+        id_cotizacion, estado, modalidad, anio, mes, total = fila
+        aprobada = estado == 'aprobada' and modalidad in CODIGO_MODALIDAD
+        if not aprobada and id_cotizacion not in self.posiciones:
+            return None
+        posicion = self._posicion(id_cotizacion)
+        self.activa[posicion] = aprobada
+        if aprobada:
+            self.modalidad[posicion] = CODIGO_MODALIDAD[modalidad]
+            self.inicio[posicion] = anio * 12 + mes - 1
+            self.total[posicion] = total
+        return posicion
+
+    def contribucion(self, posiciones, desde, meses):
+        """Proyección de un subconjunto de cotizaciones (solo las activas)"""
+        posiciones = np.asarray(posiciones, dtype=np.int64)
+        posiciones = posiciones[self.activa[posiciones]]
+        return proyectar(
+            self.modalidad[posiciones], self.inicio[posiciones], self.total[posiciones], desde, meses,
+        )
+
+    def proyeccion(self, desde, meses):
+        return self.contribucion(np.arange(len(self.posiciones)), desde, meses)
+
+
+def _sincronizar():
+    """Carga la cartera o aplica solo las cotizaciones modificadas desde la última vez"""
+    generacion = cache.get_or_set(CLAVE_GENERACION, lambda: uuid.uuid4().hex, None)
+    ahora = timezone.now()
+    margen = datetime.timedelta(seconds=FLUJO_CAJA_CONFIG['margen_segundos'])
+    recargar = (
+        _estado['cartera'] is None
+        or _estado['generacion'] != generacion
+        or time.monotonic() - _estado['cargado'] > FLUJO_CAJA_CONFIG['recarga_completa_segundos']
+    )
+
+    if recargar:
+        _estado.update(
+            cartera=Cartera(list(Cartera.consulta(Cotizacion.objects.filter(estado='aprobada')))),
+            generacion=generacion,
+            sincronizado=ahora - margen,
+            cargado=time.monotonic(),
+            proyecciones=OrderedDict(),
+        )
+        return
+
+    # El margen cubre transacciones que guardaron antes de la última
+    # sincronización pero confirmaron después; reaplicar una fila es idempotente
+    cambios = list(Cartera.consulta(Cotizacion.objects.filter(fecha_actualizacion__gte=_estado['sincronizado'])))
+    _estado['sincronizado'] = ahora - margen
+    if not cambios:
+        return
+    cartera = _estado['cartera']
+    proyecciones = _estado['proyecciones']
+
+    anteriores = [cartera.posiciones[fila[0]] for fila in cambios if fila[0] in cartera.posiciones]
+    for (desde, meses), (montos, cuotas) in proyecciones.items():
+        restar_montos, restar_cuotas = cartera.contribucion(anteriores, desde, meses)
+        montos -= restar_montos
+        cuotas -= restar_cuotas
+
+    nuevas = [posicion for posicion in map(cartera.actualizar, cambios) if posicion is not None]
+    for (desde, meses), (montos, cuotas) in proyecciones.items():
+        sumar_montos, sumar_cuotas = cartera.contribucion(nuevas, desde, meses)
+        montos += sumar_montos
+        cuotas += sumar_cuotas
+
+
+def flujo_caja(desde=None, meses=None):
+    """
+    Proyección mensual desde el mes de la fecha indicada (por defecto el mes
+    actual). Devuelve una lista de diccionarios, uno por mes.
+    """
+    desde = indice_mes(desde or timezone.localdate())
+    meses = max(1, min(meses or FLUJO_CAJA_CONFIG['meses'], FLUJO_CAJA_CONFIG['maximo_meses']))
+
+    with _bloqueo:
+        _sincronizar()
+        proyecciones = _estado['proyecciones']
+        clave = (desde, meses)
+        if clave in proyecciones:
+            proyecciones.move_to_end(clave)
+        else:
+            proyecciones[clave] = _estado['cartera'].proyeccion(desde, meses)
+            # Cada ventana se corrige en cada sincronización: solo las más usadas
+            while len(proyecciones) > FLUJO_CAJA_CONFIG['proyecciones']:
+                proyecciones.popitem(last=False)
+        montos, cuotas = (matriz.copy() for matriz in proyecciones[clave])
+
+    return [
+        {
+            'mes': mes_desde_indice(desde + columna).strftime('%Y-%m'),
+            **{modalidad: desde_centavos(montos[fila, columna]) for modalidad, fila in CODIGO_MODALIDAD.items()},
+            'total': desde_centavos(montos[:, columna].sum()),
+            'cuotas': int(cuotas[:, columna].sum()),
+        }
+        for columna in range(meses)
+    ]
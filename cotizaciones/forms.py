@@ -1,5 +1,7 @@
 from django import forms
+from django.core.exceptions import ValidationError
 from django.forms import inlineformset_factory
+from django.urls import reverse_lazy
 from .models import Cliente, Servicio, Cotizacion, DetalleCotizacion
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Row, Column, Submit, Button, HTML
@@ -7,6 +9,71 @@ from crispy_forms.bootstrap import TabHolder, Tab
 from decimal import Decimal
 import datetime
 
+class ClienteAutocompleteWidget(forms.Select):
+    """
+    Select de clientes que solo renderiza la opción seleccionada.
+    El resto se carga bajo demanda desde el endpoint de autocompletado,
+    así el HTML no crece con el número de clientes.
+    """
+
+    class Media:
+        js = ['cotizaciones/js/cliente_autocompletado.js']
+
+    def __init__(self, attrs=None):
+        attrs = {
+            'class': 'form-control',
+            'data-autocompletado-url': reverse_lazy('cotizaciones:cliente_autocompletado'),
+            **(attrs or {}),
+        }
+        super().__init__(attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        opciones = [('', '---------')]
+        seleccionados = [v for v in value if v]
+        if seleccionados:
+            try:
+                clientes = Cliente.objects.filter(pk__in=seleccionados)
+                opciones += [(str(cliente.pk), str(cliente)) for cliente in clientes]
+            except ValidationError:
+                pass
+        return [
+            (None, [
+                self.create_option(name, valor, etiqueta, valor in value, indice, attrs=attrs)
+                for indice, (valor, etiqueta) in enumerate(opciones)
+            ], 0)
+        ]
+
+def campos_modificados(form):
+    """Campos del modelo que el usuario cambió (update_fields del guardado)"""
+    return [campo for campo in form.changed_data if campo != 'version']
+
+class VersionOptimistaMixin:
+    """
+    Formularios de modelos con control de concurrencia optimista: la versión
+    leída viaja en un campo oculto y al editar solo se escriben los campos
+    modificados. Si la fila cambió entretanto, save() lanza ConflictoVersion.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Las filas agregadas por JavaScript no la envían
+        self.fields['version'].required = False
+
+    def has_changed(self):
+        # Una fila extra sin versión enviada sigue vacía
+        return bool(campos_modificados(self))
+
+    def clean_version(self):
+        version = self.cleaned_data.get('version')
+        return self.instance.version if version is None else version
+
+    def save(self, commit=True):
+        if not commit or self.instance._state.adding:
+            return super().save(commit)
+        objeto = super().save(commit=False)
+        objeto.save(update_fields=campos_modificados(self))
+        return objeto
+
 class ClienteForm(forms.ModelForm):
     """Formulario para crear y editar clientes"""
     
@@ -77,17 +144,18 @@ class ServicioForm(forms.ModelForm):
             Submit('submit', 'Guardar Servicio', css_class='btn btn-primary')
         )
 
-class CotizacionForm(forms.ModelForm):
+class CotizacionForm(VersionOptimistaMixin, forms.ModelForm):
     """Formulario para crear y editar cotizaciones"""
     
     class Meta:
         model = Cotizacion
         fields = [
             'cliente', 'fecha_vencimiento', 'modalidad_pago', 'estado',
-            'descuento_porcentaje', 'iva_porcentaje', 'notas', 'terminos_condiciones'
+            'descuento_porcentaje', 'iva_porcentaje', 'notas', 'terminos_condiciones', 'version'
         ]
         widgets = {
-            'cliente': forms.Select(attrs={'class': 'form-control'}),
+            'version': forms.HiddenInput(),
+            'cliente': ClienteAutocompleteWidget(),
             'fecha_vencimiento': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'modalidad_pago': forms.Select(attrs={'class': 'form-control'}),
             'estado': forms.Select(attrs={'class': 'form-control'}),
@@ -138,13 +206,14 @@ class CotizacionForm(forms.ModelForm):
             Submit('submit', 'Guardar Cotización', css_class='btn btn-primary')
         )
 
-class DetalleCotizacionForm(forms.ModelForm):
+class DetalleCotizacionForm(VersionOptimistaMixin, forms.ModelForm):
     """Formulario para crear y editar detalles de cotización"""
     
     class Meta:
         model = DetalleCotizacion
-        fields = ['servicio', 'descripcion', 'horas_estimadas', 'tarifa_hora']
+        fields = ['servicio', 'descripcion', 'horas_estimadas', 'tarifa_hora', 'version']
         widgets = {
+            'version': forms.HiddenInput(),
             'servicio': forms.Select(attrs={'class': 'form-control'}),
             'descripcion': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'horas_estimadas': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.5', 'min': '0.5'}),
@@ -199,7 +268,7 @@ DetalleCotizacionFormSet = inlineformset_factory(
     form=DetalleCotizacionForm,
     extra=1,
     can_delete=True,
-    fields=['servicio', 'descripcion', 'horas_estimadas', 'tarifa_hora']
+    fields=['servicio', 'descripcion', 'horas_estimadas', 'tarifa_hora', 'version']
 )
 
 class CotizacionCompletaForm(forms.ModelForm):
@@ -212,7 +281,7 @@ class CotizacionCompletaForm(forms.ModelForm):
             'descuento_porcentaje', 'iva_porcentaje', 'notas', 'terminos_condiciones'
         ]
         widgets = {
-            'cliente': forms.Select(attrs={'class': 'form-control'}),
+            'cliente': ClienteAutocompleteWidget(),
             'fecha_vencimiento': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'modalidad_pago': forms.Select(attrs={'class': 'form-control'}),
             'estado': forms.Select(attrs={'class': 'form-control'}),
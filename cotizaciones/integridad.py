@@ -0,0 +1,181 @@
+"""
+Verificación de los totales guardados de las cotizaciones.
+
+subtotal, descuento_monto, iva_monto y total se guardan desnormalizados y
+pueden desviarse si las líneas cambian sin pasar por DetalleCotizacion.save()
+(UPDATE masivos, SQL directo). verificar_bloque() recalcula un rango de ids
+con dos consultas agregadas: las líneas se suman en la base de datos en
+centavos enteros (exactos también en SQLite) y los montos se derivan con
+montos_redondeados, como en Cotizacion.calcular_totales. Con reparar=True
+corrige líneas y cotizaciones con bulk_update en una transacción por bloque,
+con los mismos efectos por lote que un cambio de estado (transiciones.py):
+estadísticas por cliente, eventos, revisiones y, tras el commit, la señal
+totales_recalculados.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, Count, ExpressionWrapper, F, Sum, Value, When
+from django.db.models.functions import Cast, Round
+from django.db.models.lookups import Exact
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .concurrencia import reintentar_si_bloqueada
+from .revisiones import registrar_revisiones
+from .models import (
+    CAMPOS_MONTO, Cotizacion, DetalleCotizacion, EstadisticasCliente, EventoCotizacion, montos_redondeados,
+)
+
+
+# Una vez por lote tras el commit: corregidas (pks) y anteriores ({pk: {campo: monto guardado}})
+# con los montos que cambiaron
+totales_recalculados = Signal()
+
+
+def _centavos(expresion):
+    return Cast(Round(expresion * 100), BigIntegerField())
+
+
+# horas y tarifa tienen dos decimales: (horas·100 · tarifa·100 + 50) // 100 es
+# el subtotal de la línea en centavos redondeado hacia arriba, en aritmética entera
+CENTAVOS_LINEA = ExpressionWrapper(
+    (_centavos(F('horas_estimadas')) * _centavos(F('tarifa_hora')) + 50) / 100,
+    output_field=BigIntegerField(),
+)
+
+
+def limites(lote):
+    """Ids que inician cada bloque de `lote` cotizaciones (recorre los ids una vez, sin cargarlos todos)"""
+    ids = Cotizacion.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=max(lote, 2000))
+    return [pk for indice, pk in enumerate(ids) if indice % lote == 0]
+
+
+def _rango(prefijo, desde, hasta):
+    filtro = {f'{prefijo}__gte': desde}
+    if hasta is not None:
+        filtro[f'{prefijo}__lt'] = hasta
+    return filtro
+
+
+def _diferencias(desde, hasta=None, ids=None, bloquear=False):
+    """{pk: (fila, esperados, líneas con subtotal distinto)} de las cotizaciones con diferencias"""
+    cotizaciones = Cotizacion.objects.order_by()
+    lineas = DetalleCotizacion.objects.order_by()
+    if ids is not None:
+        cotizaciones = cotizaciones.filter(pk__in=ids)
+        lineas = lineas.filter(cotizacion_id__in=ids)
+    else:
+        cotizaciones = cotizaciones.filter(**_rango('pk', desde, hasta))
+        lineas = lineas.filter(**_rango('cotizacion_id', desde, hasta))
+    if bloquear:
+        cotizaciones = cotizaciones.select_for_update()
+
+    sumas = {
+        fila['cotizacion_id']: fila
+        for fila in lineas.values('cotizacion_id').annotate(
+            centavos=Sum(CENTAVOS_LINEA),
+            distintas=Sum(Case(When(Exact(_centavos(F('subtotal')), CENTAVOS_LINEA), then=Value(0)), default=Value(1))),
+            cantidad=Count('pk'),
+        )
+    }
+    diferencias = {}
+    revisadas = 0
+    for fila in cotizaciones.values(
+        'pk', 'numero_cotizacion', 'cliente_id', 'estado', 'descuento_porcentaje', 'iva_porcentaje', *CAMPOS_MONTO,
+    ):
+        revisadas += 1
+        suma = sumas.get(fila['pk'], {'centavos': 0, 'distintas': 0})
+        esperados = montos_redondeados(
+            Decimal(suma['centavos'] or 0).scaleb(-2), fila['descuento_porcentaje'], fila['iva_porcentaje'],
+        )
+        if suma['distintas'] or any(fila[campo] != esperados[campo] for campo in CAMPOS_MONTO):
+            diferencias[fila['pk']] = (fila, esperados, suma['distintas'] or 0)
+    lineas_revisadas = sum(suma['cantidad'] for suma in sumas.values())
+    return diferencias, revisadas, lineas_revisadas
+
+
+@reintentar_si_bloqueada()
+def reparar_totales(ids):
+    """Corrige líneas y totales de esas cotizaciones; devuelve (ids de cotizaciones, cantidad de líneas) corregidas"""
+    with transaction.atomic():
+        # Se recalculan con las filas bloqueadas: pudieron cambiar desde la verificación
+        diferencias, _, _ = _diferencias(None, ids=ids, bloquear=True)
+        if not diferencias:
+            return [], 0
+
+        lineas = []
+        con_lineas = [pk for pk, (_, _, distintas) in diferencias.items() if distintas]
+        for detalle in DetalleCotizacion.objects.filter(cotizacion_id__in=con_lineas).only(
+            'pk', 'horas_estimadas', 'tarifa_hora', 'subtotal',
+        ):
+            guardado = detalle.subtotal
+            if detalle.calcular_subtotal() != guardado:
+                # Nueva versión: un formulario abierto con la anterior dará conflicto
+                detalle.version = F('version') + 1
+                lineas.append(detalle)
+        DetalleCotizacion.objects.bulk_update(lineas, ['subtotal', 'version'], batch_size=500)
+
+        # fecha_actualizacion: la proyección de flujo de caja vuelve a leerlas
+        ahora = timezone.now()
+        cotizaciones = [
+            Cotizacion(pk=pk, fecha_actualizacion=ahora, version=F('version') + 1, **esperados)
+            for pk, (_, esperados, _) in diferencias.items()
+        ]
+        Cotizacion.objects.bulk_update(cotizaciones, [*CAMPOS_MONTO, 'fecha_actualizacion', 'version'], batch_size=500)
+
+        # bulk_update no pasa por Cotizacion.save(): se ajustan las estadísticas por cliente
+        cambios = []
+        for fila, esperados, _ in diferencias.values():
+            if fila['total'] != esperados['total']:
+                cambios.append((fila['cliente_id'], fila['estado'], fila['total'], -1))
+                cambios.append((fila['cliente_id'], fila['estado'], esperados['total'], 1))
+        EstadisticasCliente.ajustar(cambios)
+        anteriores = {
+            pk: {campo: fila[campo] for campo in CAMPOS_MONTO if fila[campo] != esperados[campo]}
+            for pk, (fila, esperados, _) in diferencias.items()
+        }
+        EventoCotizacion.registrar(
+            (pk, 'totales', {'numero': fila['numero_cotizacion'], **esperados})
+            for pk, (fila, esperados, _) in diferencias.items()
+            if anteriores[pk]
+        )
+        registrar_revisiones(list(diferencias))
+        corregidas = list(diferencias)
+        transaction.on_commit(
+            lambda: totales_recalculados.send(sender=Cotizacion, corregidas=corregidas, anteriores=anteriores)
+        )
+    return list(diferencias), len(lineas)
+
+
+def verificar_bloque(desde, hasta=None, reparar=False, muestra=20):
+    """
+    Verifica las cotizaciones con id en [desde, hasta). Devuelve un resumen
+    con los conteos y hasta `muestra` diferencias (campo: guardado, esperado).
+    """
+    diferencias, revisadas, lineas = _diferencias(desde, hasta)
+    resumen = {
+        'revisadas': revisadas,
+        'lineas': lineas,
+        'con_diferencias': len(diferencias),
+        'lineas_distintas': sum(distintas for _, _, distintas in diferencias.values()),
+        'diferencia_total': sum((esperados['total'] - fila['total'] for fila, esperados, _ in diferencias.values()), Decimal('0')),
+        'reparadas': 0,
+        'lineas_reparadas': 0,
+        'muestra': [
+            {
+                'numero': fila['numero_cotizacion'],
+                'lineas_distintas': distintas,
+                'campos': {
+                    campo: (fila[campo], esperados[campo])
+                    for campo in CAMPOS_MONTO if fila[campo] != esperados[campo]
+                },
+            }
+            for fila, esperados, distintas in list(diferencias.values())[:muestra]
+        ],
+    }
+    if reparar and diferencias:
+        reparadas, resumen['lineas_reparadas'] = reparar_totales(list(diferencias))
+        resumen['reparadas'] = len(reparadas)
+    return resumen
@@ -0,0 +1,76 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from cotizaciones.archivo import archivables, archivar, medir_consultas, tamano_tablas
+from cotizaciones.models import (
+    CotizacionArchivada, Cotizacion, DetalleArchivado, DetalleCotizacion, PdfCotizacion, ResumenArchivo,
+    RevisionCotizacion,
+)
+
+TABLAS_VIVAS = (Cotizacion, DetalleCotizacion, RevisionCotizacion, PdfCotizacion)
+TABLAS_ARCHIVO = (CotizacionArchivada, DetalleArchivado)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve a las tablas de archivo las cotizaciones cerradas (rechazadas, canceladas o aprobadas '
+        'de pago único) sin cambios en los últimos N días, por lotes. Informa el tamaño de las tablas '
+        'de trabajo y el tiempo de las consultas del dashboard antes y después.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=730, help='Antigüedad mínima en días')
+        parser.add_argument('--lote', type=int, default=500, help='Cotizaciones por transacción')
+        parser.add_argument('--limite', type=int, help='Máximo de cotizaciones a archivar en esta ejecución')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar, sin mover')
+        parser.add_argument('--recalcular-resumen', action='store_true', help='Rehacer ResumenArchivo desde el archivo')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0.')
+        if options['recalcular_resumen']:
+            ResumenArchivo.recalcular()
+            self.stdout.write(self.style.SUCCESS('Resumen del archivo recalculado'))
+
+        corte = timezone.now() - timedelta(days=options['dias'])
+        pendientes = archivables(corte).count()
+        if options['limite'] is not None:
+            pendientes = min(pendientes, options['limite'])
+        if options['dry_run']:
+            self.stdout.write(f'{pendientes} cotizaciones se archivarían (anteriores a {corte:%Y-%m-%d})')
+            return
+        if not pendientes:
+            self.stdout.write('No hay cotizaciones para archivar')
+            return
+
+        antes_tablas, antes_consultas = tamano_tablas(TABLAS_VIVAS), medir_consultas()
+        inicio = time.perf_counter()
+        archivadas = archivar(
+            corte, lote=options['lote'], limite=options['limite'],
+            progreso=lambda total: self.stdout.write(f'  {total}/{pendientes} archivadas'),
+        )
+        duracion = time.perf_counter() - inicio
+        despues_tablas, despues_consultas = tamano_tablas(TABLAS_VIVAS), medir_consultas()
+
+        self.stdout.write(f'\n{"Tabla":<36}{"filas antes":>12}{"filas después":>15}{"KB antes":>11}{"KB después":>12}')
+        for tabla, (filas, tamano) in antes_tablas.items():
+            filas_despues, tamano_despues = despues_tablas[tabla]
+            self.stdout.write(
+                f'{tabla:<36}{filas:>12}{filas_despues:>15}{_kb(tamano):>11}{_kb(tamano_despues):>12}'
+            )
+        # SQLite no reduce el archivo al borrar: las páginas libres se reutilizan (o VACUUM)
+        for tabla, (filas, tamano) in tamano_tablas(TABLAS_ARCHIVO).items():
+            self.stdout.write(f'{tabla:<36}{"":>12}{filas:>15}{"":>11}{_kb(tamano):>12}')
+
+        self.stdout.write(f'\n{"Consulta":<24}{"ms antes":>10}{"ms después":>12}')
+        for nombre, ms in antes_consultas.items():
+            self.stdout.write(f'{nombre:<24}{ms:>10.2f}{despues_consultas[nombre]:>12.2f}')
+
+        self.stdout.write(self.style.SUCCESS(f'\n{archivadas} cotizaciones archivadas en {duracion:.2f}s'))
+
+
+def _kb(tamano):
+    return '-' if tamano is None else f'{tamano / 1024:.0f}'
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from cotizaciones.models import Cotizacion
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el costo de conexión por petición comparando CONN_MAX_AGE=0 '
+        'contra la configuración actual de conexiones persistentes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=500, help='Peticiones simuladas por escenario')
+
+    def handle(self, *args, **options):
+        peticiones = options['peticiones']
+        configurado = connection.settings_dict['CONN_MAX_AGE']
+
+        self.stdout.write(f'Motor: {connection.vendor} - {peticiones} peticiones por escenario')
+        sin_persistencia = self._medir(peticiones, conn_max_age=0)
+        persistente = self._medir(peticiones, conn_max_age=configurado or 60)
+
+        for nombre, (segundos, conexiones) in (
+            ('CONN_MAX_AGE=0', sin_persistencia),
+            (f'CONN_MAX_AGE={configurado or 60}', persistente),
+        ):
+            self.stdout.write(
+                f'{nombre:<20} {segundos / peticiones * 1000:8.3f} ms/petición '
+                f'{conexiones:6d} conexiones abiertas'
+            )
+
+        ahorro = (sin_persistencia[0] - persistente[0]) / peticiones * 1000
+        self.stdout.write(self.style.SUCCESS(f'Overhead de conexión eliminado: {ahorro:.3f} ms/petición'))
+
+    def _medir(self, peticiones, conn_max_age):
+        """Simula el ciclo de vida de una petición: inicio, consulta ligera y cierre"""
+        conexiones = []
+
+        def contar(sender, connection, **kwargs):
+            conexiones.append(connection.alias)
+
+        original = connection.settings_dict['CONN_MAX_AGE']
+        connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+        connection.close()
+        connection_created.connect(contar)
+        try:
+            inicio = time.perf_counter()
+            for _ in range(peticiones):
+                request_started.send(sender=self.__class__)
+                Cotizacion.objects.filter(estado='enviada').exists()
+                request_finished.send(sender=self.__class__)
+            duracion = time.perf_counter() - inicio
+        finally:
+            connection_created.disconnect(contar)
+            connection.settings_dict['CONN_MAX_AGE'] = original
+            connection.close()
+        return duracion, len(conexiones)
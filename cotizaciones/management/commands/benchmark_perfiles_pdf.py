@@ -0,0 +1,131 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from cotizaciones.config import PERFILES_PDF
+from cotizaciones.models import Cliente, Cotizacion, DetalleCotizacion, Servicio, totales_en_memoria
+from cotizaciones.pdf import PLANTILLAS, contexto_pdf, renderizar
+from cotizaciones.replicas import en_replica
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide tiempo de render y tamaño del PDF de cada perfil (PERFILES_PDF) '
+        'sobre las cotizaciones de la base de datos o un corpus sintético'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--perfiles', nargs='+', default=list(PERFILES_PDF), help='Perfiles a medir')
+        parser.add_argument('--plantilla', choices=list(PLANTILLAS), default='completo')
+        parser.add_argument('--limite', type=int, default=20, help='Cotizaciones de la base de datos a usar')
+        parser.add_argument('--sinteticas', type=int, default=0, help='Usar N cotizaciones sintéticas (sin escribir en la base)')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Renders por cotización y perfil')
+        parser.add_argument('--semilla', type=int, default=0)
+
+    def handle(self, *args, **options):
+        desconocidos = set(options['perfiles']) - set(PERFILES_PDF)
+        if desconocidos:
+            raise CommandError(f'Perfiles desconocidos: {", ".join(sorted(desconocidos))}')
+
+        plantilla = options['plantilla']
+        if options['sinteticas']:
+            corpus = self._corpus_sintetico(options['sinteticas'], options['semilla'])
+            origen = 'sintético'
+        else:
+            # Las de más líneas primero: son las que más pesan en el render
+            with en_replica():
+                cotizaciones = (
+                    Cotizacion.objects.select_related('cliente')
+                    .annotate(lineas=Count('detallecotizacion')).order_by('-lineas')[:options['limite']]
+                )
+                corpus = [
+                    (cotizacion, list(cotizacion.detallecotizacion_set.select_related('servicio')))
+                    for cotizacion in cotizaciones
+                ]
+            origen = 'base de datos'
+        if not corpus:
+            self.stdout.write(self.style.WARNING('No hay cotizaciones; use --sinteticas N'))
+            return
+
+        # El HTML se renderiza una vez: solo se mide WeasyPrint
+        documentos = [
+            render_to_string(PLANTILLAS[plantilla], contexto_pdf(cotizacion, plantilla, detalles))
+            for cotizacion, detalles in corpus
+        ]
+        lineas = sum(len(detalles) for _, detalles in corpus)
+        self.stdout.write(
+            f'Corpus {origen}: {len(corpus)} cotizaciones, {lineas} líneas, plantilla {plantilla}, '
+            f'{options["repeticiones"]} repeticiones'
+        )
+        # Calienta fuentes y la caché de imágenes para no cargarlas al primer perfil
+        renderizar(documentos[0], options['perfiles'][0], bloquear=True)
+
+        self.stdout.write(f'{"Perfil":<14}{"mediana ms":>12}{"p95 ms":>10}{"KB medio":>10}{"KB total":>10}')
+        for perfil in options['perfiles']:
+            tiempos = []
+            tamanos = []
+            for html_string in documentos:
+                for _ in range(options['repeticiones']):
+                    inicio = time.perf_counter()
+                    datos = renderizar(html_string, perfil, bloquear=True)
+                    tiempos.append(time.perf_counter() - inicio)
+                tamanos.append(len(datos))
+            tiempos.sort()
+            p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+            self.stdout.write(
+                f'{perfil:<14}{statistics.median(tiempos) * 1000:>12.1f}{p95 * 1000:>10.1f}'
+                f'{statistics.mean(tamanos) / 1024:>10.1f}{sum(tamanos) / 1024:>10.1f}'
+            )
+
+    def _corpus_sintetico(self, cantidad, semilla):
+        """Cotizaciones en memoria (sin guardar) con 1 a 40 líneas, parecidas a las reales"""
+        generador = random.Random(semilla)
+        servicios = [
+            Servicio(nombre=f'Servicio {indice}', descripcion='Servicio sintético', tarifa_hora=Decimal(tarifa))
+            for indice, tarifa in enumerate((25, 40, 55, 75, 90, 120, 150))
+        ]
+        ahora = timezone.now()
+        corpus = []
+        for indice in range(cantidad):
+            cliente = Cliente(
+                nombre=f'Cliente {indice}', email=f'cliente{indice}@example.com',
+                empresa=f'Empresa {indice}', telefono='809-555-0100', direccion='Calle 1 #23, Santo Domingo',
+            )
+            detalles = []
+            for _ in range(generador.randint(1, 40)):
+                servicio = generador.choice(servicios)
+                detalles.append(DetalleCotizacion(
+                    servicio=servicio,
+                    descripcion=' '.join(generador.choices(
+                        ('Análisis', 'desarrollo', 'de', 'módulo', 'integración', 'pruebas', 'API', 'reportes'),
+                        k=generador.randint(4, 30),
+                    )),
+                    horas_estimadas=Decimal(generador.randint(100, 20000)) / 100,
+                    tarifa_hora=servicio.tarifa_hora,
+                ))
+            descuento = Decimal(generador.choice((0, 5, 10, 15)))
+            iva = Decimal(generador.choice((16, 18)))
+            totales = totales_en_memoria(
+                [(detalle.horas_estimadas, detalle.tarifa_hora) for detalle in detalles], descuento, iva,
+            )
+            for detalle, subtotal in zip(detalles, totales['lineas']):
+                detalle.subtotal = subtotal
+            cotizacion = Cotizacion(
+                numero_cotizacion=f'BENCH-{indice:05d}', cliente=cliente,
+                fecha_creacion=ahora, fecha_vencimiento=(ahora + timedelta(days=30)).date(),
+                modalidad_pago=generador.choice(('unico', 'mensual', 'anual')),
+                descuento_porcentaje=descuento, iva_porcentaje=iva,
+                subtotal=totales['subtotal'], descuento_monto=totales['descuento_monto'],
+                iva_monto=totales['iva_monto'], total=totales['total'],
+                notas='Cotización sintética para medir perfiles PDF.' if indice % 2 else '',
+                terminos_condiciones='Pago a 30 días.\nValidez de la oferta: 30 días.',
+            )
+            corpus.append((cotizacion, detalles))
+        return corpus
@@ -0,0 +1,108 @@
+import time
+import uuid
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from cotizaciones.models import totales_en_memoria
+from cotizaciones.simulacion import (
+    Escenario, LibroCotizaciones, Simulacion, cargar_libro, desde_centavos,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el simulador vectorizado de precios sobre un libro sintético '
+        '(o las cotizaciones abiertas de la base de datos) y lo verifica '
+        'contra el motor Decimal'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lineas', type=int, default=1_000_000, help='Líneas del libro sintético')
+        parser.add_argument('--cotizaciones', type=int, default=50_000, help='Cotizaciones del libro sintético')
+        parser.add_argument('--servicios', type=int, default=40, help='Servicios del libro sintético')
+        parser.add_argument('--bd', action='store_true', help='Usar las cotizaciones abiertas de la base de datos')
+        parser.add_argument('--verificar', type=int, default=500, help='Cotizaciones a comparar con el motor Decimal')
+        parser.add_argument('--semilla', type=int, default=0)
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if options['bd']:
+            libro = cargar_libro()
+            origen = 'base de datos'
+        else:
+            libro = self._libro_sintetico(options['lineas'], options['cotizaciones'], options['servicios'], options['semilla'])
+            origen = 'sintético'
+        carga = time.perf_counter() - inicio
+        self.stdout.write(
+            f'Libro {origen}: {len(libro.cotizaciones)} cotizaciones, {libro.total_lineas} líneas '
+            f'(carga {carga * 1000:.1f} ms)'
+        )
+        if not libro.total_lineas:
+            self.stdout.write(self.style.WARNING('No hay líneas que simular'))
+            return
+
+        # Escenario: +10% a la mitad de los servicios, IVA 18%
+        escenario = Escenario(
+            tarifas={
+                libro.servicios[codigo]: desde_centavos(libro.tarifa[np.argmax(libro.servicio == codigo)]) * 11 / 10
+                for codigo in range(0, len(libro.servicios), 2)
+            },
+            iva_porcentaje=18,
+        )
+        simulacion = Simulacion(libro, escenario)
+        self.stdout.write(f'Simulación vectorizada: {simulacion.duracion * 1000:.1f} ms')
+        for nombre, montos in simulacion.agregado().items():
+            self.stdout.write(f'  {nombre:<9} total {montos["total"]}')
+
+        self.stdout.write(f'Referencia Decimal (lazo por cotización): {self._medir_decimal(simulacion) * 1000:.0f} ms estimados')
+
+        verificacion = simulacion.verificar(options['verificar'], semilla=options['semilla'])
+        if verificacion['diferencias']:
+            self.stdout.write(self.style.ERROR(
+                f'{len(verificacion["diferencias"])} de {verificacion["muestra"]} cotizaciones no coinciden: '
+                f'{", ".join(verificacion["diferencias"][:10])}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Verificación: {verificacion["muestra"]} cotizaciones idénticas al motor Decimal'
+            ))
+
+    def _libro_sintetico(self, lineas, cotizaciones, servicios, semilla):
+        generador = np.random.default_rng(semilla)
+        tarifas_servicio = generador.integers(1_500, 20_000, servicios)
+        servicio = generador.integers(0, servicios, lineas).astype(np.int32)
+        tarifa = tarifas_servicio[servicio]
+        # Una parte de las líneas con tarifa negociada distinta a la del servicio
+        negociadas = generador.random(lineas) < 0.2
+        tarifa[negociadas] = generador.integers(1_000, 25_000, int(negociadas.sum()))
+        return LibroCotizaciones(
+            cotizaciones=[(uuid.uuid4(), f'SIM-{indice:06d}') for indice in range(cotizaciones)],
+            descuento=generador.choice([0, 500, 1000, 1250, 1550], cotizaciones),
+            iva=generador.choice([1600, 1600, 1800, 0], cotizaciones),
+            servicios=[uuid.uuid4() for _ in range(servicios)],
+            cotizacion=np.sort(generador.integers(0, cotizaciones, lineas)),
+            servicio=servicio,
+            horas=generador.integers(1, 50_000, lineas),
+            tarifa=tarifa,
+        )
+
+    def _medir_decimal(self, simulacion, muestra=500):
+        """Tiempo del motor Decimal sobre una muestra, extrapolado al libro completo"""
+        libro = simulacion.libro
+        cantidad = min(muestra, len(libro.cotizaciones))
+        inicio = time.perf_counter()
+        lineas_medidas = 0
+        for indice in range(cantidad):
+            desde, hasta = libro.lineas_de(indice)
+            lineas_medidas += hasta - desde
+            totales_en_memoria(
+                [
+                    (desde_centavos(horas), desde_centavos(tarifa))
+                    for horas, tarifa in zip(libro.horas[desde:hasta], simulacion.tarifa[desde:hasta])
+                ],
+                desde_centavos(simulacion.descuento[indice]),
+                desde_centavos(simulacion.iva[indice]),
+            )
+        duracion = time.perf_counter() - inicio
+        return duracion * libro.total_lineas / max(lineas_medidas, 1)
@@ -0,0 +1,81 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Q
+
+
+def _iniciar():
+    import django
+    django.setup()
+
+
+def _congelar(pendiente):
+    """Proceso hijo: congela los PDFs de una cotización"""
+    from django.db import connections
+
+    from cotizaciones.pdf import congelar_pdf
+
+    cotizacion_id, estado = pendiente
+    try:
+        return len(congelar_pdf(cotizacion_id, estado, bloquear=True)), None
+    except Exception as error:
+        return 0, f'{cotizacion_id}: {error}'
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera en paralelo los PDFs congelados que faltan de las cotizaciones '
+        'enviadas o aprobadas (por ejemplo, las anteriores a esta función)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=multiprocessing.cpu_count(), help='Procesos en paralelo')
+        parser.add_argument('--limite', type=int, help='Máximo de cotizaciones a procesar')
+
+    def handle(self, *args, **options):
+        from cotizaciones.models import Cotizacion, PdfCotizacion
+
+        # Cotizaciones a las que les falta alguna plantilla congelada en su estado actual
+        pendientes = list(
+            Cotizacion.objects.filter(estado__in=PdfCotizacion.ESTADOS_CONGELADOS)
+            .annotate(congelados=Count('pdfs', filter=Q(pdfs__estado=F('estado'))))
+            .filter(congelados__lt=len(PdfCotizacion.PLANTILLA_CHOICES))
+            .order_by('fecha_creacion')
+            .values_list('pk', 'estado')[:options['limite']]
+        )
+        if not pendientes:
+            self.stdout.write(self.style.SUCCESS('No hay PDFs pendientes de congelar'))
+            return
+
+        procesos = max(1, min(options['procesos'], len(pendientes)))
+        self.stdout.write(f'Congelando {len(pendientes)} cotizaciones con {procesos} procesos...')
+        inicio = time.perf_counter()
+        generados = 0
+        errores = []
+        if procesos == 1:
+            # Sin pool: evita arrancar un intérprete para pocas cotizaciones
+            resultados = map(_congelar, pendientes)
+        else:
+            contexto = multiprocessing.get_context('spawn')
+            pool = contexto.Pool(procesos, initializer=_iniciar)
+            resultados = pool.imap_unordered(_congelar, pendientes, chunksize=4)
+        try:
+            for cantidad, error in resultados:
+                generados += cantidad
+                if error:
+                    errores.append(error)
+        finally:
+            if procesos > 1:
+                pool.terminate()
+        duracion = time.perf_counter() - inicio
+
+        for error in errores[:20]:
+            self.stderr.write(error)
+        estilo = self.style.WARNING if errores else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f'{generados} PDFs congelados en {duracion:.1f}s '
+            f'({len(pendientes) / duracion:.1f} cotizaciones/s), {len(errores)} errores'
+        ))
@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cotizaciones.config import EVENTOS_CONFIG
+from cotizaciones.eventos import despachar, pendientes, purgar, reencolar
+from cotizaciones.models import EventoCotizacion
+
+
+class Command(BaseCommand):
+    help = (
+        'Entrega por lotes los eventos pendientes de la bandeja de salida (creación, cambio de '
+        'estado y totales de cotizaciones) al endpoint de EVENTOS_CONFIG, agrupados por cotización'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Endpoint (por defecto EVENTOS_CONFIG["url"])')
+        parser.add_argument('--lote', type=int, default=EVENTOS_CONFIG['lote'], help='Eventos por POST')
+        parser.add_argument('--limite', type=int, help='Máximo de lotes por ejecución')
+        parser.add_argument('--loop', action='store_true', help='Repetir indefinidamente')
+        parser.add_argument(
+            '--intervalo', type=float, default=EVENTOS_CONFIG['intervalo'],
+            help='Segundos entre sondeos con --loop',
+        )
+        parser.add_argument('--purgar-dias', type=int, help='Borrar además los eventos enviados hace más de N días')
+        parser.add_argument(
+            '--reencolar', action='store_true', help='Devolver los eventos fallidos a la bandeja antes de despachar',
+        )
+
+    def handle(self, *args, **options):
+        url = options['url'] or EVENTOS_CONFIG['url']
+        if not url:
+            raise CommandError('No hay endpoint configurado (EVENTOS_CONFIG["url"] o --url).')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0.')
+
+        if options['purgar_dias'] is not None:
+            self.stdout.write(f'{purgar(options["purgar_dias"])} eventos enviados purgados')
+        if options['reencolar']:
+            self.stdout.write(f'{reencolar()} eventos fallidos reencolados')
+
+        while True:
+            resumen = self._despachar(url, options)
+            if not options['loop']:
+                break
+            if resumen['error']:
+                # El lote sigue pendiente: se reintenta en el próximo sondeo
+                self.stderr.write(f'Entrega interrumpida: {resumen["error"]}')
+            time.sleep(EVENTOS_CONFIG['espera_maxima'] if resumen['error'] else options['intervalo'])
+
+        if resumen['error']:
+            raise CommandError(f'Entrega interrumpida: {resumen["error"]}')
+
+    def _despachar(self, url, options):
+        inicio = time.perf_counter()
+        resumen = despachar(url, options['lote'], options['limite'])
+        duracion = time.perf_counter() - inicio
+        if resumen['eventos'] or resumen['fallidos'] or resumen['error']:
+            self.stdout.write(
+                f'{resumen["eventos"]} eventos en {resumen["mensajes"]} mensajes y {resumen["lotes"]} lotes '
+                f'({resumen["intentos"]} POST) en {duracion:.2f}s; {pendientes().count()} pendientes'
+            )
+        if resumen['fallidos']:
+            fallidos = EventoCotizacion.objects.filter(enviado__isnull=True, fallido__isnull=False).count()
+            self.stderr.write(
+                f'{resumen["fallidos"]} eventos pasaron a fallidos ({fallidos} en total; --reencolar los reintenta)'
+            )
+        return resumen
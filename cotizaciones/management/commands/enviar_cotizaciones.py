@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cotizaciones.config import CORREO_CONFIG
+from cotizaciones.correo import enviar_cotizaciones, enviar_pendientes
+from cotizaciones.models import Cotizacion
+from cotizaciones.pdf import PLANTILLAS
+
+
+class Command(BaseCommand):
+    help = (
+        'Envía por correo a sus clientes las cotizaciones indicadas (o las de --estado) con el PDF '
+        'adjunto, una conexión por lote y lotes en paralelo, e informa los mensajes por segundo. '
+        'Con --pendientes envía los encolados desde la web que no llegaron a salir'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', help='Ids de las cotizaciones')
+        parser.add_argument(
+            '--estado', choices=[estado for estado, _ in Cotizacion.ESTADO_CHOICES],
+            help='Enviar todas las cotizaciones en este estado',
+        )
+        parser.add_argument('--limite', type=int, help='Máximo de cotizaciones con --estado')
+        parser.add_argument('--pendientes', action='store_true', help="Enviar los envíos que siguen 'pendiente'")
+        parser.add_argument(
+            '--minutos', type=float, default=10,
+            help='Con --pendientes, solo los encolados hace más de N minutos (los recientes los envía la web)',
+        )
+        parser.add_argument('--lote', type=int, default=CORREO_CONFIG['lote'], help='Mensajes por conexión')
+        parser.add_argument('--hilos', type=int, default=CORREO_CONFIG['hilos'], help='Lotes en paralelo')
+        parser.add_argument(
+            '--por-segundo', type=float, default=CORREO_CONFIG['por_segundo'],
+            help='Máximo de mensajes por segundo (0 sin límite)',
+        )
+        parser.add_argument('--plantilla', choices=list(PLANTILLAS), default=CORREO_CONFIG['plantilla'])
+        parser.add_argument(
+            '--sin-marcar', action='store_true', help="No pasar a 'enviada' los borradores y vencidas enviados",
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1 or options['hilos'] < 1:
+            raise CommandError('--lote y --hilos deben ser mayores que 0.')
+        envio = {
+            'plantilla': options['plantilla'], 'lote': options['lote'], 'hilos': options['hilos'],
+            'por_segundo': options['por_segundo'], 'marcar_enviadas': not options['sin_marcar'],
+        }
+        ids = list(options['ids'])
+        if options['estado']:
+            seleccion = Cotizacion.objects.filter(estado=options['estado']).order_by('fecha_creacion')
+            ids += [str(pk) for pk in seleccion.values_list('pk', flat=True)[:options['limite']]]
+        if options['pendientes']:
+            if ids:
+                raise CommandError('--pendientes no se combina con ids ni --estado.')
+            resumen = enviar_pendientes(options['minutos'], **envio)
+        elif not ids:
+            raise CommandError('Indique ids de cotizaciones, --estado o --pendientes.')
+        else:
+            try:
+                resumen = enviar_cotizaciones(ids, **envio)
+            except ValueError as error:
+                raise CommandError(f'Id de cotización no válido: {error}')
+
+        for pk, motivo in list(resumen['errores'].items())[:10]:
+            self.stdout.write(self.style.WARNING(f'  {pk}: {motivo}'))
+        if resumen.get('no_encontradas'):
+            self.stdout.write(self.style.WARNING(f'{len(resumen["no_encontradas"])} cotizaciones no encontradas'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(resumen["enviadas"])} enviadas, {len(resumen["errores"])} con error, en {resumen["lotes"]} lotes '
+            f'({min(options["hilos"], resumen["lotes"]) or 1} hilos) y {resumen["segundos"]:.2f}s: '
+            f'{resumen["mensajes_por_segundo"]:.1f} mensajes/s'
+        ))
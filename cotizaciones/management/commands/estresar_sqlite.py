@@ -0,0 +1,111 @@
+import multiprocessing
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+
+def _trabajador(nombre_bd, indice, guardados, lineas, cliente_id, servicio_id, resultados):
+    """Proceso hijo: repite el ciclo crear cotización + detalles + recálculo"""
+    import django
+    from django.conf import settings
+
+    # La misma base que el proceso padre (p. ej. la de los tests)
+    settings.DATABASES['default']['NAME'] = nombre_bd
+    django.setup()
+
+    from cotizaciones.concurrencia import es_error_bloqueo, reintentar_si_bloqueada
+    from cotizaciones.models import Cotizacion, DetalleCotizacion, totales_diferidos
+
+    @reintentar_si_bloqueada()
+    def guardar(numero):
+        with transaction.atomic():
+            cotizacion = Cotizacion.objects.create(
+                numero_cotizacion=numero,
+                cliente_id=cliente_id,
+                fecha_vencimiento=date.today() + timedelta(days=30),
+            )
+            with totales_diferidos(cotizacion):
+                for linea in range(lineas):
+                    DetalleCotizacion(
+                        cotizacion=cotizacion,
+                        servicio_id=servicio_id,
+                        descripcion=f'Línea {linea}',
+                        horas_estimadas=Decimal('1.50'),
+                        tarifa_hora=Decimal('40.00'),
+                    ).save()
+
+    exitos = errores = 0
+    for numero in range(guardados):
+        try:
+            guardar(f'EST-{indice:02d}-{numero:05d}-{uuid.uuid4().hex[:4]}')
+            exitos += 1
+        except OperationalError as error:
+            if not es_error_bloqueo(error):
+                raise
+            errores += 1
+    resultados.put((exitos, errores))
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de estrés multiproceso sobre SQLite: varios procesos guardan '
+        'cotizaciones con detalles a la vez y se reportan bloqueos y throughput'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=3, help='Procesos concurrentes (workers)')
+        parser.add_argument('--guardados', type=int, default=50, help='Cotizaciones guardadas por proceso')
+        parser.add_argument('--lineas', type=int, default=5, help='Detalles por cotización')
+        parser.add_argument('--conservar', action='store_true', help='No eliminar los datos generados')
+
+    def handle(self, *args, **options):
+        from cotizaciones.models import Cliente, Cotizacion, Servicio
+
+        if connection.vendor != 'sqlite':
+            raise CommandError('Esta prueba está pensada para el backend SQLite.')
+
+        cliente = Cliente.objects.create(nombre='Estrés SQLite', email='estres@example.com')
+        servicio = Servicio.objects.create(
+            nombre='Estrés SQLite', descripcion='Servicio de prueba', tarifa_hora=Decimal('40.00')
+        )
+        nombre_bd = str(connection.settings_dict['NAME'])
+        connection.close()
+
+        contexto = multiprocessing.get_context('spawn')
+        resultados = contexto.Queue()
+        procesos = [
+            contexto.Process(
+                target=_trabajador,
+                args=(nombre_bd, i, options['guardados'], options['lineas'], cliente.pk, servicio.pk, resultados),
+            )
+            for i in range(options['procesos'])
+        ]
+
+        inicio = time.perf_counter()
+        for proceso in procesos:
+            proceso.start()
+        totales = [resultados.get() for _ in procesos]
+        for proceso in procesos:
+            proceso.join()
+        duracion = time.perf_counter() - inicio
+
+        if any(proceso.exitcode for proceso in procesos):
+            raise CommandError('Algún proceso terminó con error; revise la salida anterior.')
+
+        exitos = sum(t[0] for t in totales)
+        errores = sum(t[1] for t in totales)
+        self.stdout.write(f'Procesos: {len(procesos)} - Cotizaciones guardadas: {exitos} en {duracion:.2f}s')
+        self.stdout.write(f'Throughput: {exitos / duracion:.1f} cotizaciones/s')
+
+        if not options['conservar']:
+            Cotizacion.objects.filter(cliente=cliente).delete()
+            cliente.delete()
+            servicio.delete()
+
+        if errores:
+            raise CommandError(f'{errores} guardados fallaron por "database is locked".')
+        self.stdout.write(self.style.SUCCESS('Sin errores de bloqueo.'))
@@ -0,0 +1,171 @@
+import multiprocessing
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+PASO_HORAS = Decimal('0.50')
+PASO_DESCUENTO = Decimal('0.01')
+
+
+def _trabajador(nombre_bd, indice, iteraciones, cotizacion_id, proporcion_lineas, pausa, resultados):
+    """
+    Proceso hijo: ciclos leer-modificar-guardar sobre la misma cotización. La
+    lectura queda fuera de la transacción, como el GET del formulario antes
+    del POST; ante un conflicto de versión se vuelve a leer y se reintenta.
+    """
+    import django
+    from django.conf import settings
+
+    # La misma base que el proceso padre (p. ej. la de los tests)
+    settings.DATABASES['default']['NAME'] = nombre_bd
+    django.setup()
+
+    from cotizaciones.concurrencia import ConflictoVersion, reintentar_si_bloqueada
+    from cotizaciones.models import Cotizacion, DetalleCotizacion, totales_diferidos
+
+    @reintentar_si_bloqueada()
+    def guardar_linea(detalle):
+        with transaction.atomic():
+            with totales_diferidos(detalle.cotizacion):
+                detalle.save(update_fields=['horas_estimadas'])
+
+    @reintentar_si_bloqueada()
+    def guardar_descuento(cotizacion):
+        with transaction.atomic():
+            cotizacion.save(update_fields=['descuento_porcentaje'])
+            cotizacion.calcular_totales()
+
+    aleatorio = random.Random(indice)
+    lineas = list(DetalleCotizacion.objects.filter(cotizacion_id=cotizacion_id).values_list('pk', flat=True))
+    horas = descuentos = conflictos = 0
+    for _ in range(iteraciones):
+        es_linea = aleatorio.random() < proporcion_lineas
+        while True:
+            if es_linea:
+                objeto = DetalleCotizacion.objects.select_related('cotizacion').get(pk=aleatorio.choice(lineas))
+                objeto.horas_estimadas += PASO_HORAS
+            else:
+                objeto = Cotizacion.objects.get(pk=cotizacion_id)
+                objeto.descuento_porcentaje += PASO_DESCUENTO
+            # Tiempo entre la lectura y el guardado (el usuario editando)
+            time.sleep(aleatorio.uniform(0, pausa))
+            try:
+                (guardar_linea if es_linea else guardar_descuento)(objeto)
+            except ConflictoVersion:
+                conflictos += 1
+                continue
+            break
+        if es_linea:
+            horas += 1
+        else:
+            descuentos += 1
+    resultados.put((horas, descuentos, conflictos))
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de estrés del control de concurrencia optimista: varios procesos '
+        'editan a la vez las líneas y el descuento de una misma cotización y se '
+        'comprueba que no se pierde ninguna actualización'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=4, help='Procesos concurrentes (workers)')
+        parser.add_argument('--iteraciones', type=int, default=50, help='Ediciones guardadas por proceso')
+        parser.add_argument('--lineas', type=int, default=3, help='Detalles de la cotización')
+        parser.add_argument(
+            '--proporcion-lineas', type=float, default=0.8,
+            help='Fracción de ediciones sobre líneas (el resto cambia el descuento)',
+        )
+        parser.add_argument('--pausa', type=float, default=0.005, help='Segundos máximos entre lectura y guardado')
+        parser.add_argument('--conservar', action='store_true', help='No eliminar los datos generados')
+
+    def handle(self, *args, **options):
+        from cotizaciones.integridad import _diferencias
+        from cotizaciones.models import Cliente, Cotizacion, DetalleCotizacion, Servicio, totales_diferidos
+
+        cliente = Cliente.objects.create(nombre='Estrés versiones', email='estres@example.com')
+        servicio = Servicio.objects.create(
+            nombre='Estrés versiones', descripcion='Servicio de prueba', tarifa_hora=Decimal('40.00')
+        )
+        cotizacion = Cotizacion.objects.create(cliente=cliente, fecha_vencimiento=date.today() + timedelta(days=30))
+        with totales_diferidos(cotizacion):
+            for linea in range(options['lineas']):
+                DetalleCotizacion(
+                    cotizacion=cotizacion, servicio=servicio, descripcion=f'Línea {linea}',
+                    horas_estimadas=Decimal('1.00'), tarifa_hora=servicio.tarifa_hora,
+                ).save()
+        cotizacion.refresh_from_db()
+        horas_iniciales = options['lineas'] * Decimal('1.00')
+        version_inicial = cotizacion.version
+        nombre_bd = str(connection.settings_dict['NAME'])
+        connection.close()
+
+        contexto = multiprocessing.get_context('spawn')
+        resultados = contexto.Queue()
+        procesos = [
+            contexto.Process(
+                target=_trabajador,
+                args=(
+                    nombre_bd, i, options['iteraciones'], cotizacion.pk, options['proporcion_lineas'],
+                    options['pausa'], resultados,
+                ),
+            )
+            for i in range(options['procesos'])
+        ]
+
+        inicio = time.perf_counter()
+        for proceso in procesos:
+            proceso.start()
+        totales = [resultados.get() for _ in procesos]
+        for proceso in procesos:
+            proceso.join()
+        duracion = time.perf_counter() - inicio
+
+        if any(proceso.exitcode for proceso in procesos):
+            raise CommandError('Algún proceso terminó con error; revise la salida anterior.')
+
+        horas = sum(t[0] for t in totales)
+        descuentos = sum(t[1] for t in totales)
+        conflictos = sum(t[2] for t in totales)
+        guardados = horas + descuentos
+        self.stdout.write(
+            f'Procesos: {len(procesos)} - Ediciones guardadas: {guardados} ({horas} de líneas, '
+            f'{descuentos} de descuento) en {duracion:.2f}s ({guardados / duracion:.1f}/s)'
+        )
+        self.stdout.write(
+            f'Conflictos de versión: {conflictos} ({conflictos / (guardados + conflictos):.1%} de los intentos)'
+        )
+
+        # Cada edición guardada debe verse en la base de datos
+        cotizacion.refresh_from_db()
+        esperado = {
+            'horas': horas_iniciales + horas * PASO_HORAS,
+            'descuento_porcentaje': descuentos * PASO_DESCUENTO,
+            # Una línea: UPDATE de totales; un descuento: UPDATE de cabecera y de totales
+            'version': version_inicial + horas + 2 * descuentos,
+        }
+        obtenido = {
+            'horas': sum(DetalleCotizacion.objects.filter(cotizacion=cotizacion).values_list('horas_estimadas', flat=True)),
+            'descuento_porcentaje': cotizacion.descuento_porcentaje,
+            'version': cotizacion.version,
+        }
+        errores = [
+            f'{campo}: esperado {esperado[campo]}, guardado {obtenido[campo]}'
+            for campo in esperado if esperado[campo] != obtenido[campo]
+        ]
+        if _diferencias(None, ids=[cotizacion.pk])[0]:
+            errores.append('los totales guardados no coinciden con las líneas')
+
+        if not options['conservar']:
+            cotizacion.delete()
+            cliente.delete()
+            servicio.delete()
+
+        if errores:
+            raise CommandError('Actualizaciones perdidas: ' + '; '.join(errores))
+        self.stdout.write(self.style.SUCCESS('Sin actualizaciones perdidas: líneas, descuento y totales coinciden.'))
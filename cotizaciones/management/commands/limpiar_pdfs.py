@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cotizaciones.pdf import DIRECTORIO_CONGELADOS, congelados_en_uso, directorio_pdf
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra los PDFs guardados que no se generaron en los últimos N días (se regeneran al pedirlos) '
+        'y los congelados que ya no usa ninguna cotización'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30, help='Antigüedad mínima en días')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar, sin borrar')
+
+    def handle(self, *args, **options):
+        limite = time.time() - options['dias'] * 86400
+        raiz = directorio_pdf()
+        borrados = liberados = 0
+        # Caché (pdf/ab/<hash>.pdf); los congelados están un nivel más abajo
+        for ruta in raiz.glob('*/*'):
+            # También temporales de generaciones interrumpidas
+            if ruta.suffix not in ('.pdf', '.tmp') or ruta.stat().st_mtime >= limite:
+                continue
+            borrados += 1
+            liberados += ruta.stat().st_size
+            if not options['dry_run']:
+                ruta.unlink(missing_ok=True)
+
+        # Congelados sin registro: quedan al regenerar PDFs o al borrar
+        # cotizaciones. Los recientes se conservan, porque el registro se
+        # crea después de escribir el archivo.
+        huerfanos = 0
+        candidatos = [ruta for ruta in raiz.glob(f'{DIRECTORIO_CONGELADOS}/*/*') if ruta.stat().st_mtime < limite]
+        en_uso = congelados_en_uso() if candidatos else set()
+        for ruta in candidatos:
+            if ruta.relative_to(raiz).as_posix() in en_uso:
+                continue
+            # congelar_pdf renueva la fecha al reutilizar un archivo existente
+            try:
+                estado = ruta.stat()
+            except FileNotFoundError:
+                continue
+            if estado.st_mtime >= limite:
+                continue
+            huerfanos += 1
+            liberados += estado.st_size
+            if not options['dry_run']:
+                ruta.unlink(missing_ok=True)
+
+        accion = 'se borrarían' if options['dry_run'] else 'borrados'
+        self.stdout.write(self.style.SUCCESS(
+            f'{borrados} PDFs y {huerfanos} congelados sin uso {accion} ({liberados / 1024 / 1024:.1f} MB)'
+        ))
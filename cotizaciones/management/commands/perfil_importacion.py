@@ -0,0 +1,85 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+LINEA = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+# Arranque de un worker: aplicación WSGI y todas las URLs (importa las vistas)
+ARRANQUE = (
+    'import quotes.wsgi; '
+    'from django.urls import get_resolver; '
+    'get_resolver().url_patterns'
+)
+ARRANQUE_PDF = ARRANQUE + '; from cotizaciones.pdf import precargar_weasyprint; precargar_weasyprint()'
+
+# Paquetes que el arranque sin PDFs no debe importar
+PESADOS = ('weasyprint', 'numpy', 'cairocffi', 'pydyf', 'fontTools')
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el tiempo de importación del arranque de un worker (python -X importtime) '
+        'y falla si supera el presupuesto o si carga WeasyPrint/NumPy sin generar PDFs'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Paquetes a mostrar')
+        parser.add_argument('--presupuesto-ms', type=float, help='Máximo de importación acumulada (falla si se supera)')
+        parser.add_argument('--con-pdf', action='store_true', help='Incluir la precarga de WeasyPrint para comparar')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Se informa la mediana')
+
+    def handle(self, *args, **options):
+        codigo = ARRANQUE_PDF if options['con_pdf'] else ARRANQUE
+        mediciones = sorted(
+            (self._medir(codigo) for _ in range(max(1, options['repeticiones']))),
+            key=lambda medicion: medicion[0],
+        )
+        total, pared, paquetes, modulos = mediciones[len(mediciones) // 2]
+
+        self.stdout.write(f'{"Paquete":<28}{"ms":>10}{"%":>7}')
+        for paquete, micros in sorted(paquetes.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'{paquete:<28}{micros / 1000:>10.1f}{micros * 100 / total:>7.1f}')
+        self.stdout.write(
+            f'Importación: {total / 1000:.1f} ms en {len(modulos)} módulos '
+            f'(proceso completo {pared * 1000:.0f} ms, mediana de {len(mediciones)})'
+        )
+
+        errores = []
+        if not options['con_pdf']:
+            cargados = sorted({modulo.split('.')[0] for modulo in modulos} & set(PESADOS))
+            if cargados:
+                errores.append(f'El arranque sin PDFs importa {", ".join(cargados)}')
+        if options['presupuesto_ms'] is not None and total / 1000 > options['presupuesto_ms']:
+            errores.append(f'{total / 1000:.1f} ms supera el presupuesto de {options["presupuesto_ms"]:.0f} ms')
+        if errores:
+            raise CommandError('; '.join(errores))
+        self.stdout.write(self.style.SUCCESS('Arranque dentro del presupuesto'))
+
+    def _medir(self, codigo):
+        """(microsegundos propios totales, segundos de pared, µs por paquete, módulos)"""
+        entorno = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'quotes.settings')}
+        inicio = time.perf_counter()
+        proceso = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', codigo],
+            cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True,
+        )
+        pared = time.perf_counter() - inicio
+        if proceso.returncode:
+            raise CommandError(f'El arranque falló:\n{proceso.stderr[-2000:]}')
+
+        paquetes = defaultdict(int)
+        modulos = []
+        for linea in proceso.stderr.splitlines():
+            coincidencia = LINEA.match(linea)
+            if not coincidencia:
+                continue
+            propio, _, _, modulo = coincidencia.groups()
+            paquetes[modulo.split('.')[0]] += int(propio)
+            modulos.append(modulo)
+        return sum(paquetes.values()), pared, paquetes, modulos
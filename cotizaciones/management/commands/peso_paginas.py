@@ -0,0 +1,120 @@
+import gzip
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from cotizaciones.config import RECURSOS_ESTATICOS
+from cotizaciones.estaticos import brotli
+from cotizaciones.models import Cliente, Cotizacion, Servicio
+
+ETIQUETA = re.compile(r'<(?:link[^>]+href|script[^>]+src)="([^"]+)"')
+
+# Lo que base.html cargaba en todas las páginas antes de separar los recursos por página
+ANTERIOR = ('bootstrap_css', 'bootstrap_icons_css', 'fontawesome_css', 'bootstrap_js', 'jquery')
+
+
+class Command(BaseCommand):
+    help = (
+        'Peso de CSS/JS de cada página (sin comprimir, gzip y brotli) y el ahorro '
+        'frente a cargar todos los recursos en todas las páginas'
+    )
+
+    def handle(self, *args, **options):
+        self.pesos = {}
+        cdn = {recurso['cdn']: nombre for nombre, recurso in RECURSOS_ESTATICOS.items()}
+        anterior = {nombre: self._peso(finders.find(RECURSOS_ESTATICOS[nombre]['local'])) for nombre in ANTERIOR}
+        if None in anterior.values():
+            self.stdout.write(self.style.WARNING(
+                'Hay recursos sin descargar (manage.py vendorizar_estaticos): se informan como CDN sin peso'
+            ))
+
+        self.stdout.write(
+            f'{"Página":<28}{"recursos":>9}{"KB":>9}{"KB gzip":>9}{"KB br":>9}{"ahorro gzip":>13}'
+        )
+        cliente = Client()
+        totales = [0, 0, 0, 0]
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for nombre_pagina, url in self._paginas():
+                html = cliente.get(url).content.decode()
+                usados = {}
+                for enlace in ETIQUETA.findall(html):
+                    nombre = cdn.get(enlace) or self._nombre_local(enlace)
+                    if nombre is not None and nombre not in usados:
+                        usados[nombre] = self._peso(self._ruta(enlace))
+
+                ahora = _sumar(usados.values())
+                antes = _sumar({**anterior, **usados}.values())
+                ahorro = antes[1] - ahora[1]
+                for indice, valor in enumerate((*ahora, ahorro)):
+                    totales[indice] += valor
+                self.stdout.write(
+                    f'{nombre_pagina:<28}{len(usados):>9}{ahora[0] / 1024:>9.1f}{ahora[1] / 1024:>9.1f}'
+                    f'{ahora[2] / 1024:>9.1f}{ahorro / 1024:>13.1f}'
+                )
+        self.stdout.write(
+            f'{"Total":<28}{"":>9}{totales[0] / 1024:>9.1f}{totales[1] / 1024:>9.1f}'
+            f'{totales[2] / 1024:>9.1f}{totales[3] / 1024:>13.1f}'
+        )
+        if brotli is None:
+            self.stdout.write('Brotli no está instalado: la columna br repite gzip')
+
+    def _paginas(self):
+        paginas = [
+            ('dashboard', reverse('cotizaciones:dashboard')),
+            ('cotizacion_list', reverse('cotizaciones:cotizacion_list')),
+            ('cotizacion_create', reverse('cotizaciones:cotizacion_create')),
+            ('cliente_list', reverse('cotizaciones:cliente_list')),
+            ('cliente_create', reverse('cotizaciones:cliente_create')),
+            ('servicio_list', reverse('cotizaciones:servicio_list')),
+            ('servicio_create', reverse('cotizaciones:servicio_create')),
+        ]
+        cotizacion = Cotizacion.objects.order_by().first()
+        if cotizacion is not None:
+            paginas += [
+                ('cotizacion_detail', reverse('cotizaciones:cotizacion_detail', args=[cotizacion.pk])),
+                ('cotizacion_detalles_edit', reverse('cotizaciones:cotizacion_detalles_edit', args=[cotizacion.pk])),
+            ]
+        for modelo, nombre in ((Cliente, 'cliente_update'), (Servicio, 'servicio_update')):
+            objeto = modelo.objects.order_by().first()
+            if objeto is not None:
+                paginas.append((nombre, reverse(f'cotizaciones:{nombre}', args=[objeto.pk])))
+        return paginas
+
+    def _nombre_local(self, enlace):
+        """Nombre del recurso local (vendor/... o estáticos propios) de un enlace"""
+        if not enlace.startswith(settings.STATIC_URL):
+            return None
+        relativa = enlace[len(settings.STATIC_URL):]
+        for nombre, recurso in RECURSOS_ESTATICOS.items():
+            raiz, extension = recurso['local'].rsplit('.', 1)
+            if relativa == recurso['local'] or (relativa.startswith(raiz + '.') and relativa.endswith('.' + extension)):
+                return nombre
+        return relativa
+
+    def _ruta(self, enlace):
+        if not enlace.startswith(settings.STATIC_URL):
+            return None
+        relativa = enlace[len(settings.STATIC_URL):]
+        if getattr(settings, 'STATIC_ROOT', None) and (Path(settings.STATIC_ROOT) / relativa).is_file():
+            return Path(settings.STATIC_ROOT) / relativa
+        return finders.find(relativa)
+
+    def _peso(self, ruta):
+        """(bytes, gzip, brotli) del archivo, o None si no está en disco"""
+        if ruta is None:
+            return None
+        if ruta not in self.pesos:
+            datos = Path(ruta).read_bytes()
+            comprimido = len(gzip.compress(datos, 9))
+            self.pesos[ruta] = (len(datos), comprimido, len(brotli.compress(datos)) if brotli else comprimido)
+        return self.pesos[ruta]
+
+
+def _sumar(pesos):
+    pesos = [peso for peso in pesos if peso is not None]
+    return tuple(sum(peso[indice] for peso in pesos) for indice in range(3))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from cotizaciones.recursos_pdf import (
+    RecursoNoDisponible, directorio_recursos, estadisticas, precargar, url_fetcher, urls_configuradas,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Descarga al almacén local el logo y los recursos remotos de los PDFs '
+        '(durante el render no se accede a la red) y reporta los tiempos de acceso'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='*', help='URLs adicionales (por defecto las de la configuración)')
+        parser.add_argument('--sin-descarga', action='store_true', help='Solo comprobar el almacén actual')
+
+    def handle(self, *args, **options):
+        urls = urls_configuradas() + [url for url in options['urls'] if url not in urls_configuradas()]
+        if not urls:
+            self.stdout.write('No hay recursos remotos configurados (EMPRESA_CONFIG["logo_url"], RECURSOS_PDF_CONFIG["urls"])')
+            return
+
+        if not options['sin_descarga']:
+            self.stdout.write(f'Almacén: {directorio_recursos()}')
+            for url, tamano, segundos, error in precargar(urls):
+                if error:
+                    self.stdout.write(self.style.ERROR(f'  ERROR {url}: {error}'))
+                else:
+                    self.stdout.write(f'  {url}: {tamano / 1024:.1f} KB en {segundos * 1000:.0f} ms')
+
+        # Dos accesos por recurso: el primero lee el almacén, el segundo la memoria
+        for url in urls:
+            for _ in range(2):
+                try:
+                    url_fetcher(url)
+                except RecursoNoDisponible as error:
+                    self.stdout.write(self.style.WARNING(f'  {error}'))
+                    break
+
+        self.stdout.write('Tiempos de acceso durante el render:')
+        for url, tiempos in estadisticas().items():
+            self.stdout.write(
+                f'  {tiempos["origen"]:<9} {tiempos["carga_ms"]:8.2f} ms  {tiempos["bytes"] / 1024:8.1f} KB  '
+                f'{tiempos["aciertos_memoria"]} aciertos en memoria  {url}'
+            )
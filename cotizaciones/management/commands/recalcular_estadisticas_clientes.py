@@ -0,0 +1,105 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _iniciar():
+    import django
+    django.setup()
+
+
+def _campos():
+    from cotizaciones.models import EstadisticasCliente
+
+    return [campo.attname for campo in EstadisticasCliente._meta.concrete_fields]
+
+
+def _reconciliar(tarea):
+    """Proceso hijo: recalcula un bloque de clientes; devuelve (revisados, corregidos, error)"""
+    from contextlib import nullcontext
+
+    from django.db import connections
+
+    from cotizaciones.concurrencia import reintentar_si_bloqueada
+    from cotizaciones.models import EstadisticasCliente
+    from cotizaciones.replicas import en_replica
+
+    clientes, solo_verificar = tarea
+    campos = _campos()
+    try:
+        # Solo verificar es de lectura: va a una réplica si hay
+        with en_replica() if solo_verificar else nullcontext():
+            actuales = {
+                fila['cliente_id']: fila
+                for fila in EstadisticasCliente.objects.filter(pk__in=clientes).values(*campos)
+            }
+            calculadas = EstadisticasCliente.calcular(clientes)
+        distintas = [
+            estadistica for estadistica in calculadas
+            if actuales.get(estadistica.cliente_id) != {campo: getattr(estadistica, campo) for campo in campos}
+        ]
+        if distintas and not solo_verificar:
+            reintentar_si_bloqueada()(EstadisticasCliente.recalcular)([estadistica.cliente_id for estadistica in distintas])
+        return len(clientes), len(distintas), None
+    except Exception as error:
+        return len(clientes), 0, f'{clientes[0]}…: {error}'
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye en paralelo, por bloques de clientes, las estadísticas desnormalizadas '
+        '(EstadisticasCliente) desde las cotizaciones vivas y archivadas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=multiprocessing.cpu_count(), help='Procesos en paralelo')
+        parser.add_argument('--lote', type=int, default=500, help='Clientes por bloque')
+        parser.add_argument('--verificar', action='store_true', help='Solo contar las diferencias, sin corregir')
+
+    def handle(self, *args, **options):
+        from cotizaciones.models import Cliente
+
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0.')
+        clientes = list(Cliente.objects.order_by('pk').values_list('pk', flat=True))
+        if not clientes:
+            self.stdout.write(self.style.SUCCESS('No hay clientes'))
+            return
+        bloques = [
+            (clientes[inicio:inicio + options['lote']], options['verificar'])
+            for inicio in range(0, len(clientes), options['lote'])
+        ]
+
+        procesos = max(1, min(options['procesos'], len(bloques)))
+        self.stdout.write(f'Revisando {len(clientes)} clientes en {len(bloques)} bloques con {procesos} procesos...')
+        inicio = time.perf_counter()
+        revisados = corregidos = 0
+        errores = []
+        if procesos == 1:
+            # Sin pool: evita arrancar un intérprete para un solo bloque
+            resultados = map(_reconciliar, bloques)
+        else:
+            contexto = multiprocessing.get_context('spawn')
+            pool = contexto.Pool(procesos, initializer=_iniciar)
+            resultados = pool.imap_unordered(_reconciliar, bloques)
+        try:
+            for cantidad, distintas, error in resultados:
+                revisados += cantidad
+                corregidos += distintas
+                if error:
+                    errores.append(error)
+        finally:
+            if procesos > 1:
+                pool.terminate()
+        duracion = time.perf_counter() - inicio
+
+        for error in errores[:20]:
+            self.stderr.write(error)
+        accion = 'con diferencias' if options['verificar'] else 'corregidos'
+        estilo = self.style.WARNING if errores or (options['verificar'] and corregidos) else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f'{revisados} clientes revisados en {duracion:.1f}s, {corregidos} {accion}, {len(errores)} errores'
+        ))
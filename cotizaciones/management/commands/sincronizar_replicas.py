@@ -0,0 +1,47 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cotizaciones.replicas import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia la base SQLite primaria a las réplicas SQLite (API de backup) para probar '
+        'el router de réplicas en local; con --loop simula el retraso de replicación. '
+        'Las réplicas PostgreSQL se mantienen con replicación del servidor.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Repetir indefinidamente')
+        parser.add_argument('--intervalo', type=float, default=5, help='Segundos entre copias con --loop')
+
+    def handle(self, *args, **options):
+        primaria = settings.DATABASES['default']
+        if primaria['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('La primaria no es SQLite: use la replicación de PostgreSQL.')
+        destinos = [
+            (alias, settings.DATABASES[alias]['NAME']) for alias in replicas()
+            if settings.DATABASES[alias]['ENGINE'] == 'django.db.backends.sqlite3'
+        ]
+        if not destinos:
+            raise CommandError('No hay réplicas SQLite en DATABASE_REPLICA_URLS.')
+
+        while True:
+            origen = sqlite3.connect(primaria['NAME'])
+            try:
+                for alias, nombre in destinos:
+                    inicio = time.perf_counter()
+                    destino = sqlite3.connect(nombre)
+                    try:
+                        origen.backup(destino)
+                    finally:
+                        destino.close()
+                    self.stdout.write(f'{alias}: {nombre} copiada en {(time.perf_counter() - inicio) * 1000:.0f} ms')
+            finally:
+                origen.close()
+            if not options['loop']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,67 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cotizaciones.models import Cotizacion
+from cotizaciones.transiciones import cambiar_estado
+
+ESTADO_ORIGEN = 'enviada'
+ESTADO_VENCIDA = 'vencida'
+
+
+class Command(BaseCommand):
+    help = (
+        "Marca como vencidas las cotizaciones 'enviada' cuya fecha de vencimiento ya pasó. "
+        'Usa el índice (estado, fecha_vencimiento) y actualiza por lotes; es idempotente.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Cotizaciones por UPDATE')
+        parser.add_argument('--fecha', type=date.fromisoformat, help='Fecha de corte AAAA-MM-DD (por defecto hoy)')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar, sin modificar')
+        parser.add_argument('--loop', action='store_true', help='Repetir indefinidamente (modo cron)')
+        parser.add_argument('--intervalo', type=int, default=3600, help='Segundos entre ejecuciones con --loop')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0.')
+
+        while True:
+            self._barrer(options)
+            if not options['loop']:
+                break
+            time.sleep(options['intervalo'])
+
+    def _barrer(self, options):
+        corte = options['fecha'] or date.today()
+        inicio = time.perf_counter()
+        pendientes = (
+            Cotizacion.objects
+            .filter(estado=ESTADO_ORIGEN, fecha_vencimiento__lt=corte)
+            .order_by('fecha_vencimiento')
+        )
+
+        if options['dry_run']:
+            cantidad = pendientes.count()
+            self.stdout.write(f'[{corte}] {cantidad} cotizaciones por vencer (dry-run)')
+            return
+
+        # Cada lote actualizado deja de cumplir estado='enviada', así que la
+        # siguiente lectura del índice empieza directamente en las pendientes
+        vencidas = lotes = 0
+        while True:
+            ids = list(pendientes.values_list('pk', flat=True)[:options['lote']])
+            if not ids:
+                break
+            # Mismo camino que las acciones masivas: revalida el estado con las filas
+            # bloqueadas y aplica estadísticas, eventos, revisiones y la señal por lote
+            vencidas += len(cambiar_estado(ids, ESTADO_VENCIDA)[0])
+            lotes += 1
+            if len(ids) < options['lote']:
+                break
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'[{corte}] {vencidas} cotizaciones marcadas como vencidas en {lotes} lotes ({duracion:.2f}s)'
+        ))
@@ -0,0 +1,94 @@
+import base64
+import hashlib
+import json
+import re
+import urllib.request
+from pathlib import Path, PurePosixPath
+from urllib.parse import urljoin, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cotizaciones.config import RECURSOS_ESTATICOS
+
+# url(...) de las hojas de estilo: fuentes e imágenes que también se descargan
+URL_CSS = re.compile(r'url\(\s*[\'"]?([^\'")]+?)[\'"]?\s*\)')
+VERSIONES = 'vendor/versiones.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Descarga los recursos de RECURSOS_ESTATICOS (y las fuentes que referencian '
+        'sus CSS) a static/ para no depender de los CDN'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('recursos', nargs='*', help='Nombres a descargar (por defecto todos)')
+        parser.add_argument('--timeout', type=int, default=30)
+        parser.add_argument('--forzar', action='store_true', help='Descargar aunque ya existan')
+
+    def handle(self, *args, **options):
+        nombres = options['recursos'] or list(RECURSOS_ESTATICOS)
+        desconocidos = set(nombres) - set(RECURSOS_ESTATICOS)
+        if desconocidos:
+            raise CommandError(f'Recursos desconocidos: {", ".join(sorted(desconocidos))}')
+
+        self.destino = Path(settings.STATICFILES_DIRS[0])
+        self.timeout = options['timeout']
+        ruta_versiones = self.destino / VERSIONES
+        versiones = json.loads(ruta_versiones.read_text()) if ruta_versiones.exists() else {}
+
+        for nombre in nombres:
+            recurso = RECURSOS_ESTATICOS[nombre]
+            if (self.destino / recurso['local']).exists() and not options['forzar']:
+                self.stdout.write(f'{nombre}: ya descargado')
+                continue
+            archivos = {}
+            self._descargar(recurso['cdn'], PurePosixPath(recurso['local']), archivos)
+            versiones[nombre] = {'cdn': recurso['cdn'], 'archivos': archivos}
+            total = sum(archivo['bytes'] for archivo in archivos.values())
+            self.stdout.write(self.style.SUCCESS(f'{nombre}: {len(archivos)} archivos, {total / 1024:.1f} KB'))
+
+        ruta_versiones.parent.mkdir(parents=True, exist_ok=True)
+        ruta_versiones.write_text(json.dumps(versiones, indent=2, sort_keys=True) + '\n')
+        self.stdout.write('Ejecute collectstatic para generar los nombres con hash y las variantes .gz/.br')
+
+    def _descargar(self, url, local, archivos):
+        """Descarga url a static/<local>; en los CSS sigue los url() relativos"""
+        if local.as_posix() in archivos:
+            return
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as respuesta:
+                datos = respuesta.read()
+        except OSError as error:
+            raise CommandError(f'No se pudo descargar {url}: {error}')
+        ruta = self.destino / local
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        ruta.write_bytes(datos)
+        archivos[local.as_posix()] = {
+            'url': url,
+            'bytes': len(datos),
+            'integrity': 'sha384-' + base64.b64encode(hashlib.sha384(datos).digest()).decode(),
+        }
+
+        if local.suffix != '.css':
+            return
+        for referencia in sorted(set(URL_CSS.findall(datos.decode('utf-8', 'replace')))):
+            partes = urlsplit(referencia)
+            if partes.scheme or referencia.startswith(('/', '#')):
+                continue
+            # Sin ?v=... ni #iefix: el archivo es el mismo
+            self._descargar(urljoin(url, partes.path), _normalizar(local.parent / partes.path), archivos)
+
+
+def _normalizar(ruta):
+    """Resuelve '..' en una ruta relativa sin tocar el disco"""
+    partes = []
+    for parte in ruta.parts:
+        if parte == '..':
+            if not partes:
+                raise CommandError(f'Referencia fuera de static/: {ruta}')
+            partes.pop()
+        elif parte != '.':
+            partes.append(parte)
+    return PurePosixPath(*partes)
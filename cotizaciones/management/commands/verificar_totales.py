@@ -0,0 +1,112 @@
+import multiprocessing
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _iniciar():
+    import django
+    django.setup()
+
+
+def _verificar(tarea):
+    """Proceso hijo: verifica (y repara) un bloque de cotizaciones"""
+    from contextlib import nullcontext
+
+    from django.db import connections
+
+    from cotizaciones.integridad import verificar_bloque
+    from cotizaciones.replicas import en_replica
+
+    desde, hasta, reparar, muestra = tarea
+    try:
+        # Solo verificar es de lectura: va a una réplica si hay
+        with nullcontext() if reparar else en_replica():
+            return verificar_bloque(desde, hasta, reparar=reparar, muestra=muestra), None
+    except Exception as error:
+        return None, f'{desde}: {error}'
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula desde sus líneas los totales guardados de todas las cotizaciones, por bloques '
+        'de ids en paralelo, e informa las diferencias exactas; --reparar las corrige'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=multiprocessing.cpu_count(), help='Procesos en paralelo')
+        parser.add_argument('--lote', type=int, default=5000, help='Cotizaciones por bloque')
+        parser.add_argument('--reparar', action='store_true', help='Corregir líneas y totales con diferencias')
+        parser.add_argument('--mostrar', type=int, default=20, help='Diferencias a detallar')
+
+    def handle(self, *args, **options):
+        from cotizaciones.integridad import limites
+
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0.')
+        inicio = time.perf_counter()
+        inicios = limites(options['lote'])
+        if not inicios:
+            self.stdout.write(self.style.SUCCESS('No hay cotizaciones'))
+            return
+        bloques = [
+            (desde, hasta, options['reparar'], options['mostrar'])
+            for desde, hasta in zip(inicios, [*inicios[1:], None])
+        ]
+
+        procesos = max(1, min(options['procesos'], len(bloques)))
+        self.stdout.write(f'Verificando {len(bloques)} bloques de hasta {options["lote"]} cotizaciones con {procesos} procesos...')
+        totales = dict.fromkeys(
+            ('revisadas', 'lineas', 'con_diferencias', 'lineas_distintas', 'reparadas', 'lineas_reparadas'), 0,
+        )
+        diferencia_total = Decimal('0')
+        muestra = []
+        errores = []
+        if procesos == 1:
+            # Sin pool: evita arrancar un intérprete para un solo bloque
+            resultados = map(_verificar, bloques)
+        else:
+            contexto = multiprocessing.get_context('spawn')
+            pool = contexto.Pool(procesos, initializer=_iniciar)
+            resultados = pool.imap_unordered(_verificar, bloques)
+        try:
+            # Cada bloque devuelve solo conteos y una muestra: memoria acotada
+            for resumen, error in resultados:
+                if error:
+                    errores.append(error)
+                    continue
+                for clave in totales:
+                    totales[clave] += resumen[clave]
+                diferencia_total += resumen['diferencia_total']
+                muestra.extend(resumen['muestra'][:options['mostrar'] - len(muestra)])
+        finally:
+            if procesos > 1:
+                pool.terminate()
+        duracion = time.perf_counter() - inicio
+
+        for diferencia in muestra:
+            campos = ', '.join(
+                f'{campo} {guardado} -> {esperado} ({esperado - guardado:+})'
+                for campo, (guardado, esperado) in diferencia['campos'].items()
+            )
+            lineas = f' [{diferencia["lineas_distintas"]} líneas]' if diferencia['lineas_distintas'] else ''
+            self.stdout.write(f'{diferencia["numero"]}{lineas}: {campos or "solo líneas"}')
+        for error in errores[:20]:
+            self.stderr.write(error)
+
+        self.stdout.write(
+            f'{totales["revisadas"]} cotizaciones y {totales["lineas"]} líneas en {duracion:.1f}s '
+            f'({totales["lineas"] / duracion:,.0f} líneas/s)'
+        )
+        estilo = self.style.WARNING if totales['con_diferencias'] or errores else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f'{totales["con_diferencias"]} cotizaciones con diferencias ({totales["lineas_distintas"]} líneas), '
+            f'diferencia neta en total {diferencia_total:+}; {len(errores)} errores'
+        ))
+        if options['reparar']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Reparadas {totales["reparadas"]} cotizaciones y {totales["lineas_reparadas"]} líneas'
+            ))
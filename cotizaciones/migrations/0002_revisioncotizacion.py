@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 17:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevisionCotizacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(verbose_name='Versión')),
+                ('es_snapshot', models.BooleanField(default=False, verbose_name='Snapshot completo')),
+                ('datos', models.JSONField(verbose_name='Datos de la revisión')),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('cotizacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisiones', to='cotizaciones.cotizacion')),
+            ],
+            options={
+                'verbose_name': 'Revisión de cotización',
+                'verbose_name_plural': 'Revisiones de cotización',
+                'ordering': ['cotizacion', 'version'],
+                'constraints': [models.UniqueConstraint(fields=('cotizacion', 'version'), name='revision_version_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-19 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0002_revisioncotizacion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cotizacion',
+            name='estado',
+            field=models.CharField(choices=[('borrador', 'Borrador'), ('enviada', 'Enviada'), ('aprobada', 'Aprobada'), ('rechazada', 'Rechazada'), ('cancelada', 'Cancelada'), ('vencida', 'Vencida')], default='borrador', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='cotizacion',
+            index=models.Index(fields=['estado', 'fecha_vencimiento'], name='cotizacion_estado_venc_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.5 on 2026-10-19 17:49
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalizar_busqueda(texto):
+    """Copia congelada de busqueda.normalizar_busqueda al crear esta migración"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.casefold().split())
+
+
+def poblar_campos_busqueda(apps, schema_editor):
+    Cliente = apps.get_model('cotizaciones', 'Cliente')
+    clientes = []
+    for cliente in Cliente.objects.only('nombre', 'empresa', 'email').iterator(chunk_size=2000):
+        cliente.nombre_busqueda = normalizar_busqueda(cliente.nombre)
+        cliente.empresa_busqueda = normalizar_busqueda(cliente.empresa)
+        cliente.email_busqueda = normalizar_busqueda(cliente.email)
+        clientes.append(cliente)
+        if len(clientes) >= 2000:
+            Cliente.objects.bulk_update(clientes, ['nombre_busqueda', 'empresa_busqueda', 'email_busqueda'])
+            clientes = []
+    Cliente.objects.bulk_update(clientes, ['nombre_busqueda', 'empresa_busqueda', 'email_busqueda'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0003_estado_vencida'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='email_busqueda',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='empresa_busqueda',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='nombre_busqueda',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.RunPython(poblar_campos_busqueda, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0005_cotizacion_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfCotizacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(max_length=20, verbose_name='Estado al congelar')),
+                ('plantilla', models.CharField(choices=[('completo', 'Con datos de la empresa'), ('sin_info', 'Sin datos de la empresa')], max_length=20)),
+                ('huella', models.CharField(max_length=64, verbose_name='SHA-256 del PDF')),
+                ('archivo', models.CharField(max_length=255, verbose_name='Ruta relativa a PDF_ROOT')),
+                ('tamano', models.PositiveIntegerField(verbose_name='Tamaño (bytes)')),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('cotizacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pdfs', to='cotizaciones.cotizacion')),
+            ],
+            options={
+                'verbose_name': 'PDF congelado',
+                'verbose_name_plural': 'PDFs congelados',
+                'ordering': ['cotizacion', '-fecha'],
+                'constraints': [models.UniqueConstraint(fields=('cotizacion', 'estado', 'plantilla'), name='pdf_congelado_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0006_pdfcotizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenArchivo',
+            fields=[
+                ('estado', models.CharField(choices=[('borrador', 'Borrador'), ('enviada', 'Enviada'), ('aprobada', 'Aprobada'), ('rechazada', 'Rechazada'), ('cancelada', 'Cancelada'), ('vencida', 'Vencida')], max_length=20, primary_key=True, serialize=False)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'verbose_name': 'Resumen del archivo',
+                'verbose_name_plural': 'Resumen del archivo',
+            },
+        ),
+        migrations.CreateModel(
+            name='CotizacionArchivada',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('numero_cotizacion', models.CharField(max_length=20, unique=True, verbose_name='Número de cotización')),
+                ('fecha_creacion', models.DateTimeField(db_index=True)),
+                ('fecha_actualizacion', models.DateTimeField()),
+                ('fecha_vencimiento', models.DateField(verbose_name='Fecha de vencimiento')),
+                ('modalidad_pago', models.CharField(choices=[('mensual', 'Mensual'), ('anual', 'Anual'), ('unico', 'Pago único')], max_length=10)),
+                ('estado', models.CharField(choices=[('borrador', 'Borrador'), ('enviada', 'Enviada'), ('aprobada', 'Aprobada'), ('rechazada', 'Rechazada'), ('cancelada', 'Cancelada'), ('vencida', 'Vencida')], max_length=20)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('descuento_porcentaje', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='Descuento (%)')),
+                ('descuento_monto', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Descuento (USD)')),
+                ('iva_porcentaje', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='IVA (%)')),
+                ('iva_monto', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='IVA (USD)')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('notas', models.TextField(blank=True, verbose_name='Notas adicionales')),
+                ('terminos_condiciones', models.TextField(blank=True, verbose_name='Términos y condiciones')),
+                ('revisiones', models.JSONField(default=list, verbose_name='Historial de revisiones')),
+                ('pdfs', models.JSONField(default=list, verbose_name='PDFs congelados')),
+                ('fecha_archivo', models.DateTimeField(auto_now_add=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cotizaciones_archivadas', to='cotizaciones.cliente')),
+            ],
+            options={
+                'verbose_name': 'Cotización archivada',
+                'verbose_name_plural': 'Cotizaciones archivadas',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DetalleArchivado',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('descripcion', models.TextField(verbose_name='Descripción del trabajo')),
+                ('horas_estimadas', models.DecimalField(decimal_places=2, max_digits=8, verbose_name='Horas estimadas')),
+                ('tarifa_hora', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Tarifa por hora (USD)')),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('cotizacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='cotizaciones.cotizacionarchivada')),
+                ('servicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='cotizaciones.servicio', verbose_name='Servicio')),
+            ],
+            options={
+                'verbose_name': 'Detalle archivado',
+                'verbose_name_plural': 'Detalles archivados',
+            },
+        ),
+    ]
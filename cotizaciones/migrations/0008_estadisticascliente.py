@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_estadisticas(apps, schema_editor):
+    Cliente = apps.get_model('cotizaciones', 'Cliente')
+    EstadisticasCliente = apps.get_model('cotizaciones', 'EstadisticasCliente')
+    estadisticas = {pk: EstadisticasCliente(cliente_id=pk) for pk in Cliente.objects.values_list('pk', flat=True)}
+    for nombre in ('Cotizacion', 'CotizacionArchivada'):
+        filas = (
+            apps.get_model('cotizaciones', nombre).objects.order_by().values('cliente_id', 'estado')
+            .annotate(cantidad=models.Count('pk'), suma=models.Sum('total'), ultima=models.Max('fecha_creacion'))
+        )
+        for fila in filas:
+            estadistica = estadisticas[fila['cliente_id']]
+            campo = f'cantidad_{fila["estado"]}'
+            setattr(estadistica, campo, getattr(estadistica, campo) + fila['cantidad'])
+            estadistica.cantidad += fila['cantidad']
+            estadistica.total_cotizado += fila['suma'] or 0
+            if fila['estado'] == 'aprobada':
+                estadistica.total_aprobado += fila['suma'] or 0
+            if estadistica.ultima_cotizacion is None or fila['ultima'] > estadistica.ultima_cotizacion:
+                estadistica.ultima_cotizacion = fila['ultima']
+    EstadisticasCliente.objects.bulk_create(estadisticas.values(), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0007_archivo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticasCliente',
+            fields=[
+                ('cliente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estadisticas', serialize=False, to='cotizaciones.cliente')),
+                ('cantidad', models.IntegerField(db_index=True, default=0, verbose_name='Cotizaciones')),
+                ('cantidad_borrador', models.IntegerField(default=0)),
+                ('cantidad_enviada', models.IntegerField(default=0)),
+                ('cantidad_aprobada', models.IntegerField(db_index=True, default=0)),
+                ('cantidad_rechazada', models.IntegerField(default=0)),
+                ('cantidad_cancelada', models.IntegerField(default=0)),
+                ('cantidad_vencida', models.IntegerField(default=0)),
+                ('total_cotizado', models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=16)),
+                ('total_aprobado', models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=16)),
+                ('ultima_cotizacion', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Estadísticas de cliente',
+                'verbose_name_plural': 'Estadísticas de clientes',
+            },
+        ),
+        migrations.RunPython(poblar_estadisticas, migrations.RunPython.noop),
+    ]
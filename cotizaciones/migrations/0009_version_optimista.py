@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0008_estadisticascliente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cotizacion',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='detallecotizacion',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:42
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0009_version_optimista'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoCotizacion',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('cotizacion', models.UUIDField(verbose_name='Cotización')),
+                ('tipo', models.CharField(choices=[('creada', 'Creada'), ('estado', 'Cambio de estado'), ('totales', 'Totales recalculados')], max_length=10)),
+                ('datos', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('enviado', models.DateTimeField(blank=True, null=True)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, verbose_name='Último error')),
+            ],
+            options={
+                'verbose_name': 'Evento de cotización',
+                'verbose_name_plural': 'Eventos de cotizaciones',
+                'ordering': ['id'],
+                'indexes': [models.Index(condition=models.Q(('enviado__isnull', True)), fields=['id'], name='evento_pendiente_idx')],
+            },
+        ),
+    ]
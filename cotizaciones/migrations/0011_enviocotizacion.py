@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0010_eventocotizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnvioCotizacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatario', models.EmailField(blank=True, max_length=254)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviado', 'Enviado'), ('error', 'Error')], default='pendiente', max_length=10)),
+                ('error', models.TextField(blank=True)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True)),
+                ('cotizacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envios', to='cotizaciones.cotizacion')),
+            ],
+            options={
+                'verbose_name': 'Envío de cotización',
+                'verbose_name_plural': 'Envíos de cotizaciones',
+                'ordering': ['cotizacion', '-fecha'],
+            },
+        ),
+    ]
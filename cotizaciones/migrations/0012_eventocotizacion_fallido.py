@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0011_enviocotizacion'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='eventocotizacion',
+            name='evento_pendiente_idx',
+        ),
+        migrations.AddField(
+            model_name='eventocotizacion',
+            name='fallido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='eventocotizacion',
+            index=models.Index(condition=models.Q(('enviado__isnull', True), ('fallido__isnull', True)), fields=['id'], name='evento_pendiente_idx'),
+        ),
+    ]
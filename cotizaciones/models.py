@@ -1,8 +1,136 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import F
 from django.core.validators import MinValueValidator
-from decimal import Decimal
+from django.core.serializers.json import DjangoJSONEncoder
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal, ROUND_HALF_UP
+import datetime
 import uuid
 
+from .busqueda import invalidar_cache_clientes, normalizar_busqueda
+from .concurrencia import ConflictoVersion
+
+# Cotizaciones cuyo recálculo de totales está diferido (ver totales_diferidos)
+_totales_pendientes = ContextVar('totales_pendientes', default=None)
+
+
+@contextmanager
+def totales_diferidos(*cotizaciones):
+    """
+    Difiere el recálculo de totales de las cotizaciones hasta salir del bloque.
+
+    Cada DetalleCotizacion.save() recalcula y guarda su cotización; al guardar
+    un formset completo eso produce un UPDATE del padre por cada línea. Dentro
+    de este bloque los detalles solo registran su cotización y al final se
+    recalcula una única vez cada una. Las cotizaciones recibidas como argumento
+    se recalculan siempre (por ejemplo, cuando solo se eliminaron líneas).
+    """
+    pendientes = _totales_pendientes.get()
+    if pendientes is not None:
+        # Bloque anidado: el bloque exterior hará el recálculo
+        for cotizacion in cotizaciones:
+            pendientes[cotizacion.pk] = cotizacion
+        yield pendientes
+        return
+
+    pendientes = {cotizacion.pk: cotizacion for cotizacion in cotizaciones}
+    token = _totales_pendientes.set(pendientes)
+    try:
+        yield pendientes
+    finally:
+        _totales_pendientes.reset(token)
+
+    for cotizacion in pendientes.values():
+        cotizacion.calcular_totales()
+
+
+def calcular_montos(subtotal, descuento_porcentaje, iva_porcentaje):
+    """
+    Calcula descuento, IVA y total a partir del subtotal de las líneas.
+    Son las reglas de Cotizacion.calcular_totales sin acceso a la base de datos.
+    """
+    # Calcular descuento
+    if descuento_porcentaje > 0:
+        descuento_monto = (subtotal * descuento_porcentaje) / 100
+    else:
+        descuento_monto = 0
+    
+    # Calcular base imponible
+    base_imponible = subtotal - descuento_monto
+    
+    # Calcular IVA
+    iva_monto = (base_imponible * iva_porcentaje) / 100
+    
+    return {
+        'subtotal': subtotal,
+        'descuento_monto': descuento_monto,
+        'iva_monto': iva_monto,
+        'total': base_imponible + iva_monto,
+    }
+
+
+CENTAVOS = Decimal('0.01')
+
+
+def montos_redondeados(subtotal, descuento_porcentaje, iva_porcentaje):
+    """calcular_montos redondeado a centavos como queda guardado"""
+    return {
+        campo: Decimal(valor).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+        for campo, valor in calcular_montos(subtotal, descuento_porcentaje, iva_porcentaje).items()
+    }
+
+# Montos de Cotizacion derivados de sus líneas (calcular_totales)
+CAMPOS_MONTO = ('subtotal', 'descuento_monto', 'iva_monto', 'total')
+
+# Campos de Cotizacion que alimentan EstadisticasCliente
+CAMPOS_ESTADISTICAS = ('cliente_id', 'estado', 'total')
+
+
+def totales_en_memoria(lineas, descuento_porcentaje, iva_porcentaje):
+    """
+    Totales de una cotización a partir de pares (horas_estimadas, tarifa_hora)
+    sin tocar la base de datos, redondeados a centavos como quedan guardados:
+    cada línea se redondea al guardarse en su columna y los montos finales al
+    guardarse en la cotización.
+    """
+    subtotales = [
+        DetalleCotizacion(horas_estimadas=horas, tarifa_hora=tarifa).calcular_subtotal()
+        for horas, tarifa in lineas
+    ]
+    return {
+        'lineas': subtotales,
+        **montos_redondeados(sum(subtotales, Decimal('0')), descuento_porcentaje, iva_porcentaje),
+    }
+
+class VersionOptimista:
+    """
+    Control de concurrencia optimista para modelos con campo `version`.
+
+    Antes de guardar una fila existente, save() hace el compare-and-swap con
+    un UPDATE ... SET version = version + 1 WHERE version = <versión leída>;
+    si otra escritura guardó antes no cambia ninguna fila y se lanza
+    ConflictoVersion, en lugar de pisar sus cambios en silencio. El UPDATE deja
+    la fila bloqueada hasta el guardado normal, en la misma transacción. Los
+    formularios mandan oculta la versión que vio el usuario. Si después se
+    revierte la transacción, la instancia queda con la versión ya incrementada:
+    para reintentar hay que volver a leerla.
+    """
+
+    def save(self, *args, **kwargs):
+        if self._state.adding or kwargs.get('force_insert'):
+            return super().save(*args, **kwargs)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        filas = type(self)._base_manager.using(using).filter(pk=self.pk)
+        esperada = self.version
+        with transaction.atomic(using=using):
+            if filas.filter(version=esperada).update(version=F('version') + 1):
+                self.version = esperada + 1
+            elif filas.exists():
+                raise ConflictoVersion(self, esperada)
+            return super().save(*args, **kwargs)
+
+
 class Cliente(models.Model):
     """Modelo para almacenar información de clientes"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -14,6 +142,11 @@ class Cliente(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     activo = models.BooleanField(default=True, verbose_name="Cliente activo")
 
+    # Versiones normalizadas para la búsqueda por prefijo (ver busqueda.py)
+    nombre_busqueda = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
+    empresa_busqueda = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
+    email_busqueda = models.CharField(max_length=254, blank=True, editable=False, db_index=True)
+
     class Meta:
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
@@ -22,6 +155,35 @@ class Cliente(models.Model):
     def __str__(self):
         return f"{self.nombre} - {self.empresa}" if self.empresa else self.nombre
 
+    def save(self, *args, **kwargs):
+        self.nombre_busqueda = normalizar_busqueda(self.nombre)
+        self.empresa_busqueda = normalizar_busqueda(self.empresa)
+        self.email_busqueda = normalizar_busqueda(self.email)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            campos = set(update_fields)
+            for campo in ('nombre', 'empresa', 'email'):
+                if campo in campos:
+                    campos.add(f'{campo}_busqueda')
+            kwargs['update_fields'] = campos
+        nuevo = self._state.adding
+        super().save(*args, **kwargs)
+        if nuevo:
+            EstadisticasCliente.objects.get_or_create(cliente=self)
+        invalidar_cache_clientes()
+
+    def delete(self, *args, **kwargs):
+        from .flujo_caja import invalidar_flujo_caja
+
+        tenia_archivadas = self.cotizaciones_archivadas.exists()
+        resultado = super().delete(*args, **kwargs)
+        invalidar_cache_clientes()
+        # Las cotizaciones del cliente se borran en cascada
+        invalidar_flujo_caja()
+        if tenia_archivadas:
+            ResumenArchivo.recalcular()
+        return resultado
+
 class Servicio(models.Model):
     """Modelo para definir servicios y sus tarifas"""
     TIPO_SERVICIO_CHOICES = [
@@ -53,7 +215,7 @@ class Servicio(models.Model):
     def __str__(self):
         return f"{self.nombre} - ${self.tarifa_hora}/hora"
 
-class Cotizacion(models.Model):
+class Cotizacion(VersionOptimista, models.Model):
     """Modelo principal para las cotizaciones"""
     MODALIDAD_PAGO_CHOICES = [
         ('mensual', 'Mensual'),
@@ -67,12 +229,15 @@ class Cotizacion(models.Model):
         ('aprobada', 'Aprobada'),
         ('rechazada', 'Rechazada'),
         ('cancelada', 'Cancelada'),
+        ('vencida', 'Vencida'),
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     numero_cotizacion = models.CharField(max_length=20, unique=True, verbose_name="Número de cotización")
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, verbose_name="Cliente")
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Sincronización incremental de la proyección de flujo de caja
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
     fecha_vencimiento = models.DateField(verbose_name="Fecha de vencimiento")
     modalidad_pago = models.CharField(max_length=10, choices=MODALIDAD_PAGO_CHOICES, default='unico')
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='borrador')
@@ -88,11 +253,17 @@ class Cotizacion(models.Model):
     # Campos adicionales
     notas = models.TextField(blank=True, verbose_name="Notas adicionales")
     terminos_condiciones = models.TextField(blank=True, verbose_name="Términos y condiciones")
+    # Control de concurrencia optimista (ver VersionOptimista)
+    version = models.PositiveIntegerField(default=1)
     
     class Meta:
         verbose_name = "Cotización"
         verbose_name_plural = "Cotizaciones"
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Búsqueda de cotizaciones vencidas (comando vencer_cotizaciones)
+            models.Index(fields=['estado', 'fecha_vencimiento'], name='cotizacion_estado_venc_idx'),
+        ]
 
     def __str__(self):
         return f"Cotización {self.numero_cotizacion} - {self.cliente.nombre}"
@@ -100,29 +271,22 @@ class Cotizacion(models.Model):
     def calcular_totales(self):
         """Calcula todos los totales de la cotización"""
         # Calcular subtotal
-        self.subtotal = sum(detalle.subtotal for detalle in self.detallecotizacion_set.all())
-        
-        # Calcular descuento
-        if self.descuento_porcentaje > 0:
-            self.descuento_monto = (self.subtotal * self.descuento_porcentaje) / 100
-        else:
-            self.descuento_monto = 0
-        
-        # Calcular base imponible
-        base_imponible = self.subtotal - self.descuento_monto
+        subtotal = sum(detalle.subtotal for detalle in self.detallecotizacion_set.all())
         
-        # Calcular IVA
-        self.iva_monto = (base_imponible * self.iva_porcentaje) / 100
+        # Calcular descuento, IVA y total
+        for campo, valor in montos_redondeados(subtotal, self.descuento_porcentaje, self.iva_porcentaje).items():
+            setattr(self, campo, valor)
         
-        # Calcular total
-        self.total = base_imponible + self.iva_monto
-        
-        self.save()
+        # Solo los montos: no pisa cabeceras editadas por otros con valores viejos
+        self.save(update_fields=CAMPOS_MONTO)
 
     def generar_numero_cotizacion(self):
         """Genera un número único de cotización"""
         if not self.numero_cotizacion:
             ultima_cotizacion = Cotizacion.objects.order_by('-fecha_creacion').first()
+            if ultima_cotizacion is None:
+                # Todas archivadas: la secuencia sigue desde el archivo
+                ultima_cotizacion = CotizacionArchivada.objects.order_by('-fecha_creacion', '-numero_cotizacion').first()
             if ultima_cotizacion and ultima_cotizacion.numero_cotizacion:
                 try:
                     ultimo_numero = int(ultima_cotizacion.numero_cotizacion.split('-')[1])
@@ -136,12 +300,147 @@ class Cotizacion(models.Model):
         
         return self.numero_cotizacion
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Estado leído de la base de datos, para detectar transiciones al guardar
+        instancia._estado_original = instancia.__dict__.get('estado')
+        # Lo que la cotización aporta hoy a las estadísticas de su cliente
+        if all(campo in instancia.__dict__ for campo in CAMPOS_ESTADISTICAS):
+            instancia._estadisticas_original = instancia._aporte()
+        return instancia
+
+    def _aporte(self, update_fields=None, anterior=None):
+        """(cliente_id, estado, total) tal como quedan en la base de datos"""
+        aporte = (self.cliente_id, self.estado, Decimal(self.total).quantize(CENTAVOS, rounding=ROUND_HALF_UP))
+        if update_fields is None or anterior is None:
+            return aporte
+        # Con update_fields solo cambian las columnas guardadas
+        return tuple(
+            valor if campo in update_fields or campo.removesuffix('_id') in update_fields else previo
+            for campo, valor, previo in zip(CAMPOS_ESTADISTICAS, aporte, anterior)
+        )
+
+    def _actualizar_estadisticas(self, anterior, actual):
+        if anterior == actual:
+            return
+        cambios = [(*actual, 1)]
+        if anterior is not None:
+            cambios.append((*anterior, -1))
+        nueva = anterior is None
+        EstadisticasCliente.ajustar(cambios, ultima={actual[0]: self.fecha_creacion} if nueva else None)
+        if not nueva and anterior[0] != actual[0]:
+            # Cambio de cliente: el anterior puede perder su última cotización
+            EstadisticasCliente.recalcular_ultima([anterior[0], actual[0]])
+
+    def _registrar_eventos(self, anterior, actual):
+        """Eventos de la bandeja de salida: creación, cambio de estado o de total"""
+        montos = {
+            campo: Decimal(getattr(self, campo)).quantize(CENTAVOS, rounding=ROUND_HALF_UP) for campo in CAMPOS_MONTO
+        }
+        if anterior is None:
+            eventos = [('creada', {
+                'numero': self.numero_cotizacion, 'cliente': self.cliente_id, 'estado': self.estado, **montos,
+            })]
+        else:
+            eventos = []
+            if actual[1] != anterior[1]:
+                eventos.append(('estado', {'numero': self.numero_cotizacion, 'anterior': anterior[1], 'estado': actual[1]}))
+            if actual[2] != anterior[2]:
+                eventos.append(('totales', {'numero': self.numero_cotizacion, **montos}))
+        EventoCotizacion.registrar((self.pk, tipo, datos) for tipo, datos in eventos)
+
     def save(self, *args, **kwargs):
         if not self.numero_cotizacion:
             self.numero_cotizacion = self.generar_numero_cotizacion()
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'fecha_actualizacion'}
+        estado_anterior = getattr(self, '_estado_original', None)
+        estadisticas_anterior = getattr(self, '_estadisticas_original', None)
+        if estadisticas_anterior is None and not self._state.adding:
+            # Instancia cargada con campos diferidos
+            estadisticas_anterior = Cotizacion.objects.filter(pk=self.pk).values_list(*CAMPOS_ESTADISTICAS).first()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            actual = self._aporte(update_fields, estadisticas_anterior)
+            self._actualizar_estadisticas(estadisticas_anterior, actual)
+            self._registrar_eventos(estadisticas_anterior, actual)
+        self._estado_original = self.estado
+        self._estadisticas_original = actual
+        # Al enviarse o aprobarse se congela el PDF tras confirmar la transacción
+        if self.estado != estado_anterior and self.estado in PdfCotizacion.ESTADOS_CONGELADOS:
+            from .pdf import programar_congelado
+            programar_congelado(self.pk, self.estado)
+
+    def delete(self, *args, **kwargs):
+        from .flujo_caja import invalidar_flujo_caja
+
+        aporte = getattr(self, '_estadisticas_original', None) or self._aporte()
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            EstadisticasCliente.ajustar([(*aporte, -1)])
+            EstadisticasCliente.recalcular_ultima([aporte[0]])
+        invalidar_flujo_caja()
+        return resultado
+
+    def clonar(self, aplicar_tarifas_actuales=False, **cambios):
+        """
+        Duplica la cotización y todas sus líneas en una sola transacción.
+
+        La copia queda en borrador con un número nuevo de la secuencia. Las
+        líneas se insertan con bulk_create (sin la cascada de recálculo de
+        DetalleCotizacion.save) y los totales se copian tal cual; con
+        aplicar_tarifas_actuales se toma la tarifa vigente de cada Servicio y
+        los totales se calculan una vez en memoria. `cambios` permite
+        sobrescribir campos de la copia (por ejemplo, el cliente).
+        """
+        detalles = self.detallecotizacion_set.all()
+        if aplicar_tarifas_actuales:
+            detalles = detalles.select_related('servicio')
+
+        copia = Cotizacion(
+            cliente_id=self.cliente_id,
+            fecha_vencimiento=datetime.date.today() + datetime.timedelta(days=30),
+            modalidad_pago=self.modalidad_pago,
+            estado='borrador',
+            subtotal=self.subtotal,
+            descuento_porcentaje=self.descuento_porcentaje,
+            descuento_monto=self.descuento_monto,
+            iva_porcentaje=self.iva_porcentaje,
+            iva_monto=self.iva_monto,
+            total=self.total,
+            notas=self.notas,
+            terminos_condiciones=self.terminos_condiciones,
+        )
+        for campo, valor in cambios.items():
+            setattr(copia, campo, valor)
 
-class DetalleCotizacion(models.Model):
+        nuevos_detalles = []
+        for detalle in detalles:
+            nuevo = DetalleCotizacion(
+                cotizacion=copia,
+                servicio_id=detalle.servicio_id,
+                descripcion=detalle.descripcion,
+                horas_estimadas=detalle.horas_estimadas,
+                tarifa_hora=detalle.servicio.tarifa_hora if aplicar_tarifas_actuales else detalle.tarifa_hora,
+                subtotal=detalle.subtotal,
+            )
+            if aplicar_tarifas_actuales:
+                nuevo.calcular_subtotal()
+            nuevos_detalles.append(nuevo)
+
+        if aplicar_tarifas_actuales or 'descuento_porcentaje' in cambios or 'iva_porcentaje' in cambios:
+            subtotal = sum((detalle.subtotal for detalle in nuevos_detalles), Decimal('0'))
+            for campo, valor in montos_redondeados(subtotal, copia.descuento_porcentaje, copia.iva_porcentaje).items():
+                setattr(copia, campo, valor)
+
+        with transaction.atomic():
+            copia.save()
+            DetalleCotizacion.objects.bulk_create(nuevos_detalles)
+        return copia
+
+class DetalleCotizacion(VersionOptimista, models.Model):
     """Modelo para los detalles de cada cotización"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     cotizacion = models.ForeignKey(Cotizacion, on_delete=models.CASCADE)
@@ -160,6 +459,8 @@ class DetalleCotizacion(models.Model):
         verbose_name="Tarifa por hora (USD)"
     )
     subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Control de concurrencia optimista (ver VersionOptimista)
+    version = models.PositiveIntegerField(default=1)
     
     class Meta:
         verbose_name = "Detalle de cotización"
@@ -169,14 +470,345 @@ class DetalleCotizacion(models.Model):
         return f"{self.servicio.nombre} - {self.horas_estimadas}h"
 
     def calcular_subtotal(self):
-        """Calcula el subtotal del detalle"""
-        self.subtotal = self.horas_estimadas * self.tarifa_hora
+        """Calcula el subtotal del detalle, redondeado a centavos como en PostgreSQL"""
+        # SQLite guardaría el producto sin redondear y lo leería con redondeo bancario
+        self.subtotal = (self.horas_estimadas * self.tarifa_hora).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
         return self.subtotal
 
     def save(self, *args, **kwargs):
         if not self.tarifa_hora:
             self.tarifa_hora = self.servicio.tarifa_hora
         self.subtotal = self.calcular_subtotal()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'subtotal'}
         super().save(*args, **kwargs)
-        # Recalcular totales de la cotización
-        self.cotizacion.calcular_totales()
+        # Recalcular totales de la cotización (o dejarlo pendiente si está diferido)
+        pendientes = _totales_pendientes.get()
+        if pendientes is not None:
+            pendientes.setdefault(self.cotizacion_id, self.cotizacion)
+        else:
+            self.cotizacion.calcular_totales()
+
+class RevisionCotizacion(models.Model):
+    """Historial de cambios de una cotización: snapshots periódicos y deltas compactos"""
+    cotizacion = models.ForeignKey(Cotizacion, on_delete=models.CASCADE, related_name='revisiones')
+    version = models.PositiveIntegerField(verbose_name="Versión")
+    es_snapshot = models.BooleanField(default=False, verbose_name="Snapshot completo")
+    datos = models.JSONField(verbose_name="Datos de la revisión")
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Revisión de cotización"
+        verbose_name_plural = "Revisiones de cotización"
+        ordering = ['cotizacion', 'version']
+        constraints = [
+            models.UniqueConstraint(fields=['cotizacion', 'version'], name='revision_version_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.cotizacion_id} v{self.version}"
+
+class PdfCotizacion(models.Model):
+    """PDF inmutable de una cotización, generado al pasar a enviada o aprobada"""
+    ESTADOS_CONGELADOS = ('enviada', 'aprobada')
+    PLANTILLA_CHOICES = [
+        ('completo', 'Con datos de la empresa'),
+        ('sin_info', 'Sin datos de la empresa'),
+    ]
+
+    cotizacion = models.ForeignKey(Cotizacion, on_delete=models.CASCADE, related_name='pdfs')
+    estado = models.CharField(max_length=20, verbose_name="Estado al congelar")
+    plantilla = models.CharField(max_length=20, choices=PLANTILLA_CHOICES)
+    huella = models.CharField(max_length=64, verbose_name="SHA-256 del PDF")
+    archivo = models.CharField(max_length=255, verbose_name="Ruta relativa a PDF_ROOT")
+    tamano = models.PositiveIntegerField(verbose_name="Tamaño (bytes)")
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "PDF congelado"
+        verbose_name_plural = "PDFs congelados"
+        ordering = ['cotizacion', '-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['cotizacion', 'estado', 'plantilla'], name='pdf_congelado_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.cotizacion_id} {self.estado} ({self.plantilla})"
+
+
+class CotizacionArchivada(models.Model):
+    """
+    Cotización cerrada movida fuera de las tablas de trabajo (ver archivo.py).
+    Conserva el id y los campos de Cotizacion; sus revisiones y PDFs congelados
+    se guardan como JSON.
+    """
+    archivada = True
+
+    id = models.UUIDField(primary_key=True, editable=False)
+    numero_cotizacion = models.CharField(max_length=20, unique=True, verbose_name="Número de cotización")
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='cotizaciones_archivadas')
+    fecha_creacion = models.DateTimeField(db_index=True)
+    fecha_actualizacion = models.DateTimeField()
+    fecha_vencimiento = models.DateField(verbose_name="Fecha de vencimiento")
+    modalidad_pago = models.CharField(max_length=10, choices=Cotizacion.MODALIDAD_PAGO_CHOICES)
+    estado = models.CharField(max_length=20, choices=Cotizacion.ESTADO_CHOICES)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    descuento_porcentaje = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="Descuento (%)")
+    descuento_monto = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Descuento (USD)")
+    iva_porcentaje = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="IVA (%)")
+    iva_monto = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="IVA (USD)")
+    total = models.DecimalField(max_digits=12, decimal_places=2)
+    notas = models.TextField(blank=True, verbose_name="Notas adicionales")
+    terminos_condiciones = models.TextField(blank=True, verbose_name="Términos y condiciones")
+    revisiones = models.JSONField(default=list, verbose_name="Historial de revisiones")
+    pdfs = models.JSONField(default=list, verbose_name="PDFs congelados")
+    fecha_archivo = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Cotización archivada"
+        verbose_name_plural = "Cotizaciones archivadas"
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Cotización {self.numero_cotizacion} (archivada)"
+
+    @property
+    def detallecotizacion_set(self):
+        # Mismo acceso que Cotizacion para las plantillas y contexto_pdf
+        return self.detalles
+
+    def archivo_pdf(self, plantilla):
+        """Ruta relativa a PDF_ROOT del PDF congelado más reciente, o None"""
+        congelados = sorted(
+            (pdf for pdf in self.pdfs if pdf['plantilla'] == plantilla), key=lambda pdf: pdf['fecha'],
+        )
+        return congelados[-1]['archivo'] if congelados else None
+
+
+class DetalleArchivado(models.Model):
+    """Línea de una cotización archivada"""
+    id = models.UUIDField(primary_key=True, editable=False)
+    cotizacion = models.ForeignKey(CotizacionArchivada, on_delete=models.CASCADE, related_name='detalles')
+    servicio = models.ForeignKey(Servicio, on_delete=models.CASCADE, verbose_name="Servicio")
+    descripcion = models.TextField(verbose_name="Descripción del trabajo")
+    horas_estimadas = models.DecimalField(max_digits=8, decimal_places=2, verbose_name="Horas estimadas")
+    tarifa_hora = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Tarifa por hora (USD)")
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        verbose_name = "Detalle archivado"
+        verbose_name_plural = "Detalles archivados"
+
+    def __str__(self):
+        return f"{self.servicio.nombre} - {self.horas_estimadas}h"
+
+
+class ResumenArchivo(models.Model):
+    """Conteos precalculados de las cotizaciones archivadas por estado (dashboard)"""
+    estado = models.CharField(max_length=20, primary_key=True, choices=Cotizacion.ESTADO_CHOICES)
+    cantidad = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Resumen del archivo"
+        verbose_name_plural = "Resumen del archivo"
+
+    def __str__(self):
+        return f"{self.estado}: {self.cantidad}"
+
+    @classmethod
+    def conteos(cls):
+        return dict(cls.objects.values_list('estado', 'cantidad'))
+
+    @classmethod
+    def recalcular(cls):
+        """Rehace el resumen desde la tabla de archivo (tras borrados en cascada)"""
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                cls(estado=fila['estado'], cantidad=fila['cantidad'], total=fila['suma'] or 0)
+                for fila in CotizacionArchivada.objects.order_by().values('estado').annotate(
+                    cantidad=models.Count('pk'), suma=models.Sum('total'),
+                )
+            )
+
+
+class EstadisticasCliente(models.Model):
+    """
+    Contadores desnormalizados de las cotizaciones de un cliente, vivas y
+    archivadas (archivar no los cambia). Cotizacion.save() y delete() los
+    ajustan con F() en la misma transacción; `manage.py
+    recalcular_estadisticas_clientes` los reconstruye desde las tablas.
+    """
+    cliente = models.OneToOneField(Cliente, on_delete=models.CASCADE, primary_key=True, related_name='estadisticas')
+    cantidad = models.IntegerField(default=0, db_index=True, verbose_name="Cotizaciones")
+    cantidad_borrador = models.IntegerField(default=0)
+    cantidad_enviada = models.IntegerField(default=0)
+    cantidad_aprobada = models.IntegerField(default=0, db_index=True)
+    cantidad_rechazada = models.IntegerField(default=0)
+    cantidad_cancelada = models.IntegerField(default=0)
+    cantidad_vencida = models.IntegerField(default=0)
+    total_cotizado = models.DecimalField(max_digits=16, decimal_places=2, default=0, db_index=True)
+    total_aprobado = models.DecimalField(max_digits=16, decimal_places=2, default=0, db_index=True)
+    ultima_cotizacion = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Estadísticas de cliente"
+        verbose_name_plural = "Estadísticas de clientes"
+
+    def __str__(self):
+        return f"{self.cliente_id}: {self.cantidad} cotizaciones"
+
+    def por_estado(self):
+        """[(nombre del estado, cantidad)] en el orden de Cotizacion.ESTADO_CHOICES"""
+        return [(nombre, getattr(self, f'cantidad_{estado}')) for estado, nombre in Cotizacion.ESTADO_CHOICES]
+
+    @classmethod
+    def ajustar(cls, cambios, ultima=None):
+        """
+        Aplica los cambios (cliente_id, estado, total, signo): signo 1 suma la
+        cotización a los contadores de su cliente y -1 la resta. Un UPDATE con
+        F() por cliente; `ultima` ({cliente_id: fecha}) adelanta
+        ultima_cotizacion. Si falta la fila del cliente se recalcula entera.
+        """
+        ultima = ultima or {}
+        deltas = {cliente_id: {} for cliente_id in ultima}
+        for cliente_id, estado, total, signo in cambios:
+            delta = deltas.setdefault(cliente_id, {})
+            for campo, valor in (('cantidad', signo), (f'cantidad_{estado}', signo), ('total_cotizado', signo * total)):
+                delta[campo] = delta.get(campo, 0) + valor
+            if estado == 'aprobada':
+                delta['total_aprobado'] = delta.get('total_aprobado', 0) + signo * total
+
+        faltantes = []
+        for cliente_id, delta in deltas.items():
+            valores = {campo: models.F(campo) + valor for campo, valor in delta.items() if valor}
+            if cliente_id in ultima:
+                fecha = models.Value(ultima[cliente_id], output_field=models.DateTimeField())
+                valores['ultima_cotizacion'] = models.Case(
+                    models.When(ultima_cotizacion__gte=fecha, then=models.F('ultima_cotizacion')), default=fecha,
+                )
+            if valores and not cls.objects.filter(pk=cliente_id).update(**valores):
+                faltantes.append(cliente_id)
+        if faltantes:
+            cls.recalcular(faltantes)
+
+    @classmethod
+    def recalcular_ultima(cls, clientes):
+        """ultima_cotizacion desde las tablas (tras borrar o mover cotizaciones)"""
+        for cliente_id in clientes:
+            fechas = [
+                modelo.objects.filter(cliente_id=cliente_id).aggregate(ultima=models.Max('fecha_creacion'))['ultima']
+                for modelo in (Cotizacion, CotizacionArchivada)
+            ]
+            fechas = [fecha for fecha in fechas if fecha is not None]
+            cls.objects.filter(pk=cliente_id).update(ultima_cotizacion=max(fechas) if fechas else None)
+
+    @classmethod
+    def calcular(cls, clientes):
+        """Estadísticas (sin guardar) de esos clientes desde Cotizacion y CotizacionArchivada"""
+        estadisticas = {cliente_id: cls(cliente_id=cliente_id) for cliente_id in clientes}
+        for modelo in (Cotizacion, CotizacionArchivada):
+            filas = (
+                modelo.objects.filter(cliente_id__in=clientes).order_by().values('cliente_id', 'estado')
+                .annotate(cantidad=models.Count('pk'), suma=models.Sum('total'), ultima=models.Max('fecha_creacion'))
+            )
+            for fila in filas:
+                estadistica = estadisticas[fila['cliente_id']]
+                campo = f'cantidad_{fila["estado"]}'
+                setattr(estadistica, campo, getattr(estadistica, campo) + fila['cantidad'])
+                estadistica.cantidad += fila['cantidad']
+                estadistica.total_cotizado += fila['suma'] or 0
+                if fila['estado'] == 'aprobada':
+                    estadistica.total_aprobado += fila['suma'] or 0
+                if estadistica.ultima_cotizacion is None or fila['ultima'] > estadistica.ultima_cotizacion:
+                    estadistica.ultima_cotizacion = fila['ultima']
+        for estadistica in estadisticas.values():
+            # SQLite suma los montos sin redondear a centavos
+            estadistica.total_cotizado = Decimal(estadistica.total_cotizado).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+            estadistica.total_aprobado = Decimal(estadistica.total_aprobado).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+        return list(estadisticas.values())
+
+    @classmethod
+    def recalcular(cls, clientes):
+        """Reescribe las estadísticas de esos clientes; devuelve las filas guardadas"""
+        campos = [campo.name for campo in cls._meta.concrete_fields if not campo.primary_key]
+        filas = cls.calcular(list(clientes))
+        cls.objects.bulk_create(filas, update_conflicts=True, unique_fields=['cliente'], update_fields=campos)
+        return filas
+
+
+class EventoCotizacion(models.Model):
+    """
+    Bandeja de salida (outbox) de eventos del ciclo de vida de las
+    cotizaciones para sistemas externos (contabilidad, CRM). Se inserta en la
+    misma transacción que el cambio, así que solo existen eventos de cambios
+    confirmados; `manage.py despachar_eventos` los entrega (ver eventos.py).
+    """
+    TIPO_CHOICES = [
+        ('creada', 'Creada'),
+        ('estado', 'Cambio de estado'),
+        ('totales', 'Totales recalculados'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    # Sin clave foránea: el evento sobrevive al borrado o archivo de la cotización
+    cotizacion = models.UUIDField(verbose_name="Cotización")
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    datos = models.JSONField(encoder=DjangoJSONEncoder)
+    fecha = models.DateTimeField(auto_now_add=True)
+    enviado = models.DateTimeField(null=True, blank=True)
+    # Rechazado por el receptor o sin entregar tras los intentos máximos
+    fallido = models.DateTimeField(null=True, blank=True)
+    intentos = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, verbose_name="Último error")
+
+    class Meta:
+        verbose_name = "Evento de cotización"
+        verbose_name_plural = "Eventos de cotizaciones"
+        ordering = ['id']
+        indexes = [
+            # El despachador lee solo los pendientes, en orden
+            models.Index(
+                fields=['id'], condition=models.Q(enviado__isnull=True, fallido__isnull=True),
+                name='evento_pendiente_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.id} {self.tipo} {self.cotizacion}"
+
+    @classmethod
+    def registrar(cls, eventos):
+        """
+        Inserta los eventos (cotizacion_id, tipo, datos) con un solo INSERT.
+        Se llama dentro de la transacción del cambio que describen.
+        """
+        eventos = [cls(cotizacion=pk, tipo=tipo, datos=datos) for pk, tipo, datos in eventos]
+        if eventos:
+            cls.objects.bulk_create(eventos, batch_size=500)
+
+
+class EnvioCotizacion(models.Model):
+    """Envío de una cotización por correo al cliente (ver correo.py)"""
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('enviado', 'Enviado'),
+        ('error', 'Error'),
+    ]
+
+    cotizacion = models.ForeignKey(Cotizacion, on_delete=models.CASCADE, related_name='envios')
+    destinatario = models.EmailField(blank=True)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='pendiente')
+    error = models.TextField(blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+    fecha_envio = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Envío de cotización"
+        verbose_name_plural = "Envíos de cotizaciones"
+        ordering = ['cotizacion', '-fecha']
+
+    def __str__(self):
+        return f"{self.cotizacion_id} {self.destinatario} ({self.estado})"
@@ -0,0 +1,333 @@
+"""
+Generación y entrega de PDFs de cotizaciones.
+
+Los PDFs se guardan en settings.PDF_ROOT con el hash SHA-256 del HTML
+renderizado como nombre: si la cotización no cambió, el archivo ya existe y
+no se vuelve a ejecutar WeasyPrint. La entrega no pasa los bytes por Python:
+
+* Por defecto se usa FileResponse, que el servidor WSGI envía con sendfile.
+* PDF_SENDFILE='x-accel-redirect' (nginx) o 'x-sendfile' (Apache, lighttpd)
+  delega la lectura del archivo al proxy.
+
+El hash sirve también de ETag, así que los GET condicionales (If-None-Match,
+If-Modified-Since) responden 304 y las peticiones Range 206.
+
+Las opciones de write_pdf salen de los perfiles de config.PERFILES_PDF
+('fast-preview', 'email', 'archive'); el perfil forma parte de la clave del
+PDF guardado.
+
+WeasyPrint (y Pango/cairo) se importa en el primer render o con
+precargar_weasyprint(), no al importar este módulo: migrate, collectstatic
+y las páginas que no generan PDFs no pagan su carga.
+
+Cada render espera turno en el control de admisión entre procesos
+(admision.turno_pdf); si no lo consigue se lanza PdfSaturado.
+
+Cuando una cotización pasa a enviada o aprobada se congela su PDF: se genera
+en segundo plano después del commit, se guarda en PDF_ROOT/congelados con el
+hash del propio PDF como nombre y se registra en PdfCotizacion. Desde ese
+momento las descargas sirven ese archivo aunque cambien los datos vivos
+(EMPRESA_CONFIG, nombres de servicios...).
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.http import FileResponse, HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .admision import turno_pdf
+from .config import EMPRESA_CONFIG, PERFIL_PDF_CONGELADO, PERFIL_PDF_DEFECTO, PERFILES_PDF
+from .models import Cotizacion, CotizacionArchivada, PdfCotizacion
+from .recursos_pdf import BASE_URL, cache_imagenes, url_fetcher
+
+logger = logging.getLogger(__name__)
+
+RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+TAMANO_BLOQUE = 64 * 1024
+DIRECTORIO_CONGELADOS = 'congelados'
+
+PLANTILLAS = {
+    'completo': 'cotizaciones/template_pdf_cotizacion.html',
+    'sin_info': 'cotizaciones/template_pdf_cotizacion_withoutinfo.html',
+}
+
+# Un solo hilo: los PDFs congelados se generan de a uno, fuera de la petición
+_ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pdf-congelado')
+
+
+def directorio_pdf():
+    return Path(getattr(settings, 'PDF_ROOT', Path(settings.MEDIA_ROOT) / 'pdf'))
+
+
+def contexto_pdf(cotizacion, plantilla, detalles=None):
+    """Contexto de las plantillas PDF de una cotización"""
+    contexto = {
+        'cotizacion': cotizacion,
+        'detalles': cotizacion.detallecotizacion_set.all() if detalles is None else detalles,
+    }
+    if plantilla == 'completo':
+        contexto['empresa'] = EMPRESA_CONFIG
+    return contexto
+
+
+def precargar_weasyprint():
+    """Importa WeasyPrint y carga la configuración de fuentes (PDF_PRECARGAR)"""
+    from weasyprint.text.fonts import FontConfiguration
+    FontConfiguration()
+
+
+def renderizar(html_string, perfil=PERFIL_PDF_DEFECTO, bloquear=False):
+    """
+    Convierte el HTML en los bytes del PDF con las opciones del perfil.
+    Con bloquear=False lanza PdfSaturado si no consigue turno.
+    """
+    from weasyprint import HTML, CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+    with turno_pdf(bloquear):
+        # Configurar fuentes
+        font_config = FontConfiguration()
+
+        # Crear el PDF usando WeasyPrint; logos, fuentes e imágenes salen del almacén local
+        html = HTML(string=html_string, base_url=BASE_URL, url_fetcher=url_fetcher)
+        css = CSS(string='', font_config=font_config, url_fetcher=url_fetcher)
+        return html.write_pdf(
+            stylesheets=[css], font_config=font_config, cache=cache_imagenes, **PERFILES_PDF[perfil],
+        )
+
+
+def _guardar(ruta, datos):
+    """Escribe a un temporal y renombra: otro worker nunca ve un PDF a medias"""
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(datos)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+def generar_pdf(template_name, contexto, perfil=PERFIL_PDF_DEFECTO, bloquear=False):
+    """
+    Devuelve la ruta del PDF de la plantilla con el contexto dado,
+    generándolo solo si no existe uno para el mismo HTML y perfil.
+    bloquear se pasa a renderizar().
+    """
+    html_string = render_to_string(template_name, contexto)
+    huella = hashlib.sha256(f'{perfil}\n{html_string}'.encode('utf-8')).hexdigest()
+    ruta = directorio_pdf() / huella[:2] / f'{huella}.pdf'
+    if not ruta.exists():
+        _guardar(ruta, renderizar(html_string, perfil, bloquear))
+    return ruta
+
+
+def congelar_pdf(cotizacion_id, estado, bloquear=False):
+    """
+    Genera y registra los PDFs congelados de la cotización para `estado`.
+    Si la cotización ya cambió de estado no hace nada: el nuevo estado
+    tendrá su propio congelado. bloquear se pasa a renderizar().
+    """
+    cotizacion = Cotizacion.objects.select_related('cliente').filter(pk=cotizacion_id, estado=estado).first()
+    if cotizacion is None:
+        return []
+    existentes = set(cotizacion.pdfs.filter(estado=estado).values_list('plantilla', flat=True))
+    detalles = list(cotizacion.detallecotizacion_set.select_related('servicio'))
+
+    congelados = []
+    for plantilla, template_name in PLANTILLAS.items():
+        if plantilla in existentes:
+            continue
+        datos = renderizar(
+            render_to_string(template_name, contexto_pdf(cotizacion, plantilla, detalles)),
+            PERFIL_PDF_CONGELADO, bloquear,
+        )
+        huella = hashlib.sha256(datos).hexdigest()
+        relativa = Path(DIRECTORIO_CONGELADOS) / huella[:2] / f'{huella}.pdf'
+        ruta = directorio_pdf() / relativa
+        if not ruta.exists():
+            _guardar(ruta, datos)
+        else:
+            # Mismo contenido que un congelado anterior: limpiar_pdfs no borra archivos recientes
+            os.utime(ruta)
+        try:
+            with transaction.atomic():
+                congelados.append(PdfCotizacion.objects.create(
+                    cotizacion=cotizacion, estado=estado, plantilla=plantilla,
+                    huella=huella, archivo=relativa.as_posix(), tamano=len(datos),
+                ))
+        except IntegrityError:
+            # Otro proceso lo congeló primero; su archivo es el válido
+            pass
+    return congelados
+
+
+def congelados_en_uso():
+    """Rutas relativas a PDF_ROOT de los congelados de cotizaciones vivas y archivadas"""
+    en_uso = set(PdfCotizacion.objects.values_list('archivo', flat=True).iterator())
+    for pdfs in CotizacionArchivada.objects.exclude(pdfs=[]).values_list('pdfs', flat=True).iterator():
+        en_uso.update(pdf['archivo'] for pdf in pdfs)
+    return en_uso
+
+
+def _congelar_en_segundo_plano(ids, estado):
+    try:
+        for cotizacion_id in ids:
+            try:
+                congelar_pdf(cotizacion_id, estado, bloquear=True)
+            except Exception:
+                logger.exception('No se pudo congelar el PDF de la cotización %s (%s)', cotizacion_id, estado)
+    finally:
+        connections.close_all()
+
+
+def programar_congelado(cotizacion_id, estado):
+    """Encola el congelado para cuando se confirme la transacción actual"""
+    programar_congelados([cotizacion_id], estado)
+
+
+def programar_congelados(ids, estado):
+    """Como programar_congelado para un lote: una sola tarea tras el commit"""
+    ids = list(ids)
+    transaction.on_commit(lambda: _ejecutor.submit(_congelar_en_segundo_plano, ids, estado))
+
+
+def pdf_congelado(cotizacion, plantilla, bloquear=False):
+    """
+    Ruta del PDF congelado más reciente de la cotización (viva o archivada),
+    o None si se debe generar desde los datos (borradores). Si una cotización
+    enviada o aprobada aún no tiene el suyo (el hilo no llegó a ejecutarse):
+    con bloquear (tareas de fondo, comandos) se congela en ese momento; en una
+    petición se encola el congelado y se devuelve None, para servir el PDF
+    desde los datos sin un render extra en la petición.
+    """
+    if cotizacion.estado == 'borrador':
+        return None
+    if getattr(cotizacion, 'archivada', False):
+        archivo = cotizacion.archivo_pdf(plantilla)
+        return _ruta_congelado(archivo) if archivo else None
+    congelado = cotizacion.pdfs.filter(plantilla=plantilla).order_by('-fecha').first()
+    if congelado is None and cotizacion.estado in PdfCotizacion.ESTADOS_CONGELADOS:
+        if not bloquear:
+            programar_congelado(cotizacion.pk, cotizacion.estado)
+            return None
+        congelar_pdf(cotizacion.pk, cotizacion.estado, bloquear)
+        congelado = cotizacion.pdfs.filter(plantilla=plantilla).order_by('-fecha').first()
+    if congelado is None:
+        return None
+    return _ruta_congelado(congelado.archivo)
+
+
+def _ruta_congelado(archivo):
+    ruta = directorio_pdf() / archivo
+    if not ruta.exists():
+        logger.error('Falta el archivo del PDF congelado %s', ruta)
+        return None
+    return ruta
+
+
+class _LectorRango:
+    """Lee solo `longitud` bytes de un archivo ya posicionado"""
+
+    def __init__(self, archivo, longitud):
+        self.archivo = archivo
+        self.restante = longitud
+
+    def read(self, tamano=-1):
+        if self.restante <= 0:
+            return b''
+        if tamano < 0 or tamano > self.restante:
+            tamano = self.restante
+        datos = self.archivo.read(tamano)
+        self.restante -= len(datos)
+        return datos
+
+    def close(self):
+        self.archivo.close()
+
+
+def _rango_solicitado(request, tamano, etag):
+    """(inicio, fin) del encabezado Range, 'invalido' si no se puede cumplir o None"""
+    encabezado = request.headers.get('Range')
+    if not encabezado or request.method != 'GET':
+        return None
+    # If-Range con otra versión: se envía el archivo completo
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        return None
+    coincidencia = RANGO.match(encabezado.strip())
+    if not coincidencia or coincidencia.groups() == ('', ''):
+        return None
+    inicio, fin = coincidencia.groups()
+    if inicio == '':
+        # bytes=-N: los últimos N bytes
+        inicio, fin = max(0, tamano - int(fin)), tamano - 1
+    else:
+        inicio, fin = int(inicio), min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return 'invalido'
+    return inicio, fin
+
+
+def servir_pdf(request, ruta, nombre_archivo):
+    """Respuesta para descargar el PDF guardado en `ruta`"""
+    estado = ruta.stat()
+    etag = quote_etag(ruta.stem)
+    ultima_modificacion = int(estado.st_mtime)
+
+    condicional = get_conditional_response(request, etag=etag, last_modified=ultima_modificacion)
+    if condicional is not None:
+        return condicional
+
+    modo = getattr(settings, 'PDF_SENDFILE', '')
+    if modo == 'x-accel-redirect':
+        relativa = ruta.relative_to(directorio_pdf()).as_posix()
+        response = HttpResponse(content_type='application/pdf')
+        response['X-Accel-Redirect'] = getattr(settings, 'PDF_ACCEL_PREFIX', '/pdf-interno/') + relativa
+    elif modo == 'x-sendfile':
+        response = HttpResponse(content_type='application/pdf')
+        response['X-Sendfile'] = str(ruta)
+    else:
+        response = _respuesta_archivo(request, ruta, estado.st_size, etag)
+        if response.status_code == 416:
+            return response
+
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(ultima_modificacion)
+    response['Accept-Ranges'] = 'bytes'
+    # El contenido de la URL cambia con la cotización: revalidar siempre con el ETag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _respuesta_archivo(request, ruta, tamano, etag):
+    rango = _rango_solicitado(request, tamano, etag)
+    if rango == 'invalido':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{tamano}'
+        return response
+
+    archivo = open(ruta, 'rb')
+    if rango is None:
+        # Archivo completo: el servidor WSGI puede usar sendfile (wsgi.file_wrapper)
+        return FileResponse(archivo, content_type='application/pdf')
+
+    inicio, fin = rango
+    archivo.seek(inicio)
+    response = FileResponse(_LectorRango(archivo, fin - inicio + 1), content_type='application/pdf', status=206)
+    response.block_size = TAMANO_BLOQUE
+    response['Content-Length'] = str(fin - inicio + 1)
+    response['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+    return response
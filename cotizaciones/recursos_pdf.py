@@ -0,0 +1,191 @@
+"""
+Recursos de los PDFs (logo, fuentes, imágenes) resueltos sin red.
+
+WeasyPrint usa url_fetcher para cada imagen, hoja de estilos o fuente que
+referencia el HTML. El de este módulo nunca sale a la red durante un render:
+
+* Las URLs remotas (EMPRESA_CONFIG['logo_url'] y RECURSOS_PDF_CONFIG['urls'])
+  se descargan una vez con `manage.py precargar_recursos_pdf` a un almacén
+  local con el hash SHA-256 del contenido como nombre, más un manifiesto
+  url -> archivo. Una URL que no esté en el almacén se rechaza.
+* Las rutas locales (STATIC_URL, el almacén) se leen de disco una vez.
+
+Los bytes quedan en memoria del proceso y las imágenes ya decodificadas se
+comparten entre renders con la opción `cache` de write_pdf. Cada acceso
+registra su origen y duración (estadisticas()).
+"""
+
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+from .config import EMPRESA_CONFIG, RECURSOS_PDF_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Base de las URLs relativas del HTML: '/static/...' se resuelve como file:///static/...
+BASE_URL = 'file:///'
+MANIFIESTO = 'manifiesto.json'
+LENTO_SEGUNDOS = 0.05
+
+# Imágenes decodificadas por WeasyPrint, compartidas entre renders
+cache_imagenes = {}
+
+_bloqueo = threading.Lock()
+_memoria = {}
+_tiempos = {}
+_manifiesto = {'datos': {}, 'mtime': None}
+
+
+class RecursoNoDisponible(ValueError):
+    """La URL no está en el almacén local y no se permite descargarla durante el render"""
+
+
+def directorio_recursos():
+    return Path(getattr(settings, 'PDF_RECURSOS_ROOT', Path(settings.BASE_DIR) / 'pdf' / 'recursos'))
+
+
+def urls_configuradas():
+    """URLs remotas que deben estar en el almacén"""
+    urls = [EMPRESA_CONFIG.get('logo_url'), *RECURSOS_PDF_CONFIG['urls']]
+    return [url for url in urls if url and urlparse(url).scheme in ('http', 'https')]
+
+
+def _leer_manifiesto():
+    """Manifiesto del almacén; se vuelve a leer si otro proceso lo actualizó"""
+    ruta = directorio_recursos() / MANIFIESTO
+    try:
+        mtime = ruta.stat().st_mtime
+    except FileNotFoundError:
+        return {}
+    if mtime != _manifiesto['mtime']:
+        _manifiesto.update(datos=json.loads(ruta.read_text()), mtime=mtime)
+    return _manifiesto['datos']
+
+
+def _escribir(ruta, datos):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(datos)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+def precargar(urls=None, timeout=None):
+    """
+    Descarga las URLs al almacén (único punto con acceso a red). Devuelve una
+    lista de (url, bytes, segundos, error).
+    """
+    urls = urls_configuradas() if urls is None else urls
+    timeout = timeout or RECURSOS_PDF_CONFIG['timeout']
+    resultados = []
+    with _bloqueo:
+        manifiesto = dict(_leer_manifiesto())
+        for url in urls:
+            inicio = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=timeout) as respuesta:
+                    datos = respuesta.read()
+                    mime_type = respuesta.headers.get_content_type()
+            except OSError as error:
+                resultados.append((url, 0, time.perf_counter() - inicio, str(error)))
+                continue
+            huella = hashlib.sha256(datos).hexdigest()
+            extension = mimetypes.guess_extension(mime_type) or Path(urlparse(url).path).suffix
+            archivo = f'{huella}{extension}'
+            if not (directorio_recursos() / archivo).exists():
+                _escribir(directorio_recursos() / archivo, datos)
+            manifiesto[url] = {'archivo': archivo, 'mime_type': mime_type, 'huella': huella}
+            _memoria.pop(url, None)
+            resultados.append((url, len(datos), time.perf_counter() - inicio, None))
+        _escribir(directorio_recursos() / MANIFIESTO, json.dumps(manifiesto, indent=2).encode())
+    return resultados
+
+
+def _ruta_local(ruta_url):
+    """Ruta en disco de una URL file:// permitida (estáticos o el almacén)"""
+    ruta_url = unquote(ruta_url)
+    static_url = '/' + settings.STATIC_URL.strip('/') + '/'
+    if ruta_url.startswith(static_url):
+        relativa = ruta_url[len(static_url):]
+        encontrada = finders.find(relativa)
+        if encontrada:
+            return Path(encontrada)
+        if getattr(settings, 'STATIC_ROOT', None):
+            candidata = Path(settings.STATIC_ROOT) / relativa
+            if candidata.is_file():
+                return candidata
+        return None
+    ruta = Path(ruta_url).resolve()
+    if ruta.is_relative_to(directorio_recursos().resolve()) and ruta.is_file():
+        return ruta
+    return None
+
+
+def _cargar(url):
+    """(bytes, mime_type, origen) del recurso sin usar la red"""
+    partes = urlparse(url)
+    if partes.scheme in ('http', 'https'):
+        entrada = _leer_manifiesto().get(url)
+        if entrada is None:
+            raise RecursoNoDisponible(f'{url} no está precargado (manage.py precargar_recursos_pdf)')
+        return (directorio_recursos() / entrada['archivo']).read_bytes(), entrada['mime_type'], 'almacen'
+    if partes.scheme == 'file':
+        ruta = _ruta_local(partes.path)
+        if ruta is None:
+            raise RecursoNoDisponible(f'{url} no es un recurso local permitido')
+        return ruta.read_bytes(), mimetypes.guess_type(ruta.name)[0], 'disco'
+    raise RecursoNoDisponible(f'Esquema no permitido en PDFs: {url}')
+
+
+def _registrar(url, origen, segundos, tamano):
+    tiempos = _tiempos.setdefault(url, {'origen': origen, 'carga_ms': segundos * 1000, 'bytes': tamano, 'aciertos_memoria': 0})
+    if origen == 'memoria':
+        tiempos['aciertos_memoria'] += 1
+    elif segundos > LENTO_SEGUNDOS:
+        logger.warning('Recurso PDF lento: %s (%s, %.1f ms)', url, origen, segundos * 1000)
+    else:
+        logger.debug('Recurso PDF %s (%s, %.2f ms)', url, origen, segundos * 1000)
+
+
+def url_fetcher(url, timeout=10, ssl_context=None, http_headers=None):
+    """url_fetcher de WeasyPrint respaldado por memoria y el almacén local"""
+    if url.startswith('data:'):
+        from weasyprint import default_url_fetcher
+        return default_url_fetcher(url)
+
+    inicio = time.perf_counter()
+    with _bloqueo:
+        recurso = _memoria.get(url)
+        origen = 'memoria'
+        if recurso is None:
+            try:
+                datos, mime_type, origen = _cargar(url)
+            except (RecursoNoDisponible, OSError) as error:
+                _tiempos.pop(url, None)
+                _registrar(url, 'rechazado', time.perf_counter() - inicio, 0)
+                raise RecursoNoDisponible(str(error)) from error
+            recurso = _memoria[url] = {'string': datos, 'mime_type': mime_type}
+        _registrar(url, origen, time.perf_counter() - inicio, len(recurso['string']))
+    return {**recurso, 'redirected_url': url}
+
+
+def estadisticas():
+    """Por URL en este proceso: origen y duración de la primera carga, bytes y aciertos en memoria"""
+    with _bloqueo:
+        return {url: dict(tiempos) for url, tiempos in _tiempos.items()}
@@ -0,0 +1,139 @@
+"""
+Lecturas en réplicas de la base de datos.
+
+settings.DATABASE_REPLICAS enumera los alias de DATABASES que son réplicas de
+solo lectura de 'default' (ver quotes/database.py). RouterReplicas envía a una
+réplica elegida al azar las lecturas hechas dentro de en_replica() o de una
+vista marcada con lectura_en_replica; todo lo demás, y siempre las
+escrituras, va a la primaria.
+
+Lectura tras escritura: en cuanto una petición escribe, sus lecturas
+siguientes vuelven a la primaria, y ReplicasMiddleware deja una cookie que
+mantiene a ese navegador en la primaria durante
+REPLICAS_CONFIG['pegajoso_segundos'] (más que el retraso de replicación
+esperado), de modo que la redirección tras guardar ve sus propios cambios.
+"""
+
+import functools
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .config import REPLICAS_CONFIG
+
+# Por petición o comando: {'alias': réplica activa o None, 'escribio': bool}
+_estado = ContextVar('replicas', default=None)
+
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replicas():
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', ()) if alias in settings.DATABASES]
+
+
+@contextmanager
+def en_replica(alias=None):
+    """
+    Lecturas del bloque en una réplica (o en `alias`). Sin réplicas
+    configuradas, o si el bloque ya escribió, se lee de la primaria.
+    """
+    estado = _estado.get()
+    token = None
+    if estado is None:
+        estado = {'alias': None, 'escribio': False}
+        token = _estado.set(estado)
+    anterior = estado['alias']
+    disponibles = replicas()
+    estado['alias'] = alias or (random.choice(disponibles) if disponibles else None)
+    try:
+        yield estado['alias']
+    finally:
+        estado['alias'] = anterior
+        if token is not None:
+            _estado.reset(token)
+
+
+def lectura_en_replica(vista):
+    """
+    Decorador de vistas de solo lectura (listados, dashboard, reportes). Las
+    respuestas diferidas (TemplateResponse) se renderizan dentro del bloque
+    para que las consultas de la plantilla también vayan a la réplica.
+    """
+    @functools.wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if getattr(request, 'primaria_pegajosa', False) or not replicas():
+            return vista(request, *args, **kwargs)
+        with en_replica():
+            response = vista(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return response
+    return envoltura
+
+
+class RouterReplicas:
+    """Router de DATABASE_ROUTERS: réplicas solo dentro de en_replica()"""
+
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if estado is None or estado['alias'] is None or estado['escribio']:
+            return None
+        # Dentro de una transacción de la primaria se lee lo que ella ve
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return estado['alias']
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            estado['escribio'] = True
+        # Explícito: una instancia leída de una réplica se guarda en la primaria
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema por replicación
+        if db in replicas():
+            return False
+        return None
+
+
+class ReplicasMiddleware:
+    """Estado de réplicas por petición y cookie de primaria tras escribir"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replicas():
+            return self.get_response(request)
+
+        try:
+            hasta = float(request.COOKIES.get(REPLICAS_CONFIG['cookie'], 0))
+        except ValueError:
+            hasta = 0
+        request.primaria_pegajosa = hasta > time.time()
+        # Los métodos no seguros se tratan como escrituras desde el principio
+        estado = {'alias': None, 'escribio': request.method not in METODOS_SEGUROS}
+        token = _estado.set(estado)
+        try:
+            response = self.get_response(request)
+        finally:
+            _estado.reset(token)
+
+        if estado['escribio']:
+            segundos = REPLICAS_CONFIG['pegajoso_segundos']
+            response.set_cookie(
+                REPLICAS_CONFIG['cookie'], f'{time.time() + segundos:.3f}',
+                max_age=segundos, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,248 @@
+"""
+Historial de revisiones de cotizaciones.
+
+Cada cambio guardado de una cotización (cabecera y líneas) se almacena como
+un delta contra la versión anterior. Cada INTERVALO_SNAPSHOT versiones se
+guarda un snapshot completo, de modo que reconstruir cualquier versión
+aplica como máximo INTERVALO_SNAPSHOT - 1 deltas sobre el snapshot previo.
+
+Formato del estado:
+    {'cotizacion': {campo: valor}, 'detalles': {id: {campo: valor}}}
+
+Formato del delta:
+    {'cotizacion': {campo: nuevo_valor},
+     'detalles': {'+': {id: detalle}, '~': {id: {campo: nuevo_valor}}, '-': [id]}}
+
+Todo camino que escribe una cotización o sus líneas registra la revisión en
+la misma transacción: las vistas, el admin, transiciones.cambiar_estado e
+integridad.reparar_totales. Los caminos masivos usan registrar_revisiones(),
+que calcula el delta real de cada cotización con unas pocas consultas por
+lote, así que una versión nunca omite un cambio.
+"""
+
+from django.db import transaction
+from django.db.models import Max, Q
+
+from .models import Cliente, Cotizacion, DetalleCotizacion, RevisionCotizacion, Servicio
+
+INTERVALO_SNAPSHOT = 10
+
+CAMPOS_COTIZACION = [
+    'numero_cotizacion', 'cliente_id', 'fecha_vencimiento', 'modalidad_pago', 'estado',
+    'subtotal', 'descuento_porcentaje', 'descuento_monto', 'iva_porcentaje', 'iva_monto',
+    'total', 'notas', 'terminos_condiciones',
+]
+CAMPOS_DETALLE = ['servicio_id', 'descripcion', 'horas_estimadas', 'tarifa_hora', 'subtotal']
+
+
+def _serializar(valor):
+    """Convierte Decimal, fechas y UUID a texto para guardarlos en JSON"""
+    if valor is None or isinstance(valor, (str, int, bool)):
+        return valor
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _estados_actuales(ids):
+    """{pk: estado} de las cotizaciones de `ids` tal como están en la base de datos (dos consultas)"""
+    estados = {
+        fila.pop('id'): {
+            'cotizacion': {campo: _serializar(valor) for campo, valor in fila.items()}, 'detalles': {},
+        }
+        for fila in Cotizacion.objects.filter(pk__in=ids).order_by().values('id', *CAMPOS_COTIZACION)
+    }
+    detalles = DetalleCotizacion.objects.filter(cotizacion_id__in=ids).values('id', 'cotizacion_id', *CAMPOS_DETALLE)
+    for detalle in detalles:
+        estados[detalle.pop('cotizacion_id')]['detalles'][str(detalle.pop('id'))] = {
+            campo: _serializar(valor) for campo, valor in detalle.items()
+        }
+    return estados
+
+
+def estado_actual(cotizacion):
+    """Estado serializable de la cotización y sus líneas tal como están en la base de datos"""
+    return _estados_actuales([cotizacion.pk])[cotizacion.pk]
+
+
+def calcular_delta(anterior, nuevo):
+    """Delta mínimo para pasar del estado anterior al nuevo (vacío si no hay cambios)"""
+    delta = {}
+
+    cabecera = {
+        campo: valor for campo, valor in nuevo['cotizacion'].items()
+        if anterior['cotizacion'].get(campo) != valor
+    }
+    if cabecera:
+        delta['cotizacion'] = cabecera
+
+    detalles_anteriores = anterior['detalles']
+    detalles_nuevos = nuevo['detalles']
+    agregados = {
+        pk: detalle for pk, detalle in detalles_nuevos.items() if pk not in detalles_anteriores
+    }
+    modificados = {}
+    for pk, detalle in detalles_nuevos.items():
+        if pk in detalles_anteriores:
+            cambios = {
+                campo: valor for campo, valor in detalle.items()
+                if detalles_anteriores[pk].get(campo) != valor
+            }
+            if cambios:
+                modificados[pk] = cambios
+    eliminados = sorted(pk for pk in detalles_anteriores if pk not in detalles_nuevos)
+
+    detalles = {}
+    if agregados:
+        detalles['+'] = agregados
+    if modificados:
+        detalles['~'] = modificados
+    if eliminados:
+        detalles['-'] = eliminados
+    if detalles:
+        delta['detalles'] = detalles
+
+    return delta
+
+
+def aplicar_delta(estado, delta):
+    """Devuelve un nuevo estado con el delta aplicado"""
+    resultado = {
+        'cotizacion': {**estado['cotizacion'], **delta.get('cotizacion', {})},
+        'detalles': {pk: dict(detalle) for pk, detalle in estado['detalles'].items()},
+    }
+    detalles = delta.get('detalles', {})
+    for pk in detalles.get('-', []):
+        resultado['detalles'].pop(pk, None)
+    for pk, cambios in detalles.get('~', {}).items():
+        resultado['detalles'][pk].update(cambios)
+    for pk, detalle in detalles.get('+', {}).items():
+        resultado['detalles'][pk] = dict(detalle)
+    return resultado
+
+
+def reconstruir(cotizacion, version=None):
+    """
+    Reconstruye el estado de una versión (la última si no se indica).
+
+    Lee el snapshot más cercano anterior y los deltas posteriores hasta la
+    versión pedida: como máximo INTERVALO_SNAPSHOT filas.
+    Lanza RevisionCotizacion.DoesNotExist si la versión no existe.
+    """
+    revisiones = RevisionCotizacion.objects.filter(cotizacion_id=cotizacion.pk)
+    if version is None:
+        version = revisiones.order_by('-version').values_list('version', flat=True).first()
+        if version is None:
+            raise RevisionCotizacion.DoesNotExist('La cotización no tiene revisiones.')
+
+    base = (
+        revisiones.filter(es_snapshot=True, version__lte=version)
+        .order_by('-version').values_list('version', flat=True).first()
+    )
+    if base is None:
+        raise RevisionCotizacion.DoesNotExist(f'No existe la versión {version}.')
+
+    cadena = list(
+        revisiones.filter(version__gte=base, version__lte=version)
+        .order_by('version').values_list('version', 'datos')
+    )
+    if cadena[-1][0] != version:
+        raise RevisionCotizacion.DoesNotExist(f'No existe la versión {version}.')
+
+    estado = cadena[0][1]
+    for _, delta in cadena[1:]:
+        estado = aplicar_delta(estado, delta)
+    return estado
+
+
+def _ultimas_versiones(ids):
+    """
+    {pk: (versión, estado)} de la última revisión de cada cotización que
+    tiene revisiones: lee el último snapshot y los deltas posteriores.
+    """
+    bases = {}
+    for pk, ultima, base in (
+        RevisionCotizacion.objects.filter(cotizacion_id__in=ids).order_by().values('cotizacion_id')
+        .annotate(ultima=Max('version'), base=Max('version', filter=Q(es_snapshot=True)))
+        .values_list('cotizacion_id', 'ultima', 'base')
+    ):
+        bases.setdefault(base, []).append(pk)
+
+    estados = {}
+    # Una consulta por versión de snapshot distinta (pocas: 1, 11, 21...)
+    for base, pks in bases.items():
+        for pk, version, datos in (
+            RevisionCotizacion.objects.filter(cotizacion_id__in=pks, version__gte=base)
+            .order_by('cotizacion_id', 'version').values_list('cotizacion_id', 'version', 'datos')
+        ):
+            _, estado = estados.get(pk, (None, None))
+            estados[pk] = (version, datos if version == base else aplicar_delta(estado, datos))
+    return estados
+
+
+def registrar_revisiones(ids):
+    """
+    Guarda una nueva revisión de cada cotización de `ids` que cambió desde su
+    última revisión, con un solo INSERT. Debe llamarse dentro de la misma
+    transacción que el guardado. Devuelve las RevisionCotizacion creadas.
+    """
+    ids = list(ids)
+    with transaction.atomic():
+        # Serializa los registros de revisiones concurrentes de las mismas cotizaciones
+        list(Cotizacion.objects.select_for_update().filter(pk__in=ids).values_list('pk'))
+
+        nuevos = _estados_actuales(ids)
+        anteriores = _ultimas_versiones(list(nuevos))
+        revisiones = []
+        for pk, nuevo in nuevos.items():
+            version, anterior = anteriores.get(pk, (0, None))
+            delta = calcular_delta(anterior, nuevo) if anterior is not None else None
+            if anterior is not None and not delta:
+                continue
+            version += 1
+            es_snapshot = (version - 1) % INTERVALO_SNAPSHOT == 0
+            revisiones.append(RevisionCotizacion(
+                cotizacion_id=pk, version=version, es_snapshot=es_snapshot, datos=nuevo if es_snapshot else delta,
+            ))
+        return RevisionCotizacion.objects.bulk_create(revisiones, batch_size=500)
+
+
+def registrar_revision(cotizacion):
+    """
+    Guarda una nueva revisión si la cotización cambió desde la última.
+
+    Debe llamarse dentro de la misma transacción que el guardado. Devuelve la
+    RevisionCotizacion creada o None si no hubo cambios.
+    """
+    revisiones = registrar_revisiones([cotizacion.pk])
+    return revisiones[0] if revisiones else None
+
+
+def instanciar(cotizacion, estado):
+    """
+    Construye instancias sin guardar (Cotizacion y sus DetalleCotizacion) a
+    partir de un estado reconstruido, para renderizar plantillas y PDFs.
+    """
+    campos = estado['cotizacion']
+    version = Cotizacion(pk=cotizacion.pk, fecha_creacion=cotizacion.fecha_creacion)
+    # Los valores vienen serializados; to_python los devuelve a Decimal/date
+    for campo in Cotizacion._meta.concrete_fields:
+        if campo.attname in campos and campo.attname != 'cliente_id':
+            setattr(version, campo.attname, campo.to_python(campos[campo.attname]))
+    version.cliente = Cliente.objects.get(pk=campos['cliente_id'])
+
+    servicios = Servicio.objects.in_bulk(
+        {detalle['servicio_id'] for detalle in estado['detalles'].values()}
+    )
+    detalles = []
+    for pk, datos in estado['detalles'].items():
+        detalle = DetalleCotizacion(pk=pk, cotizacion=version)
+        for campo in DetalleCotizacion._meta.concrete_fields:
+            if campo.attname in datos and campo.attname != 'servicio_id':
+                setattr(detalle, campo.attname, campo.to_python(datos[campo.attname]))
+        detalle.servicio = servicios.get(
+            Servicio._meta.pk.to_python(datos['servicio_id']),
+            Servicio(nombre='(servicio eliminado)', tarifa_hora=detalle.tarifa_hora),
+        )
+        detalles.append(detalle)
+    return version, detalles
@@ -0,0 +1,260 @@
+"""
+Simulación de escenarios de precios sobre las cotizaciones abiertas.
+
+Carga las líneas de las cotizaciones en borrador o enviadas en arreglos
+columnares de enteros (centavos y centésimas de porcentaje) y aplica los
+escenarios (nuevas tarifas por servicio, descuento o IVA) con operaciones
+vectorizadas de NumPy. La aritmética entera reproduce exactamente
+totales_en_memoria (redondeo a centavos de cada línea y de cada monto), y
+verificar() lo comprueba contra el motor Decimal sobre una muestra.
+"""
+
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+from django.db import connections
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+
+from .models import Cotizacion, DetalleCotizacion, totales_en_memoria
+
+ESTADOS_SIMULADOS = ('borrador', 'enviada')
+DURACION_CACHE = 60
+CAMPOS_MONTO = ('subtotal', 'descuento_monto', 'iva_monto', 'total')
+
+# Porcentajes en centésimas: 100% = 10000
+CIEN_POR_CIENTO = 10000
+MAXIMO_ENTERO = 2 ** 63 - 1
+
+_cache = {'libro': None, 'cargado': 0.0}
+
+
+def a_centavos(valor):
+    """Decimal con dos decimales como entero: Decimal('12.34') -> 1234"""
+    return int((Decimal(valor) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def desde_centavos(centavos):
+    return Decimal(int(centavos)).scaleb(-2)
+
+
+def en_centavos(campo):
+    return Cast(Round(F(campo) * 100), BigIntegerField())
+
+
+def _filas(queryset):
+    """Ejecuta el queryset sin los conversores del ORM (sin crear un UUID por fila)"""
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+@dataclass
+class LibroCotizaciones:
+    """Líneas de las cotizaciones abiertas en arreglos, ordenadas por cotización"""
+    cotizaciones: list  # (id, numero_cotizacion) por índice
+    descuento: np.ndarray  # por cotización, centésimas de porcentaje
+    iva: np.ndarray
+    servicios: list  # id de servicio por código
+    cotizacion: np.ndarray  # por línea: índice de la cotización
+    servicio: np.ndarray  # por línea: código del servicio
+    horas: np.ndarray  # por línea, centésimas de hora
+    tarifa: np.ndarray  # por línea, centavos
+
+    @property
+    def total_lineas(self):
+        return len(self.horas)
+
+    def lineas_de(self, indice):
+        """Rango de líneas de una cotización"""
+        return (
+            np.searchsorted(self.cotizacion, indice, side='left'),
+            np.searchsorted(self.cotizacion, indice, side='right'),
+        )
+
+
+def cargar_libro(estados=ESTADOS_SIMULADOS):
+    """
+    Lee las cotizaciones abiertas y sus líneas en dos consultas. Las líneas
+    se ordenan por cotización en memoria: es más barato que el ORDER BY.
+    """
+    cotizaciones = _filas(
+        Cotizacion.objects.filter(estado__in=estados).order_by().values_list(
+            'id', 'numero_cotizacion',
+            en_centavos('descuento_porcentaje'), en_centavos('iva_porcentaje'),
+        )
+    )
+    lineas = _filas(
+        DetalleCotizacion.objects.filter(cotizacion__estado__in=estados).order_by().values_list(
+            'cotizacion_id', 'servicio_id', en_centavos('horas_estimadas'), en_centavos('tarifa_hora'),
+        )
+    )
+
+    indice_cotizacion = {fila[0]: i for i, fila in enumerate(cotizaciones)}
+    codigos_servicio = {}
+    if lineas:
+        ids_cotizacion, ids_servicio, horas, tarifas = zip(*lineas)
+    else:
+        ids_cotizacion = ids_servicio = horas = tarifas = ()
+
+    cotizacion = np.fromiter(
+        (indice_cotizacion.get(id_cotizacion, -1) for id_cotizacion in ids_cotizacion),
+        dtype=np.int64, count=len(ids_cotizacion),
+    )
+    servicio = np.fromiter(
+        (codigos_servicio.setdefault(id_servicio, len(codigos_servicio)) for id_servicio in ids_servicio),
+        dtype=np.int32, count=len(ids_servicio),
+    )
+    horas = np.array(horas, dtype=np.int64)
+    tarifa = np.array(tarifas, dtype=np.int64)
+
+    # Líneas de cotizaciones que cambiaron de estado entre las dos consultas
+    vigentes = cotizacion >= 0
+    if not vigentes.all():
+        cotizacion, servicio, horas, tarifa = (
+            arreglo[vigentes] for arreglo in (cotizacion, servicio, horas, tarifa)
+        )
+    if (np.diff(cotizacion) < 0).any():
+        orden = np.argsort(cotizacion, kind='stable')
+        cotizacion, servicio, horas, tarifa = (
+            arreglo[orden] for arreglo in (cotizacion, servicio, horas, tarifa)
+        )
+
+    return LibroCotizaciones(
+        cotizaciones=[(uuid.UUID(str(fila[0])), fila[1]) for fila in cotizaciones],
+        descuento=np.array([fila[2] for fila in cotizaciones], dtype=np.int64),
+        iva=np.array([fila[3] for fila in cotizaciones], dtype=np.int64),
+        servicios=[uuid.UUID(str(id_servicio)) for id_servicio in codigos_servicio],
+        cotizacion=cotizacion,
+        servicio=servicio,
+        horas=horas,
+        tarifa=tarifa,
+    )
+
+
+def obtener_libro(refrescar=False):
+    """Libro cacheado en el proceso durante DURACION_CACHE segundos"""
+    if refrescar or _cache['libro'] is None or time.monotonic() - _cache['cargado'] > DURACION_CACHE:
+        _cache['libro'] = cargar_libro()
+        _cache['cargado'] = time.monotonic()
+    return _cache['libro']
+
+
+@dataclass
+class Escenario:
+    """Cambios a simular; None deja el valor actual de cada cotización"""
+    tarifas: dict = field(default_factory=dict)  # {servicio_id: nueva tarifa_hora}
+    descuento_porcentaje: Decimal = None
+    iva_porcentaje: Decimal = None
+
+    def tarifas_por_linea(self, libro):
+        if not self.tarifas:
+            return libro.tarifa
+        codigos = {id_servicio: codigo for codigo, id_servicio in enumerate(libro.servicios)}
+        nuevas = np.full(len(libro.servicios), -1, dtype=np.int64)
+        for id_servicio, tarifa in self.tarifas.items():
+            codigo = codigos.get(uuid.UUID(str(id_servicio)))
+            if codigo is not None:
+                nuevas[codigo] = a_centavos(tarifa)
+        por_linea = nuevas[libro.servicio]
+        return np.where(por_linea >= 0, por_linea, libro.tarifa)
+
+    def porcentajes(self, libro):
+        descuento = libro.descuento if self.descuento_porcentaje is None else np.full_like(
+            libro.descuento, a_centavos(self.descuento_porcentaje))
+        iva = libro.iva if self.iva_porcentaje is None else np.full_like(
+            libro.iva, a_centavos(self.iva_porcentaje))
+        return descuento, iva
+
+
+def calcular(libro, tarifa, descuento, iva):
+    """
+    Montos en centavos por cotización con aritmética entera.
+
+    Equivale a totales_en_memoria: cada línea se redondea a centavos y los
+    montos se redondean (mitad hacia arriba) sobre el valor exacto.
+    """
+    lineas = (libro.horas * tarifa + 50) // 100
+    subtotal = np.zeros(len(libro.cotizaciones), dtype=np.int64)
+    if len(lineas):
+        inicios = np.flatnonzero(np.r_[True, np.diff(libro.cotizacion) != 0])
+        subtotal[libro.cotizacion[inicios]] = np.add.reduceat(lineas, inicios)
+
+    # base * (100 + iva) en diezmilésimas de diezmilésima de centavo; con
+    # montos enormes se pasa a enteros de Python para no desbordar int64
+    if len(subtotal) and int(subtotal.max()) * CIEN_POR_CIENTO * (CIEN_POR_CIENTO + int(iva.max())) > MAXIMO_ENTERO:
+        subtotal, descuento, iva = (arreglo.astype(object) for arreglo in (subtotal, descuento, iva))
+    base = subtotal * (CIEN_POR_CIENTO - descuento)
+    escala = CIEN_POR_CIENTO * CIEN_POR_CIENTO
+    return {
+        'subtotal': subtotal,
+        'descuento_monto': (subtotal * descuento + CIEN_POR_CIENTO // 2) // CIEN_POR_CIENTO,
+        'iva_monto': (base * iva + escala // 2) // escala,
+        'total': (base * (CIEN_POR_CIENTO + iva) + escala // 2) // escala,
+    }
+
+
+class Simulacion:
+    """Montos actuales y simulados de todas las cotizaciones del libro"""
+
+    def __init__(self, libro, escenario):
+        self.libro = libro
+        self.escenario = escenario
+        inicio = time.perf_counter()
+        self.tarifa = escenario.tarifas_por_linea(libro)
+        self.descuento, self.iva = escenario.porcentajes(libro)
+        self.actual = calcular(libro, libro.tarifa, libro.descuento, libro.iva)
+        self.simulado = calcular(libro, self.tarifa, self.descuento, self.iva)
+        self.delta = {campo: self.simulado[campo] - self.actual[campo] for campo in CAMPOS_MONTO}
+        self.duracion = time.perf_counter() - inicio
+
+    def agregado(self):
+        return {
+            nombre: {campo: str(desde_centavos(montos[campo].sum())) for campo in CAMPOS_MONTO}
+            for nombre, montos in (('actual', self.actual), ('simulado', self.simulado), ('delta', self.delta))
+        }
+
+    def mayores_cambios(self, cantidad=20):
+        """Cotizaciones con mayor variación absoluta del total"""
+        variacion = np.abs(self.delta['total'].astype(np.int64))
+        cantidad = min(cantidad, len(variacion))
+        if not cantidad:
+            return []
+        indices = np.argpartition(-variacion, cantidad - 1)[:cantidad]
+        indices = indices[np.argsort(-variacion[indices], kind='stable')]
+        return [
+            {
+                'id': str(self.libro.cotizaciones[indice][0]),
+                'numero_cotizacion': self.libro.cotizaciones[indice][1],
+                'total_actual': str(desde_centavos(self.actual['total'][indice])),
+                'total_simulado': str(desde_centavos(self.simulado['total'][indice])),
+                'delta': str(desde_centavos(self.delta['total'][indice])),
+            }
+            for indice in indices
+        ]
+
+    def verificar(self, muestra=100, semilla=None):
+        """
+        Recalcula una muestra de cotizaciones con el motor Decimal y devuelve
+        los números de las que no coinciden con el resultado vectorizado.
+        """
+        cantidad = len(self.libro.cotizaciones)
+        indices = random.Random(semilla).sample(range(cantidad), min(muestra, cantidad))
+        diferencias = []
+        for indice in indices:
+            desde, hasta = self.libro.lineas_de(indice)
+            lineas = [
+                (desde_centavos(horas), desde_centavos(tarifa))
+                for horas, tarifa in zip(self.libro.horas[desde:hasta], self.tarifa[desde:hasta])
+            ]
+            esperado = totales_en_memoria(
+                lineas, desde_centavos(self.descuento[indice]), desde_centavos(self.iva[indice]),
+            )
+            if any(a_centavos(esperado[campo]) != self.simulado[campo][indice] for campo in CAMPOS_MONTO):
+                diferencias.append(self.libro.cotizaciones[indice][1])
+        return {'muestra': len(indices), 'diferencias': diferencias}
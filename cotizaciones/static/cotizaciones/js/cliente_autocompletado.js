@@ -0,0 +1,71 @@
+// Autocompletado de clientes para ClienteAutocompleteWidget.
+// Agrega un campo de búsqueda sobre cada select con data-autocompletado-url
+// y carga las opciones bajo demanda (con debounce) desde el endpoint JSON.
+(function() {
+    const ESPERA_MS = 250;
+
+    function iniciar(select) {
+        const url = select.dataset.autocompletadoUrl;
+        const buscador = document.createElement('input');
+        buscador.type = 'search';
+        buscador.className = 'form-control mb-2';
+        buscador.placeholder = 'Buscar cliente por nombre, empresa o email...';
+        buscador.autocomplete = 'off';
+        select.parentNode.insertBefore(buscador, select);
+
+        const aviso = document.createElement('div');
+        aviso.className = 'form-text';
+        select.parentNode.insertBefore(aviso, select.nextSibling);
+
+        let temporizador = null;
+        let ultimaConsulta = null;
+
+        function mostrar(resultados, hayMas) {
+            const seleccionado = select.value;
+            const actual = select.querySelector('option:checked');
+            select.innerHTML = '';
+            select.appendChild(new Option('---------', ''));
+            if (seleccionado && actual && !resultados.some(r => r.id === seleccionado)) {
+                select.appendChild(new Option(actual.text, seleccionado, true, true));
+            }
+            resultados.forEach(function(resultado) {
+                const opcion = new Option(resultado.text, resultado.id, false, resultado.id === seleccionado);
+                select.appendChild(opcion);
+            });
+            aviso.textContent = hayMas ? 'Hay más coincidencias: escriba más letras para acotar.' : '';
+        }
+
+        function buscar() {
+            const consulta = buscador.value.trim();
+            if (consulta === ultimaConsulta) {
+                return;
+            }
+            ultimaConsulta = consulta;
+            fetch(url + '?q=' + encodeURIComponent(consulta), {headers: {'Accept': 'application/json'}})
+                .then(respuesta => respuesta.json())
+                .then(function(datos) {
+                    // Ignorar respuestas de consultas que ya no son la actual
+                    if (consulta === ultimaConsulta) {
+                        mostrar(datos.results, datos.pagination.more);
+                    }
+                })
+                .catch(function() {
+                    console.error('Error al buscar clientes');
+                });
+        }
+
+        buscador.addEventListener('input', function() {
+            clearTimeout(temporizador);
+            temporizador = setTimeout(buscar, ESPERA_MS);
+        });
+        buscador.addEventListener('focus', function() {
+            if (ultimaConsulta === null) {
+                buscar();
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+        document.querySelectorAll('select[data-autocompletado-url]').forEach(iniciar);
+    });
+})();
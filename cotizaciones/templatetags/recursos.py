@@ -0,0 +1,19 @@
+from django import template
+from django.utils.html import format_html
+
+from cotizaciones.config import RECURSOS_ESTATICOS
+from cotizaciones.estaticos import url_recurso
+
+register = template.Library()
+
+
+@register.simple_tag
+def recurso(nombre):
+    """
+    <link> o <script> de un recurso de RECURSOS_ESTATICOS, servido localmente
+    si está descargado. Uso: {% recurso 'bootstrap_css' %}
+    """
+    url = url_recurso(nombre)
+    if RECURSOS_ESTATICOS[nombre]['tipo'] == 'css':
+        return format_html('<link href="{}" rel="stylesheet">', url)
+    return format_html('<script src="{}"></script>', url)
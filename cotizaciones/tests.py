@@ -1,3 +1,1476 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import Http404
+from django.utils import timezone
+
+from quotes.database import configurar_replicas
+
+from . import admision, estaticos, recursos_pdf
+from .archivo import CAMPOS_COTIZACION, archivar, conteos_por_estado, obtener_cotizacion
+from .busqueda import CLAVE_GENERACION, buscar_clientes
+from . import correo, pdf
+from .concurrencia import ConflictoVersion, reintentar_si_bloqueada
+from .config import (
+    ESTATICOS_CONFIG, EVENTOS_CONFIG, FLUJO_CAJA_CONFIG, PERFIL_PDF_DEFECTO, RECURSOS_ESTATICOS, REPLICAS_CONFIG,
+)
+from .eventos import agrupar, despachar, reencolar
+from .models import (
+    Cliente, Cotizacion, CotizacionArchivada, DetalleArchivado, DetalleCotizacion, EnvioCotizacion, EstadisticasCliente,
+    EventoCotizacion, PdfCotizacion, ResumenArchivo, RevisionCotizacion, Servicio, montos_redondeados,
+)
+from .replicas import en_replica
+from .integridad import limites, reparar_totales, totales_recalculados, verificar_bloque
+from .revisiones import INTERVALO_SNAPSHOT, estado_actual, reconstruir, registrar_revision
+from .transiciones import cambiar_estado, ejecutar, estados_cambiados
+
+ES_SQLITE = connection.vendor == 'sqlite'
+
+# Las vistas renderizan sin ejecutar collectstatic (sin manifiesto de estáticos)
+sin_manifiesto = override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+
+
+
+def renderizar_falso(html_string, perfil=PERFIL_PDF_DEFECTO, bloquear=False):
+    """Sustituye a pdf.renderizar: los tests no dependen de WeasyPrint ni de Pango"""
+    return b'%PDF-1.7\n' + hashlib.sha256(f'{perfil}\n{html_string}'.encode()).hexdigest().encode()
+
+
+sin_weasyprint = patch('cotizaciones.pdf.renderizar', new=renderizar_falso)
+
+
+class PdfTemporalMixin:
+    """PDF_ROOT en un directorio temporal por test"""
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajuste = override_settings(PDF_ROOT=Path(directorio.name))
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+
+def crear_cotizacion(numero='COT-0001', lineas=1, cliente=None, **campos):
+    """Cotización con `lineas` detalles de 2 h a 50 (subtotal 100 por línea)"""
+    cliente = cliente or Cliente.objects.create(nombre='Cliente de prueba', email='cliente@example.com')
+    servicio = Servicio.objects.create(nombre='Desarrollo', descripcion='Horas', tarifa_hora=Decimal('50.00'))
+    cotizacion = Cotizacion.objects.create(
+        numero_cotizacion=numero, cliente=cliente,
+        fecha_vencimiento=campos.pop('fecha_vencimiento', date.today() + timedelta(days=30)), **campos,
+    )
+    for linea in range(lineas):
+        DetalleCotizacion.objects.create(
+            cotizacion=cotizacion, servicio=servicio, descripcion=f'Línea {linea}',
+            horas_estimadas=Decimal('2.00'), tarifa_hora=Decimal('50.00'),
+        )
+    cotizacion.refresh_from_db()
+    return cotizacion
+
+
+def bloquear_escritura(segundos):
+    """Toma el bloqueo de escritura de SQLite desde otra conexión durante `segundos`"""
+    externa = sqlite3.connect(connection.settings_dict['NAME'], check_same_thread=False)
+    externa.execute('BEGIN IMMEDIATE')
+    liberar = threading.Timer(segundos, lambda: (externa.rollback(), externa.close()))
+    liberar.start()
+    return liberar
+
+
+@skipUnless(ES_SQLITE, 'Concurrencia de SQLite')
+class ConcurrenciaSQLiteTests(TransactionTestCase):
+    def setUp(self):
+        # Espera corta para provocar "database is locked" sin demorar los tests
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout=50')
+
+    def tearDown(self):
+        connection.close()
+
+    def test_modo_immediate_bloquea_al_abrir_la_transaccion(self):
+        self.assertEqual(connection.settings_dict['OPTIONS'].get('transaction_mode'), 'IMMEDIATE')
+        liberar = bloquear_escritura(0.5)
+        try:
+            with self.assertRaisesMessage(OperationalError, 'database is locked'):
+                with transaction.atomic():
+                    # Con BEGIN IMMEDIATE no se llega a leer dentro de la transacción
+                    self.fail('La transacción se abrió con otra escritura en curso')
+        finally:
+            liberar.join()
+
+    def test_reintentar_si_bloqueada_espera_al_otro_escritor(self):
+        intentos = []
+
+        @reintentar_si_bloqueada(intentos=10, espera_base=0.05, espera_maxima=0.2)
+        def guardar():
+            intentos.append(1)
+            with transaction.atomic():
+                return Cliente.objects.create(nombre='Bloqueo', email='bloqueo@example.com')
+
+        liberar = bloquear_escritura(0.3)
+        with self.assertLogs('cotizaciones.concurrencia', 'WARNING'):
+            cliente = guardar()
+        liberar.join()
+        self.assertGreater(len(intentos), 1)
+        self.assertTrue(Cliente.objects.filter(pk=cliente.pk).exists())
+
+    def test_reintentar_si_bloqueada_no_reintenta_dentro_de_atomic(self):
+        intentos = []
+
+        @reintentar_si_bloqueada()
+        def fallar():
+            intentos.append(1)
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError), transaction.atomic():
+            fallar()
+        self.assertEqual(len(intentos), 1)
+
+    def test_procesos_concurrentes_sin_bloqueos(self):
+        # Cada proceso abre su propia conexión al archivo de la base de tests
+        call_command(
+            'estresar_sqlite', procesos=3, guardados=10, lineas=3, conservar=True, stdout=StringIO(),
+        )
+        cotizaciones = Cotizacion.objects.filter(cliente__nombre='Estrés SQLite')
+        self.assertEqual(cotizaciones.count(), 30)
+        self.assertEqual(set(cotizaciones.values_list('subtotal', flat=True)), {Decimal('180.00')})
+
+
+class VencerCotizacionesTests(TestCase):
+    def test_registra_la_revision_del_cambio_de_estado(self):
+        cotizacion = crear_cotizacion(estado='enviada', fecha_vencimiento=date.today() - timedelta(days=1))
+        registrar_revision(cotizacion)
+
+        call_command('vencer_cotizaciones', stdout=StringIO())
+
+        cotizacion.refresh_from_db()
+        self.assertEqual(cotizacion.estado, 'vencida')
+        self.assertEqual(RevisionCotizacion.objects.filter(cotizacion=cotizacion).count(), 2)
+        self.assertEqual(reconstruir(cotizacion)['cotizacion']['estado'], 'vencida')
+
+    def test_usa_las_transiciones_y_emite_la_senal(self):
+        vencida = crear_cotizacion(estado='enviada', fecha_vencimiento=date.today() - timedelta(days=1))
+        crear_cotizacion('COT-0002', estado='borrador', fecha_vencimiento=date.today() - timedelta(days=1))
+        recibidas = []
+        receptor = lambda sender, **datos: recibidas.append(datos)
+        estados_cambiados.connect(receptor)
+        self.addCleanup(estados_cambiados.disconnect, receptor)
+
+        salida = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('vencer_cotizaciones', stdout=salida)
+
+        self.assertIn('1 cotizaciones marcadas como vencidas', salida.getvalue())
+        self.assertEqual(
+            recibidas, [{'signal': estados_cambiados, 'estado': 'vencida', 'anteriores': {vencida.pk: 'enviada'}}],
+        )
+        self.assertEqual(EstadisticasCliente.objects.get(pk=vencida.cliente_id).cantidad_vencida, 1)
+        self.assertTrue(EventoCotizacion.objects.filter(cotizacion=vencida.pk, tipo='estado').exists())
+
+
+@sin_manifiesto
+class AdminListadosTests(TestCase):
+    """El número de consultas de cada listado no crece con las filas (sin N+1)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import User
+
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        for numero in range(15):
+            cliente = Cliente.objects.create(nombre=f'Cliente {numero}', email=f'c{numero}@example.com')
+            crear_cotizacion(f'COT-{numero:04d}', lineas=2, cliente=cliente)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _consultas(self, url, busqueda, pocas):
+        # Sesión, usuario, conteo y filas: igual con pocas filas que con todas
+        for parametros, filas in (({'q': busqueda}, pocas), ({}, None)):
+            with self.assertNumQueries(4):
+                respuesta = self.client.get(url, parametros)
+            self.assertEqual(respuesta.status_code, 200)
+            if filas is not None:
+                self.assertEqual(respuesta.context['cl'].result_count, filas)
+
+    def test_listado_cotizaciones(self):
+        self._consultas('/admin/cotizaciones/cotizacion/', 'COT-0001', 1)
+        # El estado cambia solo con las acciones masivas (validan TRANSICIONES)
+        self.assertIsNone(self.client.get('/admin/cotizaciones/cotizacion/').context['cl'].formset)
+
+    def test_listado_detalles(self):
+        self._consultas('/admin/cotizaciones/detallecotizacion/', 'COT-0001', 2)
+
+    def test_listado_clientes(self):
+        self._consultas('/admin/cotizaciones/cliente/', 'Cliente 1', 6)
+
+
+@sin_manifiesto
+class AdminConflictoVersionTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        self.cotizacion = crear_cotizacion(lineas=2)
+        self.url = f'/admin/cotizaciones/cotizacion/{self.cotizacion.pk}/change/'
+
+    def datos(self):
+        contexto = self.client.get(self.url).context
+        formsets = [inline.formset for inline in contexto['inline_admin_formsets']]
+        return datos_formulario(contexto['adminform'].form, *(
+            formulario for formset in formsets for formulario in (formset.management_form, *formset.forms)
+        ))
+
+    def test_guardar_sobre_un_cambio_ajeno_no_lo_pisa(self):
+        datos = self.datos()
+        Cotizacion.objects.filter(pk=self.cotizacion.pk).update(notas='Otra persona', version=F('version') + 1)
+
+        respuesta = self.client.post(self.url, {**datos, 'notas': 'Mi cambio'}, follow=True)
+        self.assertRedirects(respuesta, self.url)
+        self.assertContains(respuesta, 'Otra persona modificó estos datos')
+        self.assertEqual(Cotizacion.objects.get(pk=self.cotizacion.pk).notas, 'Otra persona')
+
+        # Con la versión actual se guarda
+        respuesta = self.client.post(self.url, {**self.datos(), 'notas': 'Mi cambio'})
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(Cotizacion.objects.get(pk=self.cotizacion.pk).notas, 'Mi cambio')
+
+    def test_lineas_del_inline_con_version_vieja(self):
+        datos = self.datos()
+        prefijo = 'detallecotizacion_set'
+        DetalleCotizacion.objects.filter(pk=datos[f'{prefijo}-0-id']).update(
+            horas_estimadas=Decimal('9.00'), version=F('version') + 1,
+        )
+
+        respuesta = self.client.post(self.url, {**datos, f'{prefijo}-0-horas_estimadas': '3.00'}, follow=True)
+        self.assertContains(respuesta, 'Otra persona modificó estos datos')
+        self.assertEqual(DetalleCotizacion.objects.get(pk=datos[f'{prefijo}-0-id']).horas_estimadas, Decimal('9.00'))
+
+
+class BusquedaClientesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cache_compartida_entre_procesos(self):
+        self.assertNotIn('locmem', settings.CACHES['default']['BACKEND'])
+
+    def test_guardar_cliente_invalida_los_prefijos(self):
+        self.assertEqual(buscar_clientes('ana'), ([], False))
+        cliente = Cliente.objects.create(nombre='Ana Núñez', email='ana@example.com')
+        self.assertEqual(buscar_clientes('ana')[0], [{'id': str(cliente.pk), 'text': 'Ana Núñez'}])
+
+    def test_generacion_descartada_no_reutiliza_resultados(self):
+        self.assertEqual(buscar_clientes('ana'), ([], False))
+        # bulk_create no invalida; la caché pierde la generación (p. ej. al depurar entradas)
+        Cliente.objects.bulk_create([
+            Cliente(nombre='Ana Núñez', email='ana@example.com', nombre_busqueda='ana nunez'),
+        ])
+        cache.delete(CLAVE_GENERACION)
+        self.assertEqual(len(buscar_clientes('ana')[0]), 1)
+
+
+class PrevisualizarTotalesTests(TestCase):
+    url = '/api/cotizaciones/previsualizar-totales/'
+
+    def _post(self, datos):
+        return self.client.post(self.url, json.dumps(datos), content_type='application/json')
+
+    def test_calcula_como_al_guardar(self):
+        respuesta = self._post({
+            'lineas': [{'horas_estimadas': '2', 'tarifa_hora': '50'}, {'horas_estimadas': '', 'tarifa_hora': ''}],
+            'descuento_porcentaje': '10', 'iva_porcentaje': '16',
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['lineas'], ['100.00', '0.00'])
+        self.assertEqual(respuesta.json()['total'], '104.40')
+
+    def test_valores_fuera_de_rango_responden_400(self):
+        for datos in (
+            {'lineas': [{'horas_estimadas': '1e30', 'tarifa_hora': '1e30'}]},
+            {'lineas': [{'horas_estimadas': '1000000', 'tarifa_hora': '1'}]},
+            {'lineas': [], 'iva_porcentaje': '1e30'},
+            {'lineas': [{'horas_estimadas': '-1', 'tarifa_hora': '1'}]},
+        ):
+            with self.subTest(datos=datos):
+                respuesta = self._post(datos)
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertFalse(respuesta.json()['success'])
+
+
+class SimularPreciosTests(TestCase):
+    url = '/api/cotizaciones/simular-precios/'
+
+    def setUp(self):
+        cliente = crear_cotizacion('COT-0001', lineas=2).cliente
+        crear_cotizacion('COT-0002', lineas=1, cliente=cliente)
+
+    def _post(self, datos):
+        return self.client.post(self.url, json.dumps({'refrescar': True, **datos}), content_type='application/json')
+
+    def test_escenario_de_porcentajes(self):
+        respuesta = self._post({'descuento_porcentaje': '10', 'iva_porcentaje': '16'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['cotizaciones'], 2)
+        self.assertEqual(self._post({'iva_porcentaje': '1e30'}).status_code, 400)
+
+    def test_cantidad_acotada_y_entera(self):
+        for cantidad, esperada in ((-5, 1), (0, 1), ('1', 1), (500, 2)):
+            with self.subTest(cantidad=cantidad):
+                respuesta = self._post({'iva_porcentaje': '20', 'cantidad': cantidad})
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(len(respuesta.json()['mayores_cambios']), esperada)
+        for cantidad in ('abc', 2.5, True, None, [3]):
+            with self.subTest(cantidad=cantidad):
+                self.assertEqual(self._post({'cantidad': cantidad}).status_code, 400)
+
+
+class FlujoCajaTests(TestCase):
+    def setUp(self):
+        from . import flujo_caja
+
+        cache.clear()
+        self.flujo_caja = flujo_caja
+        flujo_caja._estado['cartera'] = None
+        self.cotizacion = crear_cotizacion(estado='aprobada', modalidad_pago='mensual')
+
+    def test_proyecciones_acotadas_lru(self):
+        desde = date(2026, 1, 1)
+        with patch.dict(FLUJO_CAJA_CONFIG, proyecciones=3):
+            for meses in range(1, 6):
+                self.flujo_caja.flujo_caja(desde, meses)
+            self.flujo_caja.flujo_caja(desde, 3)
+            self.flujo_caja.flujo_caja(desde, 6)
+        indice = self.flujo_caja.indice_mes(desde)
+        self.assertEqual(list(self.flujo_caja._estado['proyecciones']), [(indice, 5), (indice, 3), (indice, 6)])
+
+    def test_cuotas_acotadas_por_modalidad(self):
+        mes = timezone.localdate().replace(day=1)
+        anual = crear_cotizacion('COT-0002', cliente=self.cotizacion.cliente, estado='aprobada', modalidad_pago='anual')
+        total = self.cotizacion.total
+
+        # Sin límite: todos los meses y cada doce meses
+        proyeccion = self.flujo_caja.flujo_caja(mes, 36)
+        self.assertEqual([fila['mensual'] for fila in proyeccion], [total] * 36)
+        self.assertEqual([fila['anual'] for fila in proyeccion if fila['anual']], [anual.total] * 3)
+
+        self.flujo_caja._estado['cartera'] = None
+        with patch.dict(FLUJO_CAJA_CONFIG, cuotas={'mensual': 3, 'anual': 2}):
+            proyeccion = self.flujo_caja.flujo_caja(mes, 36)
+            # Una ventana que empieza después de la primera cuota anual
+            siguiente = self.flujo_caja.flujo_caja(date(mes.year + 1, mes.month, 1) - timedelta(days=1), 36)
+        self.assertEqual([fila['mensual'] for fila in proyeccion], [total] * 3 + [Decimal('0')] * 33)
+        self.assertEqual([fila['cuotas'] for fila in proyeccion if fila['anual']], [2, 1])
+        self.assertEqual([indice for indice, fila in enumerate(proyeccion) if fila['anual']], [0, 12])
+        self.assertEqual([indice for indice, fila in enumerate(siguiente) if fila['anual']], [1])
+
+    def test_borrar_invalida_por_la_cache_compartida(self):
+        mes = timezone.localdate().replace(day=1)
+        self.assertEqual(self.flujo_caja.flujo_caja(mes, 1)[0]['total'], self.cotizacion.total)
+        generacion = cache.get(self.flujo_caja.CLAVE_GENERACION)
+        # Otro proceso borra: este solo se entera por la generación en la caché
+        Cotizacion.objects.filter(pk=self.cotizacion.pk).delete()
+        self.flujo_caja.invalidar_flujo_caja()
+        self.assertNotEqual(cache.get(self.flujo_caja.CLAVE_GENERACION), generacion)
+        self.assertEqual(self.flujo_caja.flujo_caja(mes, 1)[0]['total'], Decimal('0'))
+
+
+@skipUnless(admision.fcntl, 'Control de admisión con flock')
+class MetricasAdmisionTests(SimpleTestCase):
+    def test_borra_las_metricas_de_procesos_terminados(self):
+        terminado = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True)
+        pid_terminado = int(terminado.stdout)
+        contadores = {**admision._contadores, 'admitidos': 3}
+        with tempfile.TemporaryDirectory() as directorio, override_settings(PDF_ADMISION_ROOT=directorio):
+            carpeta = Path(directorio) / 'metricas'
+            carpeta.mkdir()
+            for pid in (os.getpid(), pid_terminado):
+                (carpeta / f'{pid}.json').write_text(json.dumps(contadores))
+
+            resultado = admision.metricas()
+
+            self.assertEqual(resultado['procesos'], 1)
+            self.assertEqual(resultado['admitidos'], 3)
+            self.assertEqual([ruta.name for ruta in carpeta.iterdir()], [f'{os.getpid()}.json'])
+
+
+class ArranqueSinPdfTests(SimpleTestCase):
+    def test_no_importa_paquetes_pesados(self):
+        from .management.commands.perfil_importacion import ARRANQUE, PESADOS
+
+        codigo = ARRANQUE + '; import sys, json; print(json.dumps(sorted(sys.modules)))'
+        proceso = subprocess.run(
+            [sys.executable, '-c', codigo], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'quotes.settings')},
+        )
+        self.assertEqual(proceso.returncode, 0, proceso.stderr[-2000:])
+        cargados = {modulo.split('.')[0] for modulo in json.loads(proceso.stdout.splitlines()[-1])}
+        for paquete in PESADOS:  # weasyprint, numpy, cairocffi, pydyf, fontTools
+            self.assertNotIn(paquete, cargados)
+
+
+@skipUnless(
+    ES_SQLITE and settings.DATABASES.get('replica_1', {}).get('ENGINE', 'django.db.backends.sqlite3')
+    == 'django.db.backends.sqlite3',
+    'Réplica SQLite en un archivo aparte de la primaria',
+)
+@sin_manifiesto
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicasTests(TransactionTestCase):
+    # '__all__' se resuelve al iniciar la clase, ya con la réplica agregada
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # Sin DATABASE_REPLICA_URLS se agrega una réplica en un directorio temporal
+        if 'replica_1' not in settings.DATABASES:
+            directorio = tempfile.TemporaryDirectory()
+            settings.DATABASES.update(configurar_replicas('sqlite:///replica.sqlite3', Path(directorio.name)))
+            connections.configure_settings(settings.DATABASES)
+            cls.addClassCleanup(cls._quitar_replica, directorio)
+        super().setUpClass()
+
+    @classmethod
+    def _quitar_replica(cls, directorio):
+        connections['replica_1'].close()
+        del connections['replica_1']
+        del settings.DATABASES['replica_1']
+        directorio.cleanup()
+
+    def setUp(self):
+        self.replicada = crear_cotizacion('COT-REPLICADA')
+        self.sincronizar()
+        # Aún no replicada: solo está en la primaria
+        self.nueva = crear_cotizacion('COT-NUEVA', cliente=self.replicada.cliente)
+
+    def tearDown(self):
+        # El flush de TransactionTestCase no puede escribir en la réplica
+        # (query_only): se vacía borrando el archivo
+        replica = connections['replica_1']
+        replica.close()
+        for sufijo in ('', '-wal', '-shm'):
+            Path(f'{replica.settings_dict["NAME"]}{sufijo}').unlink(missing_ok=True)
+
+    def sincronizar(self):
+        connections['replica_1'].close()
+        call_command('sincronizar_replicas', stdout=StringIO())
+
+    def test_listado_y_dashboard_leen_de_la_replica(self):
+        respuesta = self.client.get('/cotizaciones/')
+        self.assertContains(respuesta, 'COT-REPLICADA')
+        self.assertNotContains(respuesta, 'COT-NUEVA')
+        self.assertEqual(self.client.get('/dashboard/').context['total_cotizaciones'], 1)
+
+        self.sincronizar()
+        self.assertContains(self.client.get('/cotizaciones/'), 'COT-NUEVA')
+        self.assertEqual(self.client.get('/dashboard/').context['total_cotizaciones'], 2)
+
+    def test_escribir_deja_la_cookie_y_lee_de_la_primaria(self):
+        respuesta = self.client.post('/clientes/nuevo/', {'nombre': 'Nuevo', 'email': 'nuevo@example.com'})
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertIn(REPLICAS_CONFIG['cookie'], respuesta.cookies)
+
+        # El cliente de pruebas reenvía la cookie: las lecturas van a la primaria
+        self.assertContains(self.client.get('/cotizaciones/'), 'COT-NUEVA')
+        self.assertEqual(self.client.get('/dashboard/').context['total_cotizaciones'], 2)
+        self.assertContains(self.client.get('/clientes/'), 'nuevo@example.com')
+
+    def test_lecturas_tras_escribir_en_la_misma_peticion(self):
+        with en_replica():
+            self.assertFalse(Cotizacion.objects.filter(pk=self.nueva.pk).exists())
+            Cliente.objects.create(nombre='Otro', email='otro@example.com')
+            self.assertTrue(Cotizacion.objects.filter(pk=self.nueva.pk).exists())
+
+    def test_escritura_en_la_replica_falla(self):
+        with self.assertRaisesMessage(OperationalError, 'readonly'):
+            Cliente.objects.using('replica_1').create(nombre='Perdido', email='perdido@example.com')
+
+
+def datos_formulario(*formularios):
+    """POST con los valores que muestran los formularios (lo que enviaría el navegador)"""
+    datos = {}
+    for formulario in formularios:
+        for campo in formulario:
+            valor = campo.value()
+            datos[campo.html_name] = '' if valor is None else valor
+    return datos
+
+
+def datos_formset(formset):
+    return datos_formulario(formset.management_form, *formset.forms)
+
+
+@skipUnless(ES_SQLITE, 'Procesos sobre la base de tests en archivo')
+class EdicionesConcurrentesTests(TransactionTestCase):
+    def test_procesos_concurrentes_sin_actualizaciones_perdidas(self):
+        # El comando falla si se pierde alguna edición de líneas o del descuento
+        salida = StringIO()
+        call_command(
+            'estresar_versiones', procesos=3, iteraciones=15, lineas=2, pausa=0.01, conservar=True, stdout=salida,
+        )
+        self.assertIn('Sin actualizaciones perdidas', salida.getvalue())
+        cotizacion = Cotizacion.objects.get(cliente__nombre='Estrés versiones')
+        self.assertEqual(
+            cotizacion.subtotal,
+            sum(DetalleCotizacion.objects.filter(cotizacion=cotizacion).values_list('subtotal', flat=True)),
+        )
+
+
+@sin_manifiesto
+class ConflictoVersionTests(TestCase):
+    def setUp(self):
+        self.cotizacion = crear_cotizacion(lineas=2)
+        self.url = f'/cotizaciones/{self.cotizacion.pk}/'
+
+    def test_edicion_de_cabecera_responde_409_y_se_vuelve_a_guardar(self):
+        datos = datos_formulario(self.client.get(self.url + 'editar/').context['form'])
+        # Otra persona guarda mientras el formulario está abierto
+        otra = Cotizacion.objects.get(pk=self.cotizacion.pk)
+        otra.notas = 'Cambio de otra persona'
+        otra.save(update_fields=['notas'])
+
+        respuesta = self.client.post(self.url + 'editar/', {**datos, 'descuento_porcentaje': '10.00'})
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual([fila['campo'] for fila in respuesta.context['conflicto']], ['Descuento (%)', 'Notas adicionales'])
+        fusion = datos_formulario(respuesta.context['form'])
+        self.assertEqual(int(fusion['version']), Cotizacion.objects.get(pk=self.cotizacion.pk).version)
+
+        # Reenvío tras revisar: se conserva el descuento y se acepta la nota actual
+        respuesta = self.client.post(self.url + 'editar/', {**fusion, 'notas': 'Cambio de otra persona'})
+        self.assertRedirects(respuesta, self.url, fetch_redirect_response=False)
+        self.cotizacion.refresh_from_db()
+        self.assertEqual(self.cotizacion.descuento_porcentaje, Decimal('10.00'))
+        self.assertEqual(self.cotizacion.notas, 'Cambio de otra persona')
+        self.assertEqual(self.cotizacion.descuento_monto, Decimal('20.00'))
+
+    def test_edicion_de_lineas_responde_409_y_se_vuelve_a_guardar(self):
+        formset = self.client.get(self.url + 'detalles/').context['formset']
+        datos = datos_formset(formset)
+        prefijo = formset.prefix
+        otra = DetalleCotizacion.objects.get(pk=datos[f'{prefijo}-0-id'])
+        otra.horas_estimadas = Decimal('5.00')
+        otra.save(update_fields=['horas_estimadas'])
+
+        respuesta = self.client.post(self.url + 'detalles/', {**datos, f'{prefijo}-0-tarifa_hora': '60.00'})
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(len(respuesta.context['conflicto']), 1)
+        self.assertEqual(respuesta.context['conflicto'][0]['actual'].pk, otra.pk)
+
+        respuesta = self.client.post(self.url + 'detalles/', datos_formset(respuesta.context['formset']))
+        self.assertRedirects(respuesta, self.url, fetch_redirect_response=False)
+        otra.refresh_from_db()
+        self.assertEqual(otra.tarifa_hora, Decimal('60.00'))
+        self.cotizacion.refresh_from_db()
+        self.assertEqual(self.cotizacion.subtotal, otra.subtotal + Decimal('100.00'))
+
+    def test_guardar_una_instancia_vieja_lanza_conflicto_sin_escribir(self):
+        primera = Cotizacion.objects.get(pk=self.cotizacion.pk)
+        segunda = Cotizacion.objects.get(pk=self.cotizacion.pk)
+        primera.notas = 'Primera'
+        primera.save(update_fields=['notas'])
+        self.assertEqual(primera.version, self.cotizacion.version + 1)
+
+        segunda.notas = 'Segunda'
+        with self.assertRaises(ConflictoVersion):
+            segunda.save()
+        guardada = Cotizacion.objects.get(pk=self.cotizacion.pk)
+        self.assertEqual((guardada.notas, guardada.version), ('Primera', primera.version))
+
+
+class LimpiarPdfsTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        ajuste = override_settings(PDF_ROOT=Path(self.directorio.name))
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        self.cotizacion = crear_cotizacion(estado='enviada')
+
+    def congelado(self, huella, dias=60, registrar=True):
+        relativa = f'congelados/{huella[:2]}/{huella}.pdf'
+        ruta = Path(self.directorio.name) / relativa
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        ruta.write_bytes(b'%PDF-1.7')
+        antiguo = time.time() - dias * 86400
+        os.utime(ruta, (antiguo, antiguo))
+        if registrar:
+            PdfCotizacion.objects.create(
+                cotizacion=self.cotizacion, estado='enviada', plantilla='completo', huella=huella,
+                archivo=relativa, tamano=8,
+            )
+        return ruta
+
+    def test_borra_los_congelados_sin_uso(self):
+        en_uso = self.congelado('aa' * 32)
+        descartado = self.congelado('bb' * 32, registrar=False)
+        reciente = self.congelado('cc' * 32, dias=0, registrar=False)
+        archivado = self.congelado('dd' * 32, registrar=False)
+        CotizacionArchivada.objects.create(
+            **{campo: getattr(self.cotizacion, campo) for campo in CAMPOS_COTIZACION if campo != 'id'},
+            id=uuid.uuid4(), pdfs=[{'plantilla': 'completo', 'archivo': f'congelados/dd/{"dd" * 32}.pdf'}],
+        )
+
+        salida = StringIO()
+        call_command('limpiar_pdfs', stdout=salida)
+
+        self.assertIn('1 congelados sin uso borrados', salida.getvalue())
+        self.assertFalse(descartado.exists())
+        self.assertTrue(en_uso.exists() and reciente.exists() and archivado.exists())
+
+
+class ReceptorEventos(BaseHTTPRequestHandler):
+    """Receptor de prueba: registra cada POST y responde lo que indique server.responder(lote)"""
+
+    def do_POST(self):
+        cuerpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.peticiones.append((self.headers['Idempotency-Key'], cuerpo['eventos']))
+        codigo, cabeceras = self.server.responder(cuerpo['eventos'])
+        self.send_response(codigo)
+        for nombre, valor in cabeceras.items():
+            self.send_header(nombre, valor)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@patch.dict(EVENTOS_CONFIG, {'reintentos': 2, 'espera_inicial': 0.01, 'espera_maxima': 0.05, 'timeout': 5})
+class DespacharEventosTests(TestCase):
+    def setUp(self):
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), ReceptorEventos)
+        self.servidor.peticiones = []
+        self.servidor.responder = lambda mensajes: (200, {})
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+        self.url = f'http://127.0.0.1:{self.servidor.server_address[1]}/'
+        self.cliente = Cliente.objects.create(nombre='Cliente de prueba', email='cliente@example.com')
+
+    def responder_en_orden(self, *codigos):
+        respuestas = iter(codigos)
+        self.servidor.responder = lambda mensajes: next(respuestas)
+
+    def eventos(self, cotizacion):
+        return EventoCotizacion.objects.filter(cotizacion=cotizacion.pk)
+
+    def test_reintenta_503_y_entrega_un_mensaje_por_cotizacion(self):
+        primera = crear_cotizacion('COT-0001', lineas=2, cliente=self.cliente)
+        segunda = crear_cotizacion('COT-0002', cliente=self.cliente)
+        self.responder_en_orden((503, {}), (200, {}))
+
+        resumen = despachar(self.url)
+
+        self.assertIsNone(resumen['error'])
+        self.assertEqual((resumen['mensajes'], resumen['intentos']), (2, 2))
+        self.assertEqual(resumen['eventos'], EventoCotizacion.objects.count())
+        self.assertFalse(EventoCotizacion.objects.filter(enviado__isnull=True).exists())
+        (clave, mensajes), (reintento, _) = self.servidor.peticiones
+        self.assertEqual(clave, reintento)
+        self.assertEqual([mensaje['cotizacion'] for mensaje in mensajes], [str(primera.pk), str(segunda.pk)])
+        self.assertEqual(mensajes[0]['eventos'], ['creada'])
+        self.assertEqual(Decimal(mensajes[0]['datos']['subtotal']), Decimal('200.00'))
+
+    def test_429_espera_lo_que_indica_retry_after(self):
+        crear_cotizacion(cliente=self.cliente)
+        self.responder_en_orden((429, {'Retry-After': '0.03'}), (200, {}))
+
+        with patch('cotizaciones.eventos.time.sleep') as dormir:
+            resumen = despachar(self.url)
+
+        dormir.assert_called_once_with(0.03)
+        self.assertEqual((resumen['intentos'], resumen['error']), (2, None))
+
+    def test_400_permanente_aisla_el_mensaje_rechazado(self):
+        primera = crear_cotizacion('COT-0001', cliente=self.cliente)
+        rechazada = crear_cotizacion('COT-0002', cliente=self.cliente)
+        tercera = crear_cotizacion('COT-0003', cliente=self.cliente)
+        self.servidor.responder = lambda mensajes: (
+            (400, {}) if any(mensaje['cotizacion'] == str(rechazada.pk) for mensaje in mensajes) else (200, {})
+        )
+
+        resumen = despachar(self.url)
+
+        self.assertIsNone(resumen['error'])
+        self.assertEqual(resumen['fallidos'], self.eventos(rechazada).count())
+        # El lote completo y luego cada mensaje por separado, sin reintentar el 400
+        self.assertEqual([len(mensajes) for _, mensajes in self.servidor.peticiones], [3, 1, 1, 1])
+        for cotizacion in (primera, tercera):
+            self.assertFalse(self.eventos(cotizacion).filter(enviado__isnull=True).exists())
+        evento = self.eventos(rechazada).last()
+        self.assertIsNotNone(evento.fallido)
+        self.assertEqual((evento.intentos, evento.error), (1, 'HTTP 400 Bad Request'))
+
+        # Los fallidos no bloquean a los eventos posteriores
+        rechazada.estado = 'enviada'
+        rechazada.save()
+        cuarta = crear_cotizacion('COT-0004', cliente=self.cliente)
+        self.servidor.peticiones.clear()
+        resumen = despachar(self.url)
+        self.assertEqual(resumen['fallidos'], 1)
+        self.assertFalse(self.eventos(cuarta).filter(enviado__isnull=True).exists())
+
+        self.servidor.responder = lambda mensajes: (200, {})
+        self.assertEqual(reencolar(), self.eventos(rechazada).count())
+        resumen = despachar(self.url)
+        self.assertEqual((resumen['eventos'], resumen['fallidos']), (self.eventos(rechazada).count(), 0))
+        self.assertFalse(EventoCotizacion.objects.filter(enviado__isnull=True).exists())
+
+    def test_conexion_rechazada_detiene_el_despacho_hasta_agotar_los_intentos(self):
+        crear_cotizacion(cliente=self.cliente)
+        with socket.socket() as libre:
+            libre.bind(('127.0.0.1', 0))
+            url = f'http://127.0.0.1:{libre.getsockname()[1]}/'
+        pendientes = EventoCotizacion.objects.filter(enviado__isnull=True, fallido__isnull=True)
+        total = pendientes.count()
+
+        with patch.dict(EVENTOS_CONFIG, {'intentos_maximos': 6}):
+            resumen = despachar(url)
+            self.assertIsNotNone(resumen['error'])
+            self.assertEqual((resumen['intentos'], resumen['fallidos']), (3, 0))
+            self.assertEqual(pendientes.count(), total)
+            self.assertEqual(set(pendientes.values_list('intentos', flat=True)), {3})
+
+            # Al sumar intentos_maximos los eventos pasan a fallidos y la bandeja queda libre
+            resumen = despachar(url)
+        self.assertEqual((resumen['error'], resumen['fallidos']), (None, total))
+        self.assertFalse(pendientes.exists())
+
+    def test_agrupar_combina_los_eventos_de_cada_cotizacion(self):
+        creada, cambiada = uuid.uuid4(), uuid.uuid4()
+        ahora = timezone.now()
+        eventos = [
+            EventoCotizacion(id=pk, cotizacion=cotizacion, tipo=tipo, fecha=ahora, datos=datos)
+            for pk, cotizacion, tipo, datos in [
+                (1, creada, 'creada', {'estado': 'borrador', 'total': '10'}),
+                (2, cambiada, 'estado', {'anterior': 'borrador', 'estado': 'enviada'}),
+                (3, creada, 'estado', {'anterior': 'borrador', 'estado': 'enviada'}),
+                (4, creada, 'totales', {'total': '20'}),
+                (5, cambiada, 'estado', {'anterior': 'enviada', 'estado': 'borrador'}),
+                (6, cambiada, 'totales', {'total': '5'}),
+            ]
+        ]
+
+        primero, segundo = agrupar(eventos)
+
+        self.assertEqual((primero['id'], primero['eventos']), (4, ['creada']))
+        self.assertEqual(primero['datos'], {'estado': 'enviada', 'total': '20'})
+        # El estado volvió al inicial: solo quedan los totales
+        self.assertEqual((segundo['id'], segundo['eventos']), (6, ['totales']))
+        self.assertEqual(segundo['datos'], {'estado': 'borrador', 'total': '5'})
+        self.assertEqual(agrupar(eventos[4:5] + eventos[1:2]), [])
+
+
+@sin_manifiesto
+@sin_weasyprint
+class EnvioCorreoTests(PdfTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.cotizacion = crear_cotizacion()
+
+    def test_la_vista_solo_encola_el_envio(self):
+        with patch('cotizaciones.correo.procesar_envios') as procesar:
+            with self.captureOnCommitCallbacks() as callbacks:
+                respuesta = self.client.post(f'/cotizaciones/{self.cotizacion.pk}/enviar/')
+
+        self.assertRedirects(respuesta, f'/cotizaciones/{self.cotizacion.pk}/', fetch_redirect_response=False)
+        procesar.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(list(EnvioCotizacion.objects.values_list('estado', flat=True)), ['pendiente'])
+        self.assertEqual(mail.outbox, [])
+
+    def test_la_api_encola_y_rechaza_clientes_sin_correo(self):
+        sin_correo = crear_cotizacion('COT-0002', cliente=Cliente.objects.create(nombre='Sin correo'))
+        with patch('cotizaciones.correo.procesar_envios') as procesar:
+            respuesta = self.client.post(
+                '/api/cotizaciones/acciones/', json.dumps({
+                    'accion': 'enviar_correo', 'ids': [str(self.cotizacion.pk), str(sin_correo.pk)],
+                }), content_type='application/json',
+            )
+
+        procesar.assert_not_called()
+        datos = respuesta.json()
+        self.assertEqual((datos['aplicadas'], datos['rechazadas'][0]['id']), (1, str(sin_correo.pk)))
+        self.assertTrue(datos['mensaje'].startswith('Enviar por correo al cliente: 1 de 2 cotizaciones encoladas'))
+        self.assertEqual(
+            dict(EnvioCotizacion.objects.values_list('cotizacion', 'estado')),
+            {self.cotizacion.pk: 'pendiente', sin_correo.pk: 'error'},
+        )
+
+    def test_el_comando_envia_los_pendientes(self):
+        correo.encolar_envios([self.cotizacion.pk])
+        salida = StringIO()
+
+        call_command('enviar_cotizaciones', '--pendientes', '--minutos', '0', '--por-segundo', '0', stdout=salida)
+
+        self.assertIn('1 enviadas, 0 con error', salida.getvalue())
+        self.assertEqual(mail.outbox[0].to, ['cliente@example.com'])
+        self.assertEqual(mail.outbox[0].attachments[0][0], 'cotizacion_COT-0001.pdf')
+        self.assertEqual(EnvioCotizacion.objects.get().estado, 'enviado')
+        self.cotizacion.refresh_from_db()
+        self.assertEqual(self.cotizacion.estado, 'enviada')
+
+        # Ya no quedan pendientes; los recientes se dejan al hilo de la web
+        correo.encolar_envios([self.cotizacion.pk])
+        call_command('enviar_cotizaciones', '--pendientes', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@skipUnless(ES_SQLITE, 'El hilo de fondo necesita ver los datos confirmados')
+@sin_weasyprint
+class EnvioCorreoSegundoPlanoTests(PdfTemporalMixin, TransactionTestCase):
+    def test_el_hilo_de_fondo_envia_tras_el_commit(self):
+        cotizacion = crear_cotizacion()
+        with patch.dict(correo.CORREO_CONFIG, {'por_segundo': 0}):
+            with transaction.atomic():
+                correo.encolar_envios([cotizacion.pk])
+            # Espera a que los ejecutores de un hilo terminen las tareas encoladas:
+            # el envío y, al pasar a 'enviada', el congelado del PDF
+            correo._ejecutor.submit(lambda: None).result(timeout=60)
+            pdf._ejecutor.submit(lambda: None).result(timeout=60)
+
+        self.assertEqual(EnvioCotizacion.objects.get().estado, 'enviado')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertTrue(PdfCotizacion.objects.filter(cotizacion=cotizacion, estado='enviada').exists())
+
+
+@sin_manifiesto
+@sin_weasyprint
+class RevisionesTests(PdfTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.cotizacion = crear_cotizacion(lineas=2)
+        registrar_revision(self.cotizacion)
+        self.url = f'/cotizaciones/{self.cotizacion.pk}/versiones/'
+
+    def test_reconstruye_cualquier_version_a_traves_de_los_snapshots(self):
+        estados = [None, estado_actual(self.cotizacion)]
+        for version in range(2, INTERVALO_SNAPSHOT + 5):
+            if version % 2:
+                DetalleCotizacion.objects.create(
+                    cotizacion_id=self.cotizacion.pk, servicio=Servicio.objects.get(), descripcion=f'Línea v{version}',
+                    horas_estimadas=Decimal('1.00'), tarifa_hora=Decimal('10.00'),
+                )
+            else:
+                detalles = DetalleCotizacion.objects.filter(cotizacion_id=self.cotizacion.pk)
+                detalle = detalles.order_by('descripcion').first()
+                detalle.horas_estimadas += 1
+                detalle.save()
+            cotizacion = Cotizacion.objects.get(pk=self.cotizacion.pk)
+            cotizacion.notas = f'Versión {version}'
+            cotizacion.save(update_fields=['notas'])
+            registrar_revision(cotizacion)
+            estados.append(estado_actual(cotizacion))
+
+        self.assertEqual(
+            list(self.cotizacion.revisiones.filter(es_snapshot=True).values_list('version', flat=True)),
+            [1, INTERVALO_SNAPSHOT + 1],
+        )
+        for version in range(1, len(estados)):
+            self.assertEqual(reconstruir(self.cotizacion, version), estados[version], f'versión {version}')
+        # Sin cambios no hay versión nueva
+        self.assertIsNone(registrar_revision(self.cotizacion))
+
+    def test_los_caminos_masivos_registran_el_delta_real(self):
+        # Un cambio que no registró revisión (SQL directo) entra en la siguiente
+        Cotizacion.objects.filter(pk=self.cotizacion.pk).update(notas='Cambio directo', total=Decimal('1.00'))
+        cambiar_estado([self.cotizacion.pk], 'enviada')
+        self.assertEqual(
+            self.cotizacion.revisiones.get(version=2).datos,
+            {'cotizacion': {'estado': 'enviada', 'notas': 'Cambio directo', 'total': '1.00'}},
+        )
+
+        reparar_totales([self.cotizacion.pk])
+        actual = estado_actual(self.cotizacion)
+        self.assertEqual(
+            self.cotizacion.revisiones.get(version=3).datos, {'cotizacion': {'total': actual['cotizacion']['total']}},
+        )
+        self.assertEqual(reconstruir(self.cotizacion), actual)
+
+    def test_borrar_una_linea_desde_el_admin_registra_la_revision(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        detalle = self.cotizacion.detallecotizacion_set.first()
+
+        respuesta = self.client.post(
+            f'/admin/cotizaciones/detallecotizacion/{detalle.pk}/delete/', {'post': 'yes'},
+        )
+
+        self.assertEqual(respuesta.status_code, 302)
+        self.cotizacion.refresh_from_db()
+        self.assertEqual(self.cotizacion.subtotal, Decimal('100.00'))
+        revision = self.cotizacion.revisiones.get(version=2)
+        self.assertEqual(revision.datos['detalles'], {'-': [str(detalle.pk)]})
+        self.assertEqual(revision.datos['cotizacion']['subtotal'], '100.00')
+
+    def test_diff_entre_versiones(self):
+        detalle = self.cotizacion.detallecotizacion_set.order_by('descripcion').first()
+        detalle.descripcion = 'Descripción v2'
+        detalle.save()
+        registrar_revision(self.cotizacion)
+
+        datos = self.client.get(self.url + '2/diff/').json()
+        self.assertEqual((datos['desde'], datos['hasta']), (1, 2))
+        self.assertEqual(datos['cambios'], {'detalles': {'~': {str(detalle.pk): {'descripcion': 'Descripción v2'}}}})
+        # Contra la versión 0: la cotización completa
+        completo = self.client.get(self.url + '2/diff/', {'contra': 0}).json()['cambios']
+        self.assertEqual(completo['cotizacion']['numero_cotizacion'], 'COT-0001')
+        self.assertEqual(len(completo['detalles']['+']), 2)
+
+        self.assertEqual(self.client.get(self.url + '3/diff/').status_code, 404)
+        self.assertEqual(self.client.get(self.url + '2/diff/', {'contra': 'x'}).status_code, 400)
+
+    def test_pdf_de_una_version_anterior(self):
+        detalle = self.cotizacion.detallecotizacion_set.order_by('descripcion').first()
+        detalle.descripcion = 'Descripción v2'
+        detalle.save()
+        registrar_revision(self.cotizacion)
+
+        with patch('cotizaciones.pdf.renderizar', side_effect=renderizar_falso) as render:
+            respuesta = self.client.get(self.url + '1/pdf/')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Disposition'], 'attachment; filename="cotizacion_COT-0001_v1.pdf"')
+        self.assertTrue(b''.join(respuesta.streaming_content).startswith(b'%PDF'))
+        html = render.call_args.args[0]
+        self.assertIn('Línea 0', html)
+        self.assertNotIn('Descripción v2', html)
+        self.assertEqual(self.client.get(self.url + '9/pdf/').status_code, 404)
+
+
+class ClonarCotizacionTests(TestCase):
+    def setUp(self):
+        self.cotizacion = crear_cotizacion(
+            lineas=3, estado='enviada', descuento_porcentaje=Decimal('10.00'), notas='Condiciones especiales',
+        )
+        Servicio.objects.update(tarifa_hora=Decimal('60.00'))
+
+    def lineas(self, cotizacion):
+        return list(
+            cotizacion.detallecotizacion_set.order_by('descripcion')
+            .values_list('descripcion', 'horas_estimadas', 'tarifa_hora', 'subtotal')
+        )
+
+    def test_copia_las_lineas_con_un_solo_insert(self):
+        with CaptureQueriesContext(connection) as consultas:
+            copia = self.cotizacion.clonar()
+
+        tabla = DetalleCotizacion._meta.db_table
+        self.assertEqual(sum(f'INSERT INTO "{tabla}"' in consulta['sql'] for consulta in consultas), 1)
+        self.assertEqual((copia.estado, copia.numero_cotizacion), ('borrador', 'COT-0002'))
+        self.assertNotEqual(copia.pk, self.cotizacion.pk)
+        self.assertEqual(copia.notas, 'Condiciones especiales')
+        # Con las tarifas originales los totales se copian tal cual
+        self.assertEqual(self.lineas(copia), self.lineas(self.cotizacion))
+        self.assertEqual(copia.total, self.cotizacion.total)
+        self.assertEqual(self.cotizacion.detallecotizacion_set.count(), 3)
+
+    def test_aplicar_tarifas_actuales_recalcula_lineas_y_totales(self):
+        copia = self.cotizacion.clonar(aplicar_tarifas_actuales=True)
+        copia.refresh_from_db()
+
+        self.assertEqual({linea[2:] for linea in self.lineas(copia)}, {(Decimal('60.00'), Decimal('120.00'))})
+        esperados = montos_redondeados(Decimal('360.00'), copia.descuento_porcentaje, copia.iva_porcentaje)
+        self.assertEqual({campo: getattr(copia, campo) for campo in esperados}, esperados)
+        # La original no cambia
+        self.assertEqual(self.cotizacion.detallecotizacion_set.filter(tarifa_hora=Decimal('50.00')).count(), 3)
+
+    def test_cambios_sobrescriben_campos_de_la_copia(self):
+        otro = Cliente.objects.create(nombre='Otro cliente', email='otro@example.com')
+
+        copia = self.cotizacion.clonar(cliente=otro, iva_porcentaje=Decimal('0.00'))
+
+        self.assertEqual(copia.cliente_id, otro.pk)
+        self.assertEqual(copia.total, copia.subtotal - copia.descuento_monto)
+        self.assertEqual(copia.subtotal, Decimal('300.00'))
+
+
+class ServirPdfTests(PdfTemporalMixin, SimpleTestCase):
+    CONTENIDO = b'%PDF-1.7 0123456789'
+
+    def setUp(self):
+        super().setUp()
+        self.ruta = pdf.directorio_pdf() / 'ab' / f'{"ab" * 32}.pdf'
+        self.ruta.parent.mkdir(parents=True)
+        self.ruta.write_bytes(self.CONTENIDO)
+        self.etag = f'"{self.ruta.stem}"'
+
+    def servir(self, **cabeceras):
+        respuesta = pdf.servir_pdf(RequestFactory().get('/', headers=cabeceras), self.ruta, 'cotizacion.pdf')
+        self.addCleanup(respuesta.close)
+        contenido = b''.join(respuesta.streaming_content) if respuesta.streaming else respuesta.content
+        return respuesta, contenido
+
+    def test_archivo_completo(self):
+        respuesta, contenido = self.servir()
+        self.assertEqual((respuesta.status_code, contenido), (200, self.CONTENIDO))
+        self.assertEqual(respuesta['ETag'], self.etag)
+        self.assertEqual(respuesta['Accept-Ranges'], 'bytes')
+        self.assertEqual(respuesta['Content-Disposition'], 'attachment; filename="cotizacion.pdf"')
+
+    def test_rangos(self):
+        tamano = len(self.CONTENIDO)
+        for rango, inicio, fin in (
+            ('bytes=0-3', 0, 3), ('bytes=-4', tamano - 4, tamano - 1), ('bytes=9-', 9, tamano - 1),
+            ('bytes=5-999', 5, tamano - 1),
+        ):
+            with self.subTest(rango=rango):
+                respuesta, contenido = self.servir(Range=rango)
+                self.assertEqual(respuesta.status_code, 206)
+                self.assertEqual(contenido, self.CONTENIDO[inicio:fin + 1])
+                self.assertEqual(respuesta['Content-Range'], f'bytes {inicio}-{fin}/{tamano}')
+                self.assertEqual(respuesta['Content-Length'], str(fin - inicio + 1))
+
+    def test_rango_imposible_responde_416(self):
+        for rango in (f'bytes={len(self.CONTENIDO)}-', 'bytes=8-2'):
+            with self.subTest(rango=rango):
+                respuesta, _ = self.servir(Range=rango)
+                self.assertEqual(respuesta.status_code, 416)
+                self.assertEqual(respuesta['Content-Range'], f'bytes */{len(self.CONTENIDO)}')
+        # Un Range mal formado se ignora: archivo completo
+        respuesta, contenido = self.servir(Range='bytes=a-b')
+        self.assertEqual((respuesta.status_code, contenido), (200, self.CONTENIDO))
+
+    def test_if_range(self):
+        respuesta, contenido = self.servir(Range='bytes=0-3', **{'If-Range': self.etag})
+        self.assertEqual((respuesta.status_code, contenido), (206, self.CONTENIDO[:4]))
+        # Otra versión del archivo: se envía completo
+        respuesta, contenido = self.servir(Range='bytes=0-3', **{'If-Range': '"otra"'})
+        self.assertEqual((respuesta.status_code, contenido), (200, self.CONTENIDO))
+
+    def test_get_condicional_responde_304(self):
+        respuesta, _ = self.servir(**{'If-None-Match': self.etag})
+        self.assertEqual(respuesta.status_code, 304)
+        respuesta, _ = self.servir(**{'If-Modified-Since': self.servir()[0]['Last-Modified']})
+        self.assertEqual(respuesta.status_code, 304)
+        respuesta, _ = self.servir(**{'If-None-Match': '"otra"'})
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_delegacion_al_proxy(self):
+        with self.settings(PDF_SENDFILE='x-accel-redirect', PDF_ACCEL_PREFIX='/interno/'):
+            respuesta, contenido = self.servir()
+        self.assertEqual(respuesta['X-Accel-Redirect'], f'/interno/ab/{self.ruta.name}')
+        self.assertEqual(contenido, b'')
+        with self.settings(PDF_SENDFILE='x-sendfile'):
+            respuesta, _ = self.servir()
+        self.assertEqual(respuesta['X-Sendfile'], str(self.ruta))
+
+
+@skipUnless(ES_SQLITE, 'El hilo de fondo necesita ver los datos confirmados')
+@sin_weasyprint
+class CongeladoPdfTests(PdfTemporalMixin, TransactionTestCase):
+    def esperar_congelado(self):
+        pdf._ejecutor.submit(lambda: None).result(timeout=60)
+
+    def test_congela_tras_el_commit_con_huella_del_contenido(self):
+        cotizacion = crear_cotizacion()
+        with transaction.atomic():
+            cotizacion.estado = 'enviada'
+            cotizacion.save()
+            self.assertFalse(PdfCotizacion.objects.exists())
+        self.esperar_congelado()
+
+        congelados = PdfCotizacion.objects.filter(cotizacion=cotizacion, estado='enviada')
+        self.assertEqual(sorted(congelados.values_list('plantilla', flat=True)), ['completo', 'sin_info'])
+        for congelado in congelados:
+            datos = (settings.PDF_ROOT / congelado.archivo).read_bytes()
+            self.assertEqual(congelado.huella, hashlib.sha256(datos).hexdigest())
+            self.assertEqual(congelado.archivo, f'congelados/{congelado.huella[:2]}/{congelado.huella}.pdf')
+            self.assertEqual(congelado.tamano, len(datos))
+
+        # Cambiar los datos vivos no cambia el PDF servido
+        respuesta = self.client.get(f'/cotizaciones/{cotizacion.pk}/pdf/')
+        enviado = b''.join(respuesta.streaming_content)
+        Cliente.objects.update(nombre='Otro nombre')
+        respuesta = self.client.get(f'/cotizaciones/{cotizacion.pk}/pdf/')
+        self.assertEqual(b''.join(respuesta.streaming_content), enviado)
+
+    def test_la_descarga_sin_congelado_no_congela_en_la_peticion(self):
+        cotizacion = crear_cotizacion()
+        Cotizacion.objects.filter(pk=cotizacion.pk).update(estado='enviada')
+        with patch('cotizaciones.pdf.congelar_pdf') as congelar, \
+                patch.object(pdf._ejecutor, 'submit') as encolar:
+            respuesta = self.client.get(f'/cotizaciones/{cotizacion.pk}/pdf/')
+            self.assertEqual(respuesta.status_code, 200)
+            b''.join(respuesta.streaming_content)
+        congelar.assert_not_called()
+        encolar.assert_called_once()
+        self.assertFalse(PdfCotizacion.objects.exists())
+
+    def test_congelar_pdfs_completa_los_que_faltan(self):
+        pendiente = crear_cotizacion()
+        crear_cotizacion(numero='COT-0002')
+        Cotizacion.objects.filter(pk=pendiente.pk).update(estado='aprobada')
+
+        salida = StringIO()
+        call_command('congelar_pdfs', procesos=1, stdout=salida)
+        self.assertIn('2 PDFs congelados', salida.getvalue())
+        self.assertEqual(
+            sorted(PdfCotizacion.objects.values_list('cotizacion_id', 'estado')),
+            [(pendiente.pk, 'aprobada')] * 2,
+        )
+
+        salida = StringIO()
+        call_command('congelar_pdfs', procesos=1, stdout=salida)
+        self.assertIn('No hay PDFs pendientes', salida.getvalue())
+
+
+class RecursoRemoto(BaseHTTPRequestHandler):
+    """Sirve un logo PNG y cuenta las peticiones"""
+
+    def do_GET(self):
+        self.server.peticiones += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(self.server.datos)))
+        self.end_headers()
+        self.wfile.write(self.server.datos)
+
+    def log_message(self, *args):
+        pass
+
+
+class RecursosPdfTests(SimpleTestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajuste = override_settings(PDF_RECURSOS_ROOT=Path(directorio.name))
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        for estado in (recursos_pdf._memoria, recursos_pdf._tiempos):
+            patcher = patch.dict(estado, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.dict(recursos_pdf._manifiesto, {'datos': {}, 'mtime': None})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), RecursoRemoto)
+        self.servidor.peticiones = 0
+        self.servidor.datos = b'\x89PNG\r\n\x1a\nlogo'
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+        self.url = f'http://127.0.0.1:{self.servidor.server_address[1]}/logo.png'
+
+    def test_precarga_y_sirve_sin_red(self):
+        (url, tamano, _, error), = recursos_pdf.precargar([self.url])
+        self.assertIsNone(error)
+        self.assertEqual(tamano, len(self.servidor.datos))
+        huella = hashlib.sha256(self.servidor.datos).hexdigest()
+        self.assertTrue((recursos_pdf.directorio_recursos() / f'{huella}.png').is_file())
+
+        for _ in range(2):
+            recurso = recursos_pdf.url_fetcher(self.url)
+            self.assertEqual((recurso['string'], recurso['mime_type']), (self.servidor.datos, 'image/png'))
+        self.assertEqual(self.servidor.peticiones, 1)
+        estadisticas = recursos_pdf.estadisticas()[self.url]
+        self.assertEqual((estadisticas['origen'], estadisticas['aciertos_memoria']), ('almacen', 1))
+
+    def test_lee_estaticos_de_disco(self):
+        recurso = recursos_pdf.url_fetcher('file:///static/css/app.css')
+        self.assertEqual(recurso['string'], (Path(settings.BASE_DIR) / 'static' / 'css' / 'app.css').read_bytes())
+        self.assertEqual(recursos_pdf.estadisticas()['file:///static/css/app.css']['origen'], 'disco')
+
+    def test_rechaza_lo_que_no_esta_precargado_o_fuera_del_almacen(self):
+        for url in (self.url, 'file:///etc/passwd', 'ftp://example.com/logo.png'):
+            with self.subTest(url=url), self.assertRaises(recursos_pdf.RecursoNoDisponible):
+                recursos_pdf.url_fetcher(url)
+        self.assertEqual(self.servidor.peticiones, 0)
+
+    def test_comando_precargar(self):
+        salida = StringIO()
+        with patch('cotizaciones.management.commands.precargar_recursos_pdf.urls_configuradas', return_value=[]):
+            call_command('precargar_recursos_pdf', self.url, stdout=salida)
+        self.assertIn(self.url, salida.getvalue())
+        self.assertIn(self.url, json.loads((recursos_pdf.directorio_recursos() / 'manifiesto.json').read_text()))
+
+
+class BenchmarkPerfilesPdfTests(SimpleTestCase):
+    @patch('cotizaciones.management.commands.benchmark_perfiles_pdf.renderizar', new=renderizar_falso)
+    def test_mide_cada_perfil_sobre_un_corpus_sintetico(self):
+        salida = StringIO()
+        call_command(
+            'benchmark_perfiles_pdf', sinteticas=2, repeticiones=1, perfiles=['fast-preview', 'email'], stdout=salida,
+        )
+        self.assertIn('Corpus sintético: 2 cotizaciones', salida.getvalue())
+        filas = [linea.split()[0] for linea in salida.getvalue().splitlines()[2:]]
+        self.assertEqual(filas, ['fast-preview', 'email'])
+
+    def test_rechaza_perfiles_desconocidos(self):
+        with self.assertRaisesMessage(CommandError, 'no-existe'):
+            call_command('benchmark_perfiles_pdf', perfiles=['no-existe'], sinteticas=1)
+
+
+@sin_manifiesto
+class RecursosLocalesTests(SimpleTestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.static = Path(directorio.name)
+        ajuste = override_settings(STATICFILES_DIRS=[self.static])
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        patcher = patch.dict(estaticos._locales, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_avisa_de_los_recursos_sin_copia_local(self):
+        avisos = estaticos.recursos_locales()
+        self.assertEqual(len(avisos), len(RECURSOS_ESTATICOS))
+        self.assertEqual({aviso.id for aviso in avisos}, {'cotizaciones.W001'})
+        with self.assertLogs('cotizaciones.estaticos', 'WARNING'):
+            self.assertEqual(estaticos.url_recurso('jquery'), RECURSOS_ESTATICOS['jquery']['cdn'])
+
+    def test_sin_cdn_de_respaldo_es_un_error(self):
+        with patch.dict(ESTATICOS_CONFIG, {'cdn_de_respaldo': False}):
+            self.assertEqual({error.id for error in estaticos.recursos_locales()}, {'cotizaciones.E001'})
+
+    def test_la_copia_local_reemplaza_al_cdn(self):
+        for recurso in RECURSOS_ESTATICOS.values():
+            (self.static / recurso['local']).parent.mkdir(parents=True, exist_ok=True)
+            (self.static / recurso['local']).write_text('/* local */')
+        self.assertEqual(estaticos.recursos_locales(), [])
+        self.assertEqual(estaticos.url_recurso('jquery'), '/static/' + RECURSOS_ESTATICOS['jquery']['local'])
+
+
+@sin_manifiesto
+@sin_weasyprint
+class ArchivoTests(PdfTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.corte = timezone.now() - timedelta(days=30)
+        antigua = self.corte - timedelta(days=1)
+        self.archivables = [
+            crear_cotizacion(f'COT-000{indice}', lineas=indice, estado='rechazada') for indice in (1, 2, 3)
+        ] + [crear_cotizacion('COT-0004', estado='aprobada', modalidad_pago='unico')]
+        self.vivas = [
+            crear_cotizacion('COT-0005', estado='aprobada', modalidad_pago='mensual'),
+            crear_cotizacion('COT-0006', estado='borrador'),
+        ]
+        Cotizacion.objects.update(fecha_creacion=antigua, fecha_actualizacion=antigua)
+        self.recien_cerrada = crear_cotizacion('COT-0007', estado='cancelada')
+
+    def test_archiva_por_lotes_y_acumula_el_resumen(self):
+        progreso = []
+        self.assertEqual(archivar(self.corte, lote=3, progreso=progreso.append), 4)
+
+        self.assertEqual(progreso, [3, 4])
+        vivas = Cotizacion.objects.order_by('numero_cotizacion').values_list('numero_cotizacion', flat=True)
+        self.assertEqual(list(vivas), ['COT-0005', 'COT-0006', 'COT-0007'])
+        self.assertEqual(CotizacionArchivada.objects.count(), 4)
+        self.assertEqual(DetalleArchivado.objects.count(), 1 + 2 + 3 + 1)
+        rechazadas = sum(cotizacion.total for cotizacion in self.archivables[:3])
+        self.assertEqual(ResumenArchivo.objects.get(estado='rechazada').total, rechazadas)
+        self.assertEqual(ResumenArchivo.conteos(), {'rechazada': 3, 'aprobada': 1})
+        self.assertEqual(conteos_por_estado(), {'rechazada': 3, 'aprobada': 2, 'borrador': 1, 'cancelada': 1})
+
+    def test_limite_y_recalcular_resumen(self):
+        self.assertEqual(archivar(self.corte, lote=1, limite=2), 2)
+        self.assertEqual(CotizacionArchivada.objects.count(), 2)
+
+        ResumenArchivo.objects.update(cantidad=99, total=0)
+        call_command('archivar_cotizaciones', recalcular_resumen=True, dry_run=True, stdout=StringIO())
+        self.assertEqual(ResumenArchivo.conteos(), {'rechazada': 2})
+
+    def test_obtener_cotizacion_encuentra_las_archivadas(self):
+        archivada = self.archivables[1]
+        archivar(self.corte)
+
+        encontrada = obtener_cotizacion(archivada.pk)
+        self.assertIsInstance(encontrada, CotizacionArchivada)
+        self.assertEqual((encontrada.numero_cotizacion, encontrada.total), ('COT-0002', archivada.total))
+        self.assertIsInstance(obtener_cotizacion(self.vivas[0].pk), Cotizacion)
+        with self.assertRaises(Http404):
+            obtener_cotizacion(uuid.uuid4())
+
+        respuesta = self.client.get(f'/cotizaciones/{archivada.pk}/')
+        self.assertContains(respuesta, 'COT-0002')
+        self.assertEqual(len(respuesta.context['detalles']), 2)
+        respuesta = self.client.get(f'/cotizaciones/{archivada.pk}/pdf/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(b''.join(respuesta.streaming_content).startswith(b'%PDF'))
+
+
+class EstadisticasClienteTests(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre='Cliente de prueba', email='cliente@example.com')
+
+    def assertCuadran(self):
+        """Los contadores mantenidos con F() coinciden con los calculados desde las tablas"""
+        campos = [campo.attname for campo in EstadisticasCliente._meta.concrete_fields]
+        actual = EstadisticasCliente.objects.filter(pk=self.cliente.pk).values(*campos).get()
+        calculada, = EstadisticasCliente.calcular([self.cliente.pk])
+        self.assertEqual(actual, {campo: getattr(calculada, campo) for campo in campos})
+
+    def estadisticas(self):
+        return EstadisticasCliente.objects.get(pk=self.cliente.pk)
+
+    def test_siguen_altas_cambios_de_estado_y_borrados(self):
+        primera = crear_cotizacion('COT-0001', lineas=2, cliente=self.cliente)
+        segunda = crear_cotizacion('COT-0002', cliente=self.cliente, estado='enviada')
+        estadisticas = self.estadisticas()
+        self.assertEqual(
+            (estadisticas.cantidad, estadisticas.cantidad_borrador, estadisticas.cantidad_enviada), (2, 1, 1),
+        )
+        self.assertEqual(estadisticas.total_cotizado, primera.total + segunda.total)
+        self.assertEqual(estadisticas.ultima_cotizacion, segunda.fecha_creacion)
+        self.assertCuadran()
+
+        segunda.estado = 'aprobada'
+        segunda.save()
+        self.assertEqual(self.estadisticas().total_aprobado, segunda.total)
+        self.assertCuadran()
+
+        cambiar_estado([primera.pk], 'enviada')
+        self.assertEqual(self.estadisticas().cantidad_enviada, 1)
+        self.assertCuadran()
+
+        Cotizacion.objects.get(pk=segunda.pk).delete()
+        estadisticas = self.estadisticas()
+        self.assertEqual((estadisticas.cantidad, estadisticas.total_aprobado), (1, 0))
+        self.assertEqual(estadisticas.ultima_cotizacion, primera.fecha_creacion)
+        self.assertCuadran()
+
+    def test_borrado_masivo_del_admin(self):
+        from django.contrib.admin.sites import site
+
+        for numero in ('COT-0001', 'COT-0002', 'COT-0003'):
+            crear_cotizacion(numero, cliente=self.cliente)
+        request = RequestFactory().post('/admin/')
+        site._registry[Cotizacion].delete_queryset(request, Cotizacion.objects.exclude(numero_cotizacion='COT-0001'))
+
+        estadisticas = self.estadisticas()
+        self.assertEqual(estadisticas.cantidad, 1)
+        self.assertEqual(estadisticas.ultima_cotizacion, Cotizacion.objects.get().fecha_creacion)
+        self.assertCuadran()
+
+
+class ReconciliarEstadisticasTests(TransactionTestCase):
+    def test_verifica_y_corrige_la_deriva(self):
+        cotizacion = crear_cotizacion(lineas=2)
+        EstadisticasCliente.objects.update(cantidad=7, cantidad_borrador=0, total_cotizado=0)
+
+        salida = StringIO()
+        call_command('recalcular_estadisticas_clientes', procesos=1, verificar=True, stdout=salida)
+        self.assertIn('1 con diferencias', salida.getvalue())
+        self.assertEqual(EstadisticasCliente.objects.get().cantidad, 7)
+
+        salida = StringIO()
+        call_command('recalcular_estadisticas_clientes', procesos=1, stdout=salida)
+        self.assertIn('1 corregidos', salida.getvalue())
+        estadisticas = EstadisticasCliente.objects.get()
+        self.assertEqual((estadisticas.cantidad, estadisticas.cantidad_borrador), (1, 1))
+        self.assertEqual(estadisticas.total_cotizado, cotizacion.total)
+
+
+class VerificarTotalesTests(TestCase):
+    def setUp(self):
+        self.total_corrupto = crear_cotizacion('COT-0001', lineas=2)
+        self.linea_corrupta = crear_cotizacion('COT-0002', lineas=3)
+        self.correcta = crear_cotizacion('COT-0003')
+        self.totales = dict(Cotizacion.objects.values_list('pk', 'total'))
+        Cotizacion.objects.filter(pk=self.total_corrupto.pk).update(total=F('total') + Decimal('0.01'))
+        DetalleCotizacion.objects.filter(pk=DetalleCotizacion.objects.filter(
+            cotizacion_id=self.linea_corrupta.pk,
+        ).values('pk')[:1]).update(subtotal=Decimal('1.00'))
+
+    def test_detecta_y_repara_las_diferencias(self):
+        desde, = limites(10)
+        resumen = verificar_bloque(desde)
+        self.assertEqual((resumen['revisadas'], resumen['lineas']), (3, 6))
+        self.assertEqual((resumen['con_diferencias'], resumen['lineas_distintas']), (2, 1))
+        self.assertEqual(resumen['diferencia_total'], Decimal('-0.01'))
+        muestra = {diferencia['numero']: diferencia for diferencia in resumen['muestra']}
+        self.assertEqual(
+            muestra['COT-0001']['campos'],
+            {'total': (self.totales[self.total_corrupto.pk] + Decimal('0.01'), self.totales[self.total_corrupto.pk])},
+        )
+        self.assertEqual((muestra['COT-0002']['lineas_distintas'], muestra['COT-0002']['campos']), (1, {}))
+
+        ultimo_evento = EventoCotizacion.objects.order_by('-pk').values_list('pk', flat=True).first()
+        resumen = verificar_bloque(desde, reparar=True)
+        self.assertEqual((resumen['reparadas'], resumen['lineas_reparadas']), (2, 1))
+        self.assertEqual(dict(Cotizacion.objects.values_list('pk', 'total')), self.totales)
+        self.assertEqual(verificar_bloque(desde)['con_diferencias'], 0)
+        self.assertEqual(reparar_totales([self.correcta.pk]), ([], 0))
+        self.assertEqual(
+            list(EventoCotizacion.objects.filter(pk__gt=ultimo_evento).values_list('cotizacion', 'tipo')),
+            [(self.total_corrupto.pk, 'totales')],
+        )
+
+    def test_estadisticas_y_revisiones_siguen_la_reparacion(self):
+        # Horas cambiadas por SQL: líneas y totales guardados quedan viejos
+        DetalleCotizacion.objects.filter(cotizacion_id=self.correcta.pk).update(horas_estimadas=Decimal('3.00'))
+        registrar_revision(self.correcta)
+        self.assertEqual(reparar_totales([self.correcta.pk]), ([self.correcta.pk], 1))
+
+        cotizacion = Cotizacion.objects.get(pk=self.correcta.pk)
+        self.assertEqual(cotizacion.subtotal, Decimal('150.00'))
+        estadisticas = EstadisticasCliente.objects.get(pk=cotizacion.cliente_id)
+        self.assertEqual(estadisticas.total_cotizado, cotizacion.total)
+        ultima = cotizacion.revisiones.order_by('version').last()
+        self.assertEqual(reconstruir(cotizacion, ultima.version), estado_actual(cotizacion))
+
+    def test_la_accion_masiva_registra_revisiones_y_emite_la_senal(self):
+        registrar_revision(self.total_corrupto)
+        recibidas = []
+        receptor = lambda sender, **datos: recibidas.append(datos)
+        totales_recalculados.connect(receptor)
+        self.addCleanup(totales_recalculados.disconnect, receptor)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resumen = ejecutar('recalcular_totales', [self.total_corrupto.pk, self.correcta.pk])
+
+        self.assertEqual(resumen['aplicadas'], 1)
+        guardado = self.totales[self.total_corrupto.pk] + Decimal('0.01')
+        self.assertEqual(recibidas, [{
+            'signal': totales_recalculados, 'corregidas': [self.total_corrupto.pk],
+            'anteriores': {self.total_corrupto.pk: {'total': guardado}},
+        }])
+        cotizacion = Cotizacion.objects.get(pk=self.total_corrupto.pk)
+        self.assertEqual(cotizacion.revisiones.count(), 2)
+        self.assertEqual(reconstruir(cotizacion), estado_actual(cotizacion))
+
+
+class VerificarTotalesComandoTests(TransactionTestCase):
+    def test_informa_y_repara(self):
+        cotizacion = crear_cotizacion(lineas=2)
+        Cotizacion.objects.update(subtotal=0, total=0)
+
+        salida = StringIO()
+        call_command('verificar_totales', procesos=1, stdout=salida)
+        self.assertIn('1 cotizaciones con diferencias', salida.getvalue())
+        self.assertIn('COT-0001: subtotal 0.00 -> 200.00', salida.getvalue())
+
+        salida = StringIO()
+        call_command('verificar_totales', procesos=1, reparar=True, stdout=salida)
+        self.assertIn('Reparadas 1 cotizaciones', salida.getvalue())
+        self.assertEqual(Cotizacion.objects.get().total, cotizacion.total)
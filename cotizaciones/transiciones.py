@@ -0,0 +1,174 @@
+"""
+Acciones masivas sobre cotizaciones: cambios de estado, recálculo de totales,
+regeneración de PDFs congelados y envío por correo (correo.py).
+
+Un cambio de estado valida las transiciones con una sola consulta (que además
+bloquea las filas), aplica un único UPDATE para el estado destino y ejecuta
+los efectos posteriores una vez por lote, no por fila: estadísticas por
+cliente (EstadisticasCliente.ajustar), eventos de la bandeja de salida y
+revisiones (bulk_create), congelado de PDFs (una tarea tras el commit) y la
+señal estados_cambiados. Recalcular totales usa integridad.reparar_totales,
+con los mismos efectos por lote y la señal totales_recalculados.
+
+El admin, el listado de cotizaciones y la API JSON usan ejecutar(), que
+procesa los ids en lotes de transacciones independientes. El envío por
+correo solo encola: los mensajes salen en segundo plano.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .concurrencia import reintentar_si_bloqueada
+from .integridad import reparar_totales
+from .models import Cotizacion, EstadisticasCliente, EventoCotizacion, PdfCotizacion
+from .pdf import programar_congelados
+from .revisiones import registrar_revisiones
+
+# Estado destino: estados de origen desde los que se permite la transición
+TRANSICIONES = {
+    'enviada': ('borrador', 'vencida'),
+    'aprobada': ('enviada',),
+    'rechazada': ('enviada', 'vencida'),
+    'cancelada': ('borrador', 'enviada', 'aprobada', 'vencida'),
+    # Solo la aplica `manage.py vencer_cotizaciones` (no es una acción de ACCIONES)
+    'vencida': ('enviada',),
+}
+
+ACCIONES = {
+    'enviar': {'nombre': 'Marcar como enviadas', 'estado': 'enviada'},
+    'aprobar': {'nombre': 'Aprobar', 'estado': 'aprobada'},
+    'rechazar': {'nombre': 'Rechazar', 'estado': 'rechazada'},
+    'cancelar': {'nombre': 'Cancelar', 'estado': 'cancelada'},
+    'recalcular_totales': {'nombre': 'Recalcular totales'},
+    'regenerar_pdfs': {'nombre': 'Regenerar PDFs congelados'},
+    'enviar_correo': {'nombre': 'Enviar por correo al cliente', 'aplicadas': 'encoladas', 'rechazo': 'no encoladas'},
+}
+
+LOTE = 500
+
+# Una vez por lote tras el commit: estado (destino) y anteriores ({pk: estado anterior})
+estados_cambiados = Signal()
+
+
+@reintentar_si_bloqueada()
+def cambiar_estado(ids, destino):
+    """
+    Pasa a `destino` las cotizaciones de `ids` cuyo estado actual lo permite.
+    Devuelve (pks cambiados, {pk: estado actual} de las rechazadas).
+    """
+    origenes = TRANSICIONES[destino]
+    with transaction.atomic():
+        filas = list(
+            Cotizacion.objects.select_for_update().filter(pk__in=ids).order_by()
+            .values_list('pk', 'cliente_id', 'estado', 'total', 'numero_cotizacion')
+        )
+        permitidas = [fila for fila in filas if fila[2] in origenes]
+        rechazadas = {pk: estado for pk, _, estado, _, _ in filas if estado not in origenes}
+        if not permitidas:
+            return [], rechazadas
+
+        cambiadas = [pk for pk, _, _, _, _ in permitidas]
+        Cotizacion.objects.filter(pk__in=cambiadas).update(
+            estado=destino, fecha_actualizacion=timezone.now(), version=F('version') + 1,
+        )
+        EstadisticasCliente.ajustar(
+            [(cliente_id, estado, total, -1) for _, cliente_id, estado, total, _ in permitidas]
+            + [(cliente_id, destino, total, 1) for _, cliente_id, _, total, _ in permitidas]
+        )
+        EventoCotizacion.registrar(
+            (pk, 'estado', {'numero': numero, 'anterior': estado, 'estado': destino})
+            for pk, _, estado, _, numero in permitidas
+        )
+        registrar_revisiones(cambiadas)
+        if destino in PdfCotizacion.ESTADOS_CONGELADOS:
+            programar_congelados(cambiadas, destino)
+
+        anteriores = {pk: estado for pk, _, estado, _, _ in permitidas}
+        transaction.on_commit(
+            lambda: estados_cambiados.send(sender=Cotizacion, estado=destino, anteriores=anteriores)
+        )
+    return cambiadas, rechazadas
+
+
+def recalcular_totales(ids):
+    """Recalcula líneas y totales desde la base de datos; devuelve (pks corregidos, {})"""
+    corregidas, _ = reparar_totales(ids)
+    return corregidas, {}
+
+
+@reintentar_si_bloqueada()
+def regenerar_pdfs(ids):
+    """
+    Descarta los PDFs congelados del estado actual y los vuelve a generar tras
+    el commit. Los borradores y demás estados sin congelado se rechazan. Los
+    archivos descartados los borra limpiar_pdfs (pueden compartirse: el
+    nombre es el hash del contenido).
+    """
+    with transaction.atomic():
+        filas = list(Cotizacion.objects.filter(pk__in=ids).order_by().values_list('pk', 'estado'))
+        congeladas = [(pk, estado) for pk, estado in filas if estado in PdfCotizacion.ESTADOS_CONGELADOS]
+        PdfCotizacion.objects.filter(
+            cotizacion_id__in=[pk for pk, _ in congeladas], estado=F('cotizacion__estado'),
+        ).delete()
+        for estado in PdfCotizacion.ESTADOS_CONGELADOS:
+            pks = [pk for pk, estado_actual in congeladas if estado_actual == estado]
+            if pks:
+                programar_congelados(pks, estado)
+    rechazadas = {pk: estado for pk, estado in filas if estado not in PdfCotizacion.ESTADOS_CONGELADOS}
+    return [pk for pk, _ in congeladas], rechazadas
+
+
+def enviar_por_correo(ids):
+    """
+    Encola el envío de las cotizaciones al cliente (correo.py): se envían en
+    segundo plano. Devuelve (pks encolados, {pk: motivo por el que no}).
+    """
+    from .correo import encolar_envios
+
+    return encolar_envios(ids)
+
+
+def ejecutar(accion, ids, lote=LOTE):
+    """
+    Aplica la acción de ACCIONES a las cotizaciones de `ids`. Devuelve un
+    resumen con los conteos, las rechazadas ({pk: estado}) y los ids que ya
+    no existen.
+    """
+    ids = list(dict.fromkeys(ids))
+    estado = ACCIONES[accion].get('estado')
+    resumen = {'accion': accion, 'solicitadas': len(ids), 'aplicadas': 0, 'rechazadas': {}, 'no_encontradas': []}
+    for inicio in range(0, len(ids), lote):
+        bloque = ids[inicio:inicio + lote]
+        if estado is not None:
+            aplicadas, rechazadas = cambiar_estado(bloque, estado)
+        elif accion == 'recalcular_totales':
+            aplicadas, rechazadas = recalcular_totales(bloque)
+        elif accion == 'enviar_correo':
+            aplicadas, rechazadas = enviar_por_correo(bloque)
+        else:
+            aplicadas, rechazadas = regenerar_pdfs(bloque)
+        resumen['aplicadas'] += len(aplicadas)
+        resumen['rechazadas'].update(rechazadas)
+        encontradas = set(Cotizacion.objects.filter(pk__in=bloque).values_list('pk', flat=True))
+        resumen['no_encontradas'] += [pk for pk in bloque if pk not in encontradas]
+    return resumen
+
+
+def describir(resumen):
+    """Mensaje para el usuario a partir del resumen de ejecutar()"""
+    accion = ACCIONES[resumen['accion']]
+    partes = [f'{accion["nombre"]}: {resumen["aplicadas"]} de {resumen["solicitadas"]} cotizaciones']
+    if 'aplicadas' in accion:
+        partes[0] += f' {accion["aplicadas"]}'
+    if resumen['rechazadas']:
+        por_estado = Counter(resumen['rechazadas'].values())
+        detalle = ', '.join(f'{estado} {cantidad}' for estado, cantidad in sorted(por_estado.items()))
+        rechazo = accion.get('rechazo', 'no permitidas por su estado')
+        partes.append(f'{len(resumen["rechazadas"])} {rechazo} ({detalle})')
+    if resumen['no_encontradas']:
+        partes.append(f'{len(resumen["no_encontradas"])} no encontradas')
+    return '; '.join(partes)
@@ -23,13 +23,25 @@ urlpatterns = [
     # URLs para Cotizaciones
     path('cotizaciones/', views.CotizacionListView.as_view(), name='cotizacion_list'),
     path('cotizaciones/nueva/', views.CotizacionCreateView.as_view(), name='cotizacion_create'),
+    path('cotizaciones/acciones/', views.cotizacion_acciones_masivas, name='cotizacion_acciones_masivas'),
     path('cotizaciones/nueva-completa/', views.cotizacion_completa_create, name='cotizacion_completa_create'),
     path('cotizaciones/<uuid:pk>/', views.CotizacionDetailView.as_view(), name='cotizacion_detail'),
     path('cotizaciones/<uuid:pk>/editar/', views.CotizacionUpdateView.as_view(), name='cotizacion_update'),
     path('cotizaciones/<uuid:pk>/detalles/', views.cotizacion_detalles_edit, name='cotizacion_detalles_edit'),
+    path('cotizaciones/<uuid:pk>/duplicar/', views.cotizacion_clonar, name='cotizacion_clonar'),
+    path('cotizaciones/<uuid:pk>/enviar/', views.cotizacion_enviar_correo, name='cotizacion_enviar_correo'),
     path('cotizaciones/<uuid:pk>/eliminar/', views.CotizacionDeleteView.as_view(), name='cotizacion_delete'),
     path('cotizaciones/<uuid:pk>/pdf/', views.generar_pdf_cotizacion, name='cotizacion_pdf'),
     path('cotizaciones/<uuid:pk>/pdf-sin-info/', views.generar_pdf_cotizacion_sin_info, name='cotizacion_pdf_sin_info'),
+    path('cotizaciones/<uuid:pk>/versiones/', views.cotizacion_versiones, name='cotizacion_versiones'),
+    path('cotizaciones/<uuid:pk>/versiones/<int:version>/diff/', views.cotizacion_version_diff, name='cotizacion_version_diff'),
+    path('cotizaciones/<uuid:pk>/versiones/<int:version>/pdf/', views.cotizacion_version_pdf, name='cotizacion_version_pdf'),
     path('api/servicio-tarifa/', views.obtener_tarifa_servicio, name='obtener_tarifa_servicio'),
+    path('api/cotizaciones/previsualizar-totales/', views.previsualizar_totales, name='previsualizar_totales'),
+    path('api/cotizaciones/acciones/', views.api_acciones_masivas, name='api_acciones_masivas'),
+    path('api/cotizaciones/simular-precios/', views.simular_precios, name='simular_precios'),
+    path('api/pdf/metricas/', views.metricas_pdf, name='metricas_pdf'),
+    path('reportes/flujo-caja/', views.reporte_flujo_caja, name='reporte_flujo_caja'),
+    path('api/clientes/buscar/', views.buscar_clientes_autocompletado, name='cliente_autocompletado'),
 ]
 
@@ -1,27 +1,139 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, QueryDict
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
 from django.urls import reverse_lazy, reverse
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Sum, Q
-from django.template.loader import get_template, render_to_string
+from django.db import transaction
+from django.db.models import F, Sum, Q
 from django.utils import timezone
-from weasyprint import HTML, CSS
-from weasyprint.text.fonts import FontConfiguration
+from django.utils.decorators import method_decorator
+from django.utils.http import url_has_allowed_host_and_scheme
 from io import BytesIO
 import os
 from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+import csv
 import json
+import logging
+import time
+import uuid
 
-from .models import Cliente, Servicio, Cotizacion, DetalleCotizacion
+from .models import (
+    Cliente, Servicio, Cotizacion, DetalleCotizacion, RevisionCotizacion,
+    totales_diferidos, totales_en_memoria
+)
 from .forms import (
     ClienteForm, ServicioForm, CotizacionForm, DetalleCotizacionForm,
     DetalleCotizacionFormSet, CotizacionCompletaForm
 )
-from .config import EMPRESA_CONFIG
+from .config import PERFIL_PDF_DEFECTO, PERFILES_PDF
+from .concurrencia import ConflictoVersion, reintentar_si_bloqueada
+from .busqueda import buscar_clientes
+from .revisiones import calcular_delta, instanciar, reconstruir, registrar_revision
+# simulacion y flujo_caja (NumPy) se importan dentro de sus vistas
+from .archivo import conteos_por_estado, obtener_cotizacion
+from .replicas import lectura_en_replica
+from .transiciones import ACCIONES, describir, ejecutar as ejecutar_accion
+from .admision import PdfSaturado, metricas as metricas_admision
+from .pdf import PLANTILLAS, contexto_pdf, generar_pdf, pdf_congelado, servir_pdf
+from .correo import encolar_envios
+
+logger = logging.getLogger(__name__)
+
+# Guardados de cotizaciones en transacciones cortas. Con SQLite en modo
+# concurrente (BEGIN IMMEDIATE) el bloqueo se detecta al abrir la transacción,
+# antes de modificar ninguna instancia, por lo que reintentar es seguro.
+@reintentar_si_bloqueada()
+def _guardar_cotizacion(form):
+    with transaction.atomic():
+        cotizacion = form.save()
+        # Descuento o IVA cambian los montos guardados (sobre la versión recién escrita)
+        if {'descuento_porcentaje', 'iva_porcentaje'}.intersection(form.changed_data):
+            cotizacion.calcular_totales()
+        registrar_revision(cotizacion)
+        return cotizacion
+
+@reintentar_si_bloqueada()
+def _guardar_detalles(cotizacion, formset):
+    with transaction.atomic():
+        # Un solo recálculo de totales por formset en lugar de uno por línea
+        with totales_diferidos(cotizacion):
+            formset.save()
+        registrar_revision(cotizacion)
+
+# Conflictos de versión (control optimista, ver models.VersionOptimista).
+# Un conflicto en la cabecera al guardar líneas solo afecta a los totales,
+# que se derivan de las líneas: se reintenta sobre la versión actual.
+INTENTOS_CONFLICTO_CABECERA = 3
+
+def _valor_legible(campo, valor):
+    """Valor de un campo de Cotizacion como se muestra al usuario"""
+    opciones = dict(Cotizacion._meta.get_field(campo).flatchoices)
+    return opciones.get(valor, '' if valor is None else valor)
+
+def _conflicto_detalles(request, cotizacion):
+    """
+    Formset con los valores enviados sobre la versión actual de las líneas y
+    las líneas que otra persona cambió o eliminó desde que se abrió el formulario.
+    """
+    prefijo = DetalleCotizacionFormSet.get_default_prefix()
+    actuales = {str(detalle.pk): detalle for detalle in DetalleCotizacion.objects.filter(cotizacion=cotizacion)}
+    try:
+        total = int(request.POST.get(f'{prefijo}-TOTAL_FORMS', 0))
+    except ValueError:
+        total = 0
+
+    conflicto, existentes, nuevas = [], [], []
+    for indice in range(total):
+        clave = f'{prefijo}-{indice}-'
+        fila = {nombre[len(clave):]: valor for nombre, valor in request.POST.items() if nombre.startswith(clave)}
+        pk = fila.get('id')
+        actual = actuales.get(pk) if pk else None
+        if pk and actual is None and fila.get('DELETE'):
+            continue
+        if pk and (actual is None or str(actual.version) != fila.get('version')):
+            conflicto.append({
+                'descripcion': fila.get('descripcion', ''),
+                'horas': fila.get('horas_estimadas', ''),
+                'tarifa': fila.get('tarifa_hora', ''),
+                'actual': actual,
+            })
+        if actual is None:
+            # Nueva, o eliminada por otra persona: se conserva como línea nueva
+            fila['id'] = ''
+            nuevas.append(fila)
+        else:
+            fila['version'] = str(actual.version)
+            existentes.append(fila)
+
+    # Las líneas existentes van primero, como espera el formset
+    datos = QueryDict(mutable=True)
+    datos.update({
+        f'{prefijo}-TOTAL_FORMS': str(len(existentes) + len(nuevas)),
+        f'{prefijo}-INITIAL_FORMS': str(len(existentes)),
+        f'{prefijo}-MIN_NUM_FORMS': request.POST.get(f'{prefijo}-MIN_NUM_FORMS', '0'),
+        f'{prefijo}-MAX_NUM_FORMS': request.POST.get(f'{prefijo}-MAX_NUM_FORMS', '1000'),
+    })
+    for indice, fila in enumerate(existentes + nuevas):
+        for campo, valor in fila.items():
+            datos[f'{prefijo}-{indice}-{campo}'] = valor
+    return DetalleCotizacionFormSet(datos, instance=cotizacion), conflicto
 
 # Vistas para Clientes
+# Ordenamientos del listado de clientes (?orden=); las columnas de
+# EstadisticasCliente tienen índice
+ORDEN_CLIENTES = {
+    'recientes': ['-fecha_creacion'],
+    'nombre': ['nombre'],
+    'cotizaciones': [F('estadisticas__cantidad').desc(nulls_last=True), 'nombre'],
+    'aprobadas': [F('estadisticas__cantidad_aprobada').desc(nulls_last=True), 'nombre'],
+    'total_cotizado': [F('estadisticas__total_cotizado').desc(nulls_last=True), 'nombre'],
+    'total_aprobado': [F('estadisticas__total_aprobado').desc(nulls_last=True), 'nombre'],
+    'ultima_cotizacion': [F('estadisticas__ultima_cotizacion').desc(nulls_last=True), 'nombre'],
+}
+
+@method_decorator(lectura_en_replica, name='dispatch')
 class ClienteListView(ListView):
     model = Cliente
     template_name = 'cotizaciones/cliente_list.html'
@@ -29,7 +141,8 @@ class ClienteListView(ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        queryset = Cliente.objects.filter(activo=True)
+        # Las estadísticas llegan en la misma consulta (sin consultas por fila)
+        queryset = Cliente.objects.filter(activo=True).select_related('estadisticas')
         search = self.request.GET.get('search')
         if search:
             queryset = queryset.filter(
@@ -37,7 +150,13 @@ class ClienteListView(ListView):
                 Q(empresa__icontains=search) |
                 Q(email__icontains=search)
             )
-        return queryset
+        return queryset.order_by(*ORDEN_CLIENTES.get(self.request.GET.get('orden'), ORDEN_CLIENTES['recientes']))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        orden = self.request.GET.get('orden')
+        context['orden'] = orden if orden in ORDEN_CLIENTES else 'recientes'
+        return context
 
 class ClienteCreateView(CreateView):
     model = Cliente
@@ -72,6 +191,7 @@ class ClienteDeleteView(DeleteView):
         return redirect(self.success_url)
 
 # Vistas para Servicios
+@method_decorator(lectura_en_replica, name='dispatch')
 class ServicioListView(ListView):
     model = Servicio
     template_name = 'cotizaciones/servicio_list.html'
@@ -121,6 +241,7 @@ class ServicioDeleteView(DeleteView):
         return redirect(self.success_url)
 
 # Vistas para Cotizaciones
+@method_decorator(lectura_en_replica, name='dispatch')
 class CotizacionListView(ListView):
     model = Cotizacion
     template_name = 'cotizaciones/cotizacion_list.html'
@@ -147,6 +268,7 @@ class CotizacionListView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['estados'] = Cotizacion.ESTADO_CHOICES
+        context['acciones'] = [(accion, datos['nombre']) for accion, datos in ACCIONES.items()]
         return context
 
 class CotizacionCreateView(CreateView):
@@ -156,7 +278,7 @@ class CotizacionCreateView(CreateView):
     success_url = reverse_lazy('cotizaciones:cotizacion_list')
 
     def form_valid(self, form):
-        cotizacion = form.save()
+        cotizacion = _guardar_cotizacion(form)
         messages.success(self.request, f'Cotización {cotizacion.numero_cotizacion} creada exitosamente.')
         return redirect(reverse('cotizaciones:cotizacion_detail', kwargs={'pk': cotizacion.pk}))
 
@@ -169,17 +291,47 @@ class CotizacionUpdateView(UpdateView):
         return reverse('cotizaciones:cotizacion_detail', kwargs={'pk': self.object.pk})
 
     def form_valid(self, form):
+        try:
+            # Solo los campos modificados, si nadie guardó desde que se abrió el formulario
+            self.object = _guardar_cotizacion(form)
+        except ConflictoVersion:
+            return self._conflicto(form)
         messages.success(self.request, 'Cotización actualizada exitosamente.')
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
+
+    def _conflicto(self, form):
+        """
+        409: formulario con los valores del usuario sobre la versión actual y
+        los campos en los que difieren, para revisarlos y volver a guardar.
+        """
+        self.object = get_object_or_404(Cotizacion, pk=self.object.pk)
+        mios = {campo: valor for campo, valor in form.cleaned_data.items() if campo != 'version'}
+        conflicto = [
+            {
+                'campo': form.fields[campo].label,
+                'mio': _valor_legible(campo, valor),
+                'actual': _valor_legible(campo, getattr(self.object, campo)),
+            }
+            for campo, valor in mios.items() if valor != getattr(self.object, campo)
+        ]
+        fusion = self.get_form_class()(instance=self.object, initial=mios)
+        return self.render_to_response(self.get_context_data(form=fusion, conflicto=conflicto), status=409)
 
 class CotizacionDetailView(DetailView):
     model = Cotizacion
     template_name = 'cotizaciones/cotizacion_detail.html'
     context_object_name = 'cotizacion'
 
+    def get_object(self, queryset=None):
+        # Las cotizaciones archivadas se muestran en modo solo lectura
+        return obtener_cotizacion(self.kwargs['pk'])
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['detalles'] = self.object.detallecotizacion_set.all()
+        context['detalles'] = self.object.detallecotizacion_set.select_related('servicio')
+        context['archivada'] = getattr(self.object, 'archivada', False)
+        if not context['archivada']:
+            context['envios'] = self.object.envios.all()[:10]
         return context
 
 class CotizacionDeleteView(DeleteView):
@@ -199,7 +351,7 @@ def cotizacion_completa_create(request):
     if request.method == 'POST':
         form = CotizacionCompletaForm(request.POST)
         if form.is_valid():
-            cotizacion = form.save()
+            cotizacion = _guardar_cotizacion(form)
             messages.success(request, f'Cotización {cotizacion.numero_cotizacion} creada exitosamente.')
             return redirect(reverse('cotizaciones:cotizacion_detail', kwargs={'pk': cotizacion.pk}))
     else:
@@ -210,27 +362,116 @@ def cotizacion_completa_create(request):
         'title': 'Nueva Cotización'
     })
 
+# Vista para duplicar una cotización (usarla como plantilla)
+@reintentar_si_bloqueada()
+def _clonar_cotizacion(cotizacion, aplicar_tarifas_actuales):
+    with transaction.atomic():
+        copia = cotizacion.clonar(aplicar_tarifas_actuales=aplicar_tarifas_actuales)
+        registrar_revision(copia)
+        return copia
+
+def cotizacion_clonar(request, pk):
+    cotizacion = get_object_or_404(Cotizacion, pk=pk)
+    if request.method != 'POST':
+        return redirect(reverse('cotizaciones:cotizacion_detail', kwargs={'pk': cotizacion.pk}))
+
+    aplicar_tarifas = request.POST.get('aplicar_tarifas_actuales') == '1'
+    copia = _clonar_cotizacion(cotizacion, aplicar_tarifas)
+    messages.success(
+        request,
+        f'Cotización {copia.numero_cotizacion} creada a partir de {cotizacion.numero_cotizacion}.'
+    )
+    return redirect(reverse('cotizaciones:cotizacion_detail', kwargs={'pk': copia.pk}))
+
+# Enviar la cotización al correo del cliente con el PDF adjunto
+def cotizacion_enviar_correo(request, pk):
+    cotizacion = get_object_or_404(Cotizacion.objects.select_related('cliente'), pk=pk)
+    if request.method != 'POST':
+        return redirect(reverse('cotizaciones:cotizacion_detail', kwargs={'pk': cotizacion.pk}))
+
+    # El envío sale en segundo plano; el detalle muestra su estado
+    encoladas, errores = encolar_envios([cotizacion.pk])
+    if encoladas:
+        messages.success(
+            request, f'Cotización {cotizacion.numero_cotizacion} en cola de envío a {cotizacion.cliente.email}.'
+        )
+    else:
+        messages.error(request, f'No se pudo enviar la cotización: {errores.get(cotizacion.pk)}')
+    return redirect(reverse('cotizaciones:cotizacion_detail', kwargs={'pk': cotizacion.pk}))
+
+# Acciones masivas sobre cotizaciones (listado y API JSON)
+MAXIMO_IDS_ACCION = 1000
+
+def _ids_accion(valores):
+    """UUIDs de cotizaciones recibidos en una acción masiva (ValueError si no son válidos)"""
+    if not isinstance(valores, list) or not valores or len(valores) > MAXIMO_IDS_ACCION:
+        raise ValueError(f'Se esperaba una lista de 1 a {MAXIMO_IDS_ACCION} ids')
+    try:
+        return [uuid.UUID(str(valor)) for valor in valores]
+    except ValueError:
+        raise ValueError('Ids de cotización no válidos') from None
+
+def cotizacion_acciones_masivas(request):
+    siguiente = request.POST.get('siguiente')
+    if not url_has_allowed_host_and_scheme(siguiente, allowed_hosts={request.get_host()}):
+        siguiente = reverse('cotizaciones:cotizacion_list')
+    if request.method != 'POST':
+        return redirect(siguiente)
+
+    accion = request.POST.get('accion')
+    try:
+        ids = _ids_accion(request.POST.getlist('ids'))
+    except ValueError:
+        messages.error(request, 'Seleccione al menos una cotización.')
+        return redirect(siguiente)
+    if accion not in ACCIONES:
+        messages.error(request, 'Acción no válida.')
+        return redirect(siguiente)
+
+    resumen = ejecutar_accion(accion, ids)
+    if resumen['rechazadas'] or resumen['no_encontradas']:
+        messages.warning(request, describir(resumen))
+    else:
+        messages.success(request, describir(resumen))
+    return redirect(siguiente)
+
 # Vista para editar detalles de cotización
 def cotizacion_detalles_edit(request, pk):
     cotizacion = get_object_or_404(Cotizacion, pk=pk)
+    conflicto = None
     
     if request.method == 'POST':
         formset = DetalleCotizacionFormSet(request.POST, instance=cotizacion)
-        if formset.is_valid():
-            # Usar el método save() estándar del formset
-            formset.save()
-            
-            # Recalcular totales
-            cotizacion.calcular_totales()
+        for intento in range(1, INTENTOS_CONFLICTO_CABECERA + 1):
+            if not formset.is_valid():
+                if any('id' in form.errors for form in formset.forms):
+                    # Líneas que otra persona eliminó
+                    formset, conflicto = _conflicto_detalles(request, cotizacion)
+                break
+            try:
+                # Guardar las líneas y recalcular los totales una sola vez
+                _guardar_detalles(cotizacion, formset)
+            except ConflictoVersion as error:
+                if isinstance(error.instancia, Cotizacion) and intento < INTENTOS_CONFLICTO_CABECERA:
+                    # Se vuelven a leer cotización y líneas (la transacción se revirtió)
+                    cotizacion = get_object_or_404(Cotizacion, pk=pk)
+                    formset = DetalleCotizacionFormSet(request.POST, instance=cotizacion)
+                    continue
+                cotizacion = get_object_or_404(Cotizacion, pk=pk)
+                formset, conflicto = _conflicto_detalles(request, cotizacion)
+                if not conflicto:
+                    messages.warning(request, 'La cotización cambió mientras se guardaba; revise las líneas y vuelva a guardar.')
+                break
             
             messages.success(request, 'Detalles de cotización actualizados exitosamente.')
             return redirect(reverse('cotizaciones:cotizacion_detail', kwargs={'pk': cotizacion.pk}))
-        else:
+        if conflicto is None:
             # Si hay errores, mostrar mensaje
             messages.error(request, 'Por favor corrija los errores en el formulario.')
-            print("Errores del formset:", formset.errors)  # Debug
-            print("Non form errors:", formset.non_form_errors())  # Debug
-            print("POST data:", request.POST)  # Debug para ver qué datos se están enviando
+            logger.debug(
+                'Formset de líneas inválido en %s: %s %s',
+                cotizacion.numero_cotizacion, formset.errors, formset.non_form_errors(),
+            )
     else:
         formset = DetalleCotizacionFormSet(instance=cotizacion)
     
@@ -241,75 +482,112 @@ def cotizacion_detalles_edit(request, pk):
         'formset': formset,
         'cotizacion': cotizacion,
         'servicios': servicios,
+        'conflicto': conflicto,
         'title': f'Editar Detalles - {cotizacion.numero_cotizacion}'
-    })
+    }, status=409 if conflicto is not None else 200)
+
+def _perfil_pdf(request):
+    """Perfil de salida pedido con ?perfil= (ver PERFILES_PDF)"""
+    perfil = request.GET.get('perfil') or PERFIL_PDF_DEFECTO
+    if perfil not in PERFILES_PDF:
+        raise ValueError(f'Perfil inválido. Opciones: {", ".join(PERFILES_PDF)}')
+    return perfil
+
+def _pdf_saturado(error):
+    """503 cuando todos los turnos de render están ocupados (ver admision.py)"""
+    response = JsonResponse({'success': False, 'error': str(error)}, status=503)
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
+def _renderizar_pdf(request, template_name, contexto, nombre_archivo):
+    """Genera (o reutiliza) el PDF de la plantilla y lo entrega como descarga"""
+    try:
+        perfil = _perfil_pdf(request)
+    except ValueError as error:
+        return JsonResponse({'success': False, 'error': str(error)}, status=400)
+    try:
+        ruta = generar_pdf(template_name, contexto, perfil)
+    except PdfSaturado as error:
+        return _pdf_saturado(error)
+    return servir_pdf(request, ruta, nombre_archivo)
+
+# Vista para generar PDF (las cotizaciones enviadas o aprobadas usan su PDF congelado,
+# generado con el perfil de archivo; ?perfil= solo aplica a los borradores).
+# También sirve las cotizaciones archivadas.
+def _descargar_pdf(request, pk, plantilla):
+    cotizacion = obtener_cotizacion(pk)
+    try:
+        perfil = _perfil_pdf(request)
+    except ValueError as error:
+        return JsonResponse({'success': False, 'error': str(error)}, status=400)
+    try:
+        ruta = pdf_congelado(cotizacion, plantilla) or generar_pdf(
+            PLANTILLAS[plantilla], contexto_pdf(cotizacion, plantilla), perfil,
+        )
+    except PdfSaturado as error:
+        return _pdf_saturado(error)
+    return servir_pdf(request, ruta, f'cotizacion_{cotizacion.numero_cotizacion}.pdf')
 
-# Vista para generar PDF
 def generar_pdf_cotizacion(request, pk):
-    cotizacion = get_object_or_404(Cotizacion, pk=pk)
-    detalles = cotizacion.detallecotizacion_set.all()
-    
-    # Renderizar el template HTML
-    html_string = render_to_string('cotizaciones/template_pdf_cotizacion.html', {
-        'cotizacion': cotizacion,
-        'detalles': detalles,
-        'empresa': EMPRESA_CONFIG,
-    })
-    
-    # Configurar fuentes
-    font_config = FontConfiguration()
-    
-    # Crear el PDF usando WeasyPrint
-    html = HTML(string=html_string)
-    css = CSS(string='', font_config=font_config)
-    
-    # Generar el PDF
-    pdf = html.write_pdf(stylesheets=[css], font_config=font_config)
-    
-    # Crear la respuesta HTTP
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="cotizacion_{cotizacion.numero_cotizacion}.pdf"'
-    response.write(pdf)
-    
-    return response
+    return _descargar_pdf(request, pk, 'completo')
 
 # Vista para generar PDF sin información de la empresa
 def generar_pdf_cotizacion_sin_info(request, pk):
+    return _descargar_pdf(request, pk, 'sin_info')
+
+# Vistas para el historial de revisiones
+def cotizacion_versiones(request, pk):
     cotizacion = get_object_or_404(Cotizacion, pk=pk)
-    detalles = cotizacion.detallecotizacion_set.all()
-    
-    # Renderizar el template HTML
-    html_string = render_to_string('cotizaciones/template_pdf_cotizacion_withoutinfo.html', {
-        'cotizacion': cotizacion,
-        'detalles': detalles,
-        #'empresa': EMPRESA_CONFIG,
+    versiones = cotizacion.revisiones.order_by('-version').values('version', 'es_snapshot', 'fecha')
+    return JsonResponse({
+        'success': True,
+        'numero_cotizacion': cotizacion.numero_cotizacion,
+        'versiones': [
+            {**version, 'fecha': version['fecha'].isoformat()} for version in versiones
+        ],
     })
-    
-    # Configurar fuentes
-    font_config = FontConfiguration()
-    
-    # Crear el PDF usando WeasyPrint
-    html = HTML(string=html_string)
-    css = CSS(string='', font_config=font_config)
-    
-    # Generar el PDF
-    pdf = html.write_pdf(stylesheets=[css], font_config=font_config)
-    
-    # Crear la respuesta HTTP
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="cotizacion_{cotizacion.numero_cotizacion}.pdf"'
-    response.write(pdf)
-    
-    return response
+
+def cotizacion_version_diff(request, pk, version):
+    cotizacion = get_object_or_404(Cotizacion, pk=pk)
+    try:
+        contra = int(request.GET.get('contra', version - 1))
+        posterior = reconstruir(cotizacion, version)
+        anterior = reconstruir(cotizacion, contra) if contra > 0 else {'cotizacion': {}, 'detalles': {}}
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Versión inválida'}, status=400)
+    except RevisionCotizacion.DoesNotExist as error:
+        return JsonResponse({'success': False, 'error': str(error)}, status=404)
+
+    return JsonResponse({
+        'success': True,
+        'desde': contra,
+        'hasta': version,
+        'cambios': calcular_delta(anterior, posterior),
+    })
+
+def cotizacion_version_pdf(request, pk, version):
+    cotizacion = get_object_or_404(Cotizacion, pk=pk)
+    try:
+        estado = reconstruir(cotizacion, version)
+    except RevisionCotizacion.DoesNotExist as error:
+        return JsonResponse({'success': False, 'error': str(error)}, status=404)
+    cotizacion_version, detalles = instanciar(cotizacion, estado)
+
+    return _renderizar_pdf(
+        request, PLANTILLAS['completo'], contexto_pdf(cotizacion_version, 'completo', detalles),
+        f'cotizacion_{cotizacion_version.numero_cotizacion}_v{version}.pdf',
+    )
 
 
 
 # Vista para el dashboard
+@lectura_en_replica
 def dashboard(request):
-    # Estadísticas básicas
-    total_cotizaciones = Cotizacion.objects.count()
-    cotizaciones_pendientes = Cotizacion.objects.filter(estado='enviada').count()
-    cotizaciones_aprobadas = Cotizacion.objects.filter(estado='aprobada').count()
+    # Estadísticas básicas: tablas vivas más el resumen precalculado del archivo
+    por_estado = conteos_por_estado()
+    total_cotizaciones = sum(por_estado.values())
+    cotizaciones_pendientes = por_estado.get('enviada', 0)
+    cotizaciones_aprobadas = por_estado.get('aprobada', 0)
     total_clientes = Cliente.objects.filter(activo=True).count()
     
     # Cotizaciones recientes
@@ -318,7 +596,7 @@ def dashboard(request):
     # Cotizaciones por estado
     cotizaciones_por_estado = {}
     for estado, nombre in Cotizacion.ESTADO_CHOICES:
-        cotizaciones_por_estado[nombre] = Cotizacion.objects.filter(estado=estado).count()
+        cotizaciones_por_estado[nombre] = por_estado.get(estado, 0)
     
     context = {
         'total_cotizaciones': total_cotizaciones,
@@ -352,3 +630,178 @@ def obtener_tarifa_servicio(request):
                 'error': 'Servicio no encontrado'
             })
     return JsonResponse({'success': False, 'error': 'Método no permitido'})
+
+# Vista AJAX para el autocompletado de clientes
+def buscar_clientes_autocompletado(request):
+    try:
+        pagina = int(request.GET.get('page', 1))
+    except ValueError:
+        pagina = 1
+    resultados, hay_mas = buscar_clientes(request.GET.get('q', ''), pagina=pagina)
+    return JsonResponse({
+        'results': resultados,
+        'pagination': {'more': hay_mas},
+    })
+
+# Vista AJAX para previsualizar totales sin guardar (editor de detalles)
+MAXIMO_LINEAS_PREVISUALIZACION = 500
+
+def _decimal_no_negativo(valor, campo, modelo=DetalleCotizacion):
+    try:
+        numero = Decimal(str(valor if valor not in (None, '') else '0'))
+    except InvalidOperation:
+        raise ValueError(f'Valor inválido para {campo}')
+    if not numero.is_finite() or numero < 0:
+        raise ValueError(f'Valor inválido para {campo}')
+    # Mismo límite de enteros que la columna: evita desbordes al calcular
+    limite = modelo._meta.get_field(campo)
+    if numero >= 10 ** (limite.max_digits - limite.decimal_places):
+        raise ValueError(f'Valor fuera de rango para {campo}')
+    return numero
+
+def _entero_acotado(valor, campo, minimo, maximo):
+    # 2.5 o true no se truncan en silencio: solo enteros o texto con un entero
+    if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+        raise ValueError(f'{campo} debe ser un número entero')
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ValueError(f'{campo} debe ser un número entero')
+    return max(minimo, min(numero, maximo))
+
+def previsualizar_totales(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
+    try:
+        datos = json.loads(request.body)
+        lineas = datos.get('lineas', [])
+        if not isinstance(lineas, list) or len(lineas) > MAXIMO_LINEAS_PREVISUALIZACION:
+            raise ValueError('Lista de líneas inválida')
+        descuento_porcentaje = _decimal_no_negativo(
+            datos.get('descuento_porcentaje'), 'descuento_porcentaje', Cotizacion,
+        )
+        iva_porcentaje = _decimal_no_negativo(datos.get('iva_porcentaje'), 'iva_porcentaje', Cotizacion)
+        lineas = [
+            (
+                _decimal_no_negativo(linea.get('horas_estimadas'), 'horas_estimadas'),
+                _decimal_no_negativo(linea.get('tarifa_hora'), 'tarifa_hora'),
+            )
+            for linea in lineas
+        ]
+    except (ValueError, TypeError, AttributeError) as error:
+        return JsonResponse({'success': False, 'error': str(error) or 'Datos inválidos'}, status=400)
+
+    # Mismas reglas que al guardar, sin tocar la base de datos
+    totales = totales_en_memoria(lineas, descuento_porcentaje, iva_porcentaje)
+    return JsonResponse({
+        'success': True,
+        'lineas': [str(subtotal) for subtotal in totales['lineas']],
+        **{campo: str(valor) for campo, valor in totales.items() if campo != 'lineas'},
+    })
+
+# API JSON de acciones masivas: {"accion": "enviar", "ids": [...]}
+def api_acciones_masivas(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
+    try:
+        datos = json.loads(request.body)
+        accion = datos.get('accion')
+        if accion not in ACCIONES:
+            raise ValueError(f'Acción no válida; opciones: {", ".join(ACCIONES)}')
+        ids = _ids_accion(datos.get('ids'))
+    except (ValueError, TypeError, AttributeError) as error:
+        return JsonResponse({'success': False, 'error': str(error) or 'Datos inválidos'}, status=400)
+
+    resumen = ejecutar_accion(accion, ids)
+    return JsonResponse({
+        'success': True,
+        'accion': accion,
+        'solicitadas': resumen['solicitadas'],
+        'aplicadas': resumen['aplicadas'],
+        'rechazadas': [{'id': str(pk), 'estado': estado} for pk, estado in resumen['rechazadas'].items()],
+        'no_encontradas': [str(pk) for pk in resumen['no_encontradas']],
+        'mensaje': describir(resumen),
+    })
+
+# Vista AJAX para simular cambios de tarifas, descuento o IVA sobre las cotizaciones abiertas
+def simular_precios(request):
+    from .simulacion import Escenario, Simulacion, obtener_libro
+
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
+    try:
+        datos = json.loads(request.body)
+        tarifas = datos.get('tarifas') or {}
+        if not isinstance(tarifas, dict):
+            raise ValueError('tarifas debe ser un objeto {servicio_id: tarifa}')
+        escenario = Escenario(
+            tarifas={
+                uuid.UUID(str(servicio_id)): _decimal_no_negativo(tarifa, 'tarifa_hora')
+                for servicio_id, tarifa in tarifas.items()
+            },
+            descuento_porcentaje=(
+                None if datos.get('descuento_porcentaje') in (None, '')
+                else _decimal_no_negativo(datos['descuento_porcentaje'], 'descuento_porcentaje', Cotizacion)
+            ),
+            iva_porcentaje=(
+                None if datos.get('iva_porcentaje') in (None, '')
+                else _decimal_no_negativo(datos['iva_porcentaje'], 'iva_porcentaje', Cotizacion)
+            ),
+        )
+        cantidad = _entero_acotado(datos.get('cantidad', 20), 'cantidad', 1, 100)
+        muestra = _entero_acotado(datos.get('verificar', 0), 'verificar', 0, 1000)
+    except (ValueError, TypeError, AttributeError) as error:
+        return JsonResponse({'success': False, 'error': str(error) or 'Datos inválidos'}, status=400)
+
+    inicio = time.perf_counter()
+    libro = obtener_libro(refrescar=bool(datos.get('refrescar')))
+    carga = time.perf_counter() - inicio
+    simulacion = Simulacion(libro, escenario)
+
+    respuesta = {
+        'success': True,
+        'cotizaciones': len(libro.cotizaciones),
+        'lineas': libro.total_lineas,
+        'agregado': simulacion.agregado(),
+        'mayores_cambios': simulacion.mayores_cambios(cantidad),
+        'tiempos_ms': {
+            'carga': round(carga * 1000, 1),
+            'calculo': round(simulacion.duracion * 1000, 1),
+        },
+    }
+    if muestra > 0:
+        respuesta['verificacion'] = simulacion.verificar(muestra)
+    return JsonResponse(respuesta)
+
+# Proyección de flujo de caja de las cotizaciones aprobadas (JSON o CSV)
+def reporte_flujo_caja(request):
+    from .flujo_caja import flujo_caja
+
+    try:
+        desde = request.GET.get('desde')
+        desde = datetime.strptime(desde, '%Y-%m').date() if desde else None
+        meses = int(request.GET['meses']) if request.GET.get('meses') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Parámetros inválidos: desde=AAAA-MM, meses=N'}, status=400)
+
+    proyeccion = flujo_caja(desde, meses)
+    columnas = ['mes', 'mensual', 'anual', 'unico', 'total', 'cuotas']
+
+    if request.GET.get('formato') == 'csv':
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="flujo_caja.csv"'
+        escritor = csv.writer(response)
+        escritor.writerow(columnas)
+        for fila in proyeccion:
+            escritor.writerow([fila[columna] for columna in columnas])
+        return response
+
+    return JsonResponse({
+        'success': True,
+        'meses': [{columna: str(fila[columna]) if columna != 'cuotas' else fila[columna] for columna in columnas} for fila in proyeccion],
+        'total': str(sum(fila['total'] for fila in proyeccion)),
+    })
+
+# Métricas del control de admisión de PDFs: ocupación, cola y tiempos de espera
+def metricas_pdf(request):
+    return JsonResponse({'success': True, **metricas_admision()})
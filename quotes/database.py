@@ -0,0 +1,141 @@
+"""
+Gestión de conexiones a base de datos para el proyecto quotes.
+
+Centraliza la configuración de DATABASES para que settings.py y
+settings_docker.py compartan las mismas reglas:
+
+* PostgreSQL: conexiones persistentes (CONN_MAX_AGE) con health checks, o
+  el pool nativo de Django 5 (requiere psycopg 3) si DB_POOL=true.
+* SQLite: pragmas aplicados al abrir cada conexión (WAL, synchronous=NORMAL,
+  busy_timeout, mmap_size) para el modo de respaldo. Con SQLITE_CONCURRENTE
+  (activo por defecto) las transacciones se abren con BEGIN IMMEDIATE para
+  que varios workers de gunicorn esperen el bloqueo de escritura en lugar de
+  fallar con "database is locked" al promover una lectura a escritura.
+* Réplicas de lectura opcionales (DATABASE_REPLICA_URLS) para el router de
+  cotizaciones/replicas.py.
+"""
+
+import os
+from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+def _env_bool(nombre, defecto=False):
+    return os.environ.get(nombre, str(defecto)).lower() in ('1', 'true', 'yes', 'si')
+
+
+def _env_int(nombre, defecto):
+    try:
+        return int(os.environ.get(nombre, defecto))
+    except (TypeError, ValueError):
+        raise ImproperlyConfigured(f'La variable {nombre} debe ser un número entero.')
+
+
+# Segundos que una conexión se reutiliza entre peticiones (0 = cerrar siempre)
+CONN_MAX_AGE = _env_int('DB_CONN_MAX_AGE', 60)
+
+# Pragmas aplicados a cada conexión SQLite nueva
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000),
+    'mmap_size': _env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+}
+
+SQLITE_CONCURRENTE = _env_bool('SQLITE_CONCURRENTE', True)
+
+
+def opciones_sqlite(pragmas=None):
+    """Devuelve el bloque OPTIONS de SQLite con los pragmas como init_command"""
+    pragmas = pragmas or SQLITE_PRAGMAS
+    init_command = ';'.join(f'PRAGMA {clave}={valor}' for clave, valor in pragmas.items())
+    opciones = {'init_command': init_command}
+    if SQLITE_CONCURRENTE:
+        opciones['transaction_mode'] = 'IMMEDIATE'
+    return opciones
+
+
+def configurar_sqlite(nombre):
+    """
+    Configuración de SQLite con conexiones persistentes y pragmas. Los tests
+    usan un archivo (test_<nombre>) en lugar de la base en memoria para que
+    las pruebas multiproceso compartan la base.
+    """
+    nombre = Path(nombre)
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': nombre,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': opciones_sqlite(),
+        'TEST': {'NAME': nombre.with_name(f'test_{nombre.name}')},
+    }
+
+
+def configurar_postgresql(database_url):
+    """
+    Configuración de PostgreSQL a partir de DATABASE_URL.
+
+    Con DB_POOL=true se usa el pool nativo de Django 5 (psycopg 3); Django no
+    admite combinar el pool con CONN_MAX_AGE, por lo que en ese caso las
+    conexiones las retiene el pool y no la conexión persistente.
+    """
+    import dj_database_url
+
+    usar_pool = _env_bool('DB_POOL')
+    config = dj_database_url.parse(
+        database_url,
+        conn_max_age=0 if usar_pool else CONN_MAX_AGE,
+        conn_health_checks=not usar_pool,
+    )
+
+    if usar_pool:
+        try:
+            import psycopg  # noqa: F401
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            raise ImproperlyConfigured(
+                'DB_POOL=true requiere psycopg 3: pip install "psycopg[binary,pool]"'
+            )
+        config.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': _env_int('DB_POOL_MIN_SIZE', 2),
+            'max_size': _env_int('DB_POOL_MAX_SIZE', 10),
+            'timeout': _env_int('DB_POOL_TIMEOUT', 10),
+        }
+
+    return config
+
+
+def configurar_replicas(urls, base_dir):
+    """
+    Entradas 'replica_1', 'replica_2'... de DATABASES a partir de
+    DATABASE_REPLICA_URLS (separadas por comas). Las réplicas SQLite se abren
+    con query_only para que una escritura mal enrutada falle en lugar de
+    divergir, y en los tests usan su propio archivo (test_<nombre>), sin
+migraciones: el esquema llega al copiarles la primaria. Las de
+    PostgreSQL espejan 'default' en los tests (TEST MIRROR): la replicación
+    del servidor no existe para la base de tests.
+    """
+    replicas = {}
+    for indice, url in enumerate(filter(None, (url.strip() for url in urls.split(','))), start=1):
+        if url.startswith(('postgresql://', 'postgres://')):
+            config = configurar_postgresql(url)
+            config['TEST'] = {'MIRROR': 'default'}
+        elif url.startswith('sqlite:///'):
+            config = configurar_sqlite(base_dir / url[len('sqlite:///'):])
+            config['OPTIONS'] = opciones_sqlite({**SQLITE_PRAGMAS, 'query_only': 'ON'})
+            config['OPTIONS'].pop('transaction_mode', None)
+            # El esquema llega con la copia de la primaria (sincronizar_replicas)
+            config['TEST']['MIGRATE'] = False
+        else:
+            raise ImproperlyConfigured(f'DATABASE_REPLICA_URLS: URL no soportada {url!r}')
+        replicas[f'replica_{indice}'] = config
+    return replicas
+
+
+def configurar_base_datos(database_url, sqlite_por_defecto):
+    """Devuelve la entrada 'default' de DATABASES según DATABASE_URL"""
+    if database_url and database_url.startswith(('postgresql://', 'postgres://')):
+        return configurar_postgresql(database_url)
+    return configurar_sqlite(sqlite_por_defecto)
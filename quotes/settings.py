@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .database import configurar_replicas, configurar_sqlite
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +47,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Estáticos desde STATIC_ROOT con .gz/.br y caché larga (ver cotizaciones/estaticos.py)
+    'cotizaciones.estaticos.EstaticosMiddleware',
+    # Primaria durante unos segundos tras escribir (lectura tras escritura con réplicas)
+    'cotizaciones.replicas.ReplicasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,10 +83,23 @@ WSGI_APPLICATION = 'quotes.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 DATABASES = {
+    'default': configurar_sqlite(BASE_DIR / 'db.sqlite3'),
+    # Réplicas de solo lectura, p. ej. DATABASE_REPLICA_URLS=sqlite:///replica.sqlite3
+    **configurar_replicas(os.environ.get('DATABASE_REPLICA_URLS', ''), BASE_DIR),
+}
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# Listados, dashboard y comandos de solo lectura en las réplicas (ver cotizaciones/replicas.py)
+DATABASE_ROUTERS = ['cotizaciones.replicas.RouterReplicas']
+
+
+# Caché compartida por todos los workers de gunicorn (y los comandos): las
+# invalidaciones del autocompletado y del flujo de caja deben verse en todos
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
 
 
@@ -123,11 +143,43 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Nombres con hash del contenido y variantes .gz/.br generadas en collectstatic
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'cotizaciones.estaticos.AlmacenEstaticos'},
+}
 
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# PDFs generados, fuera de MEDIA_ROOT para no publicarlos (ver cotizaciones/pdf.py)
+PDF_ROOT = BASE_DIR / 'pdf'
+# Almacén local de logos, fuentes e imágenes de los PDFs (ver cotizaciones/recursos_pdf.py)
+PDF_RECURSOS_ROOT = PDF_ROOT / 'recursos'
+# Archivos de bloqueo y métricas del control de admisión de PDFs (ver cotizaciones/admision.py)
+PDF_ADMISION_ROOT = PDF_ROOT / 'admision'
+# Cargar WeasyPrint al arrancar el servidor WSGI en lugar de en el primer PDF (ver quotes/wsgi.py)
+PDF_PRECARGAR = os.environ.get('PDF_PRECARGAR', '') == '1'
+# Entrega de PDFs: '' (FileResponse), 'x-accel-redirect' (nginx) o 'x-sendfile' (Apache/lighttpd)
+PDF_SENDFILE = os.environ.get('PDF_SENDFILE', '')
+# Location interna de nginx que apunta a PDF_ROOT (solo con x-accel-redirect)
+PDF_ACCEL_PREFIX = os.environ.get('PDF_ACCEL_PREFIX', '/pdf-interno/')
+
+# Correo saliente (envío de cotizaciones, ver cotizaciones/correo.py). En desarrollo,
+# EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend guarda los mensajes en EMAIL_FILE_PATH
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '') == '1'
+EMAIL_TIMEOUT = 30
+EMAIL_FILE_PATH = BASE_DIR / 'correos'
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'cotizaciones@localhost')
+
 # Crispy Forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
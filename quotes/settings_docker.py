@@ -5,6 +5,7 @@ Django settings for quotes project in Docker environment.
 import os
 from pathlib import Path
 from .settings import *
+from .database import configurar_base_datos, configurar_replicas
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -17,20 +18,12 @@ ALLOWED_HOSTS = ['*']  # Configurar según necesidades de producción
 # Database configuration for Docker
 DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///db.sqlite3')
 
-if DATABASE_URL.startswith('postgresql://'):
-    # PostgreSQL configuration
-    import dj_database_url
-    DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL)
-    }
-else:
-    # SQLite configuration (fallback)
-    DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
-        }
-    }
+# Conexiones persistentes / pool para PostgreSQL y pragmas para SQLite (ver quotes/database.py)
+DATABASES = {
+    'default': configurar_base_datos(DATABASE_URL, BASE_DIR / 'db.sqlite3'),
+    **configurar_replicas(os.environ.get('DATABASE_REPLICA_URLS', ''), BASE_DIR),
+}
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
 
 # Configuración adicional para variables de entorno
 SECRET_KEY = os.environ.get('SECRET_KEY', SECRET_KEY)
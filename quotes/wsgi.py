@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quotes.settings')
 
 application = get_wsgi_application()
+
+# Con PDF_PRECARGAR=1 WeasyPrint se carga al arrancar (antes del fork con
+# gunicorn --preload) en lugar de en el primer PDF de cada worker
+from django.conf import settings  # noqa: E402
+
+if settings.PDF_PRECARGAR:
+    from cotizaciones.pdf import precargar_weasyprint
+    precargar_weasyprint()